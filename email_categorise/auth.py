@@ -2,9 +2,12 @@ from __future__ import annotations
 
 import logging
 import os
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Iterable, Optional
+from typing import Any, Dict, Iterable, Optional, Tuple
 
 import msal  # type: ignore[import]
 from msal_extensions import FilePersistence, PersistedTokenCache  # type: ignore[import]
@@ -96,6 +99,7 @@ def acquire_delegated_token(
     app: msal.PublicClientApplication,
     scopes: Iterable[str],
     username: str,
+    force_refresh: bool = False,
 ) -> dict | None:
     scopes_clean = []
     for s in scopes:
@@ -108,7 +112,9 @@ def acquire_delegated_token(
     result: dict | None = None
     if accounts:
         logger.debug("Attempting silent token acquisition for %s", username)
-        result = app.acquire_token_silent(list(scopes_clean), account=accounts[0])
+        result = app.acquire_token_silent(
+            list(scopes_clean), account=accounts[0], force_refresh=force_refresh
+        )
 
     if not result:
         logger.info(
@@ -132,7 +138,12 @@ def acquire_delegated_token(
 
 def acquire_application_token(
     app: msal.ConfidentialClientApplication,
+    force_refresh: bool = False,
 ) -> dict | None:
+    if force_refresh:
+        # acquire_token_for_client serves cached tokens; drop them so a token
+        # Graph has rejected is not handed out again.
+        app.remove_tokens_for_client()
     # Uses the Graph .default scope set, representing app permissions granted in the portal.
     result = app.acquire_token_for_client(
         scopes=["https://graph.microsoft.com/.default"]
@@ -144,3 +155,107 @@ def acquire_application_token(
         )
         return None
     return result
+
+
+@dataclass
+class AccessToken:
+    token: str
+    expires_at: float  # epoch seconds
+
+    def expires_within(self, seconds: float) -> bool:
+        return time.time() + seconds >= self.expires_at
+
+
+class CredentialManager:
+    """Process-wide MSAL client apps and Graph access tokens.
+
+    Client apps (and their open token cache) are kept per auth mode, client id
+    and tenant, so the cache file is read once per tenant rather than once per
+    Graph client. Application tokens are shared by every mailbox in the tenant;
+    delegated tokens are kept per user. A cached token is handed out until it
+    is within `refresh_margin_seconds` of expiry, then reacquired, so no caller
+    starts a batch of requests with a token about to lapse.
+    """
+
+    def __init__(self) -> None:
+        self._apps: Dict[Tuple[str, str, str], Any] = {}
+        self._tokens: Dict[Tuple[str, str, str, str], AccessToken] = {}
+        self._locks: Dict[Tuple[str, str, str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _app(self, auth_mode: str, azure: AzureConfig, cache_path: Path) -> Any:
+        key = (auth_mode, azure.client_id, _authority(azure, azure.tenant_id))
+        with self._lock:
+            app = self._apps.get(key)
+            if app is None:
+                build = (
+                    build_public_client
+                    if auth_mode == "delegated"
+                    else build_confidential_client
+                )
+                app = build(azure, cache_path, tenant_id=azure.tenant_id)
+                self._apps[key] = app
+            return app
+
+    def _key_lock(self, key: Tuple[str, str, str, str]) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def token(
+        self,
+        auth_mode: str,
+        azure: AzureConfig,
+        cache_path: Path,
+        username: str,
+        *,
+        refresh_margin_seconds: float = 300.0,
+        force_refresh: bool = False,
+    ) -> AccessToken:
+        """Cached or freshly acquired token for `username`'s mailbox.
+
+        `force_refresh` bypasses this cache and MSAL's, e.g. after Graph
+        rejected the token. Raises RuntimeError when MSAL cannot provide one.
+        """
+        if auth_mode not in {"application", "delegated"}:
+            raise RuntimeError(f"Unknown auth_mode: {auth_mode}")
+        user_key = username.lower() if auth_mode == "delegated" else ""
+        key = (auth_mode, azure.client_id, azure.tenant_id, user_key)
+        # Per-key lock: accounts in other tenants are not held up by a slow
+        # (e.g. interactive) login here.
+        with self._key_lock(key):
+            cached = self._tokens.get(key)
+            if (
+                cached
+                and not force_refresh
+                and not cached.expires_within(refresh_margin_seconds)
+            ):
+                return cached
+            app = self._app(auth_mode, azure, cache_path)
+            # A token we already handed out is due for renewal; MSAL would
+            # return it unchanged from its own cache until much closer to
+            # expiry, so bypass that too.
+            renew = force_refresh or cached is not None
+            if auth_mode == "delegated":
+                result = acquire_delegated_token(
+                    app, azure.delegated_scopes, username, force_refresh=renew
+                )
+                if not result:
+                    raise RuntimeError(f"Delegated auth failed for {username}")
+            else:
+                result = acquire_application_token(app, force_refresh=renew)
+                if not result:
+                    raise RuntimeError("Application auth failed")
+            token = AccessToken(
+                token=result["access_token"],
+                expires_at=time.time() + float(result.get("expires_in") or 3600),
+            )
+            self._tokens[key] = token
+            return token
+
+
+_CREDENTIALS = CredentialManager()
+
+
+def credential_manager() -> CredentialManager:
+    """Return the process-wide credential manager shared by all accounts."""
+    return _CREDENTIALS
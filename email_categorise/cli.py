@@ -1,17 +1,23 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
 import logging
 import subprocess
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 from .config import load_config, AccountConfig
 from .fine_tune import export_reply_dataset, train_local_reply_model
 from .model_client import StructuredLLMRunner, build_model_clients
+from .state_store import open_store
 from .triage_logic import (
+    ainit_account,
+    arun_for_account,
     init_account,
     run_for_account,
     rollback_run,
@@ -75,6 +81,77 @@ def _select_accounts(
     return out
 
 
+class _ThreadPrefixFilter(logging.Filter):
+    """Pass only records logged from threads whose name starts with `prefix`.
+
+    Helper pools inside an account run name their threads after the account
+    worker (`thread_name_prefix`), so their records are included too.
+    """
+
+    def __init__(self, prefix: str) -> None:
+        super().__init__()
+        self.prefix = prefix
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        name = record.threadName or ""
+        return name == self.prefix or name.startswith(
+            (self.prefix + "_", self.prefix + "-")
+        )
+
+
+def _run_accounts(
+    repo_root: Path,
+    cmd: str,
+    accounts: List[AccountConfig],
+    fn: Callable[[AccountConfig], Dict[str, Any]],
+    parallel: int = 1,
+) -> List[Dict[str, Any]]:
+    """Run `fn` for every account, optionally across a thread pool.
+
+    A failing account is logged and reported as `{"account", "error"}` without
+    stopping the others. With `parallel > 1`, each account also gets its own
+    log file under `output/` so interleaved worker output stays readable.
+    Rows are returned in the same order as `accounts`.
+    """
+    stamp = utc_now().strftime("%Y%m%d-%H%M%S")
+    log_dir = repo_root / "output"
+
+    def _one(account: AccountConfig) -> Dict[str, Any]:
+        safe = account.email.replace("@", "_at_").replace("/", "_")
+        handler: Optional[logging.Handler] = None
+        if parallel > 1:
+            thread_name = f"acct-{safe}"
+            threading.current_thread().name = thread_name
+            log_dir.mkdir(parents=True, exist_ok=True)
+            handler = logging.FileHandler(
+                log_dir / f"email_categorise_{cmd}_{stamp}_{safe}.log",
+                encoding="utf-8",
+            )
+            handler.setFormatter(
+                logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+            )
+            handler.addFilter(_ThreadPrefixFilter(thread_name))
+            logging.getLogger().addHandler(handler)
+        try:
+            return fn(account)
+        except Exception as exc:
+            logger.exception("%s failed for %s", cmd, account.email)
+            return {"account": account.email, "error": str(exc) or repr(exc)}
+        finally:
+            if handler is not None:
+                logging.getLogger().removeHandler(handler)
+                handler.close()
+
+    if parallel <= 1 or len(accounts) <= 1:
+        return [_one(a) for a in accounts]
+    with ThreadPoolExecutor(max_workers=min(parallel, len(accounts))) as pool:
+        return list(pool.map(_one, accounts))
+
+
+def _failed_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [r for r in rows if r.get("error")]
+
+
 def _write_report(repo_root: Path, name: str, content: str) -> Path:
     out_dir = repo_root / "output"
     out_dir.mkdir(parents=True, exist_ok=True)
@@ -84,6 +161,21 @@ def _write_report(repo_root: Path, name: str, content: str) -> Path:
     return path
 
 
+def _warn_unmigrated_state(cfg, accounts: List[AccountConfig]) -> None:
+    """Point at `migrate-state` when JSON state exists that the store lacks."""
+    store = open_store(cfg.repo_root)
+    for a in accounts:
+        safe = a.email.replace("@", "_at_").replace("/", "_")
+        legacy = Path(cfg.repo_root) / "data" / safe / "state.json"
+        if legacy.exists() and not store.has_state(a.email):
+            logger.warning(
+                "Found legacy JSON state for %s but nothing in %s; "
+                "run 'migrate-state' to import it.",
+                a.email,
+                store.path,
+            )
+
+
 def main() -> None:
     load_env_file()
     parser = argparse.ArgumentParser("email_categorise")
@@ -100,7 +192,19 @@ def main() -> None:
     )
     p_init.add_argument("-a", "--account", action="append")
     p_init.add_argument("-v", "--verbose", action="count", default=0)
+    p_init.add_argument(
+        "--parallel",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Process up to N accounts concurrently (default: 1)",
+    )
     p_init.add_argument("--run-id", help="Optional run id for this init session")
+    p_init.add_argument(
+        "--async-graph",
+        action="store_true",
+        help="Use the async (httpx) Graph client; needs the 'async' extra",
+    )
 
     p_run = sub.add_parser("run")
     p_run.add_argument(
@@ -111,6 +215,13 @@ def main() -> None:
     )
     p_run.add_argument("-a", "--account", action="append")
     p_run.add_argument("-v", "--verbose", action="count", default=0)
+    p_run.add_argument(
+        "--parallel",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Process up to N accounts concurrently (default: 1)",
+    )
     p_run.add_argument(
         "--draft-replies",
         action=argparse.BooleanOptionalAction,
@@ -143,6 +254,11 @@ def main() -> None:
         "--run-id",
         help="Optional run id; autogenerated if omitted (used for ledger/rollback)",
     )
+    p_run.add_argument(
+        "--async-graph",
+        action="store_true",
+        help="Use the async (httpx) Graph client; needs the 'async' extra",
+    )
     p_run.add_argument(
         "--undo-last",
         action="store_true",
@@ -152,6 +268,16 @@ def main() -> None:
         "--rollback", help="Rollback a specific run-id recorded in the ledger"
     )
 
+    p_migrate = sub.add_parser("migrate-state")
+    p_migrate.add_argument(
+        "--config",
+        "-c",
+        default=str(default_config),
+        help=f"Path to config TOML (default: {default_config})",
+    )
+    p_migrate.add_argument("-a", "--account", action="append")
+    p_migrate.add_argument("-v", "--verbose", action="count", default=0)
+
     p_ft = sub.add_parser("export-finetune")
     p_ft.add_argument(
         "--config",
@@ -161,6 +287,13 @@ def main() -> None:
     )
     p_ft.add_argument("-a", "--account", action="append")
     p_ft.add_argument("-v", "--verbose", action="count", default=0)
+    p_ft.add_argument(
+        "--parallel",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Process up to N accounts concurrently (default: 1)",
+    )
     p_ft.add_argument(
         "--output-dir",
         default="output/finetune",
@@ -234,6 +367,7 @@ def main() -> None:
 
     runner_triage: Optional[StructuredLLMRunner] = None
     runner_reply: Optional[StructuredLLMRunner] = None
+    runner_cascade: Optional[StructuredLLMRunner] = None
     if args.cmd in {"run", "init"}:
         # Build model clients/runners for triage + reply using the model registry.
         model_clients = build_model_clients(cfg)
@@ -253,17 +387,36 @@ def main() -> None:
         runner_triage = StructuredLLMRunner(client=model_clients[triage_key])
         runner_reply = StructuredLLMRunner(client=model_clients[reply_key])
 
+        cascade_key = cfg.llm.cascade_model
+        if cascade_key:
+            if cascade_key not in model_clients:
+                raise SystemExit(
+                    f"Unknown cascade model '{cascade_key}' in config; available models: "
+                    f"{', '.join(sorted(model_clients.keys())) or '(none)'}"
+                )
+            runner_cascade = StructuredLLMRunner(client=model_clients[cascade_key])
+
     # Weekly test guard
     if args.cmd in {"run", "init"}:
         _maybe_run_tests(cfg, accounts)
 
+    if args.cmd == "migrate-state":
+        store = open_store(cfg.repo_root)
+        counts = store.import_json(
+            cfg.repo_root / "data",
+            cfg.repo_root / "ledger",
+            [a.email for a in accounts],
+        )
+        print(f"Imported legacy JSON state into {store.path}: {counts}")
+        return
+
+    if args.cmd in {"run", "init"}:
+        _warn_unmigrated_state(cfg, accounts)
+
     if args.cmd == "run" and (args.undo_last or args.rollback):
-        ledger_dir = cfg.repo_root / "ledger"
-        index_path = ledger_dir / "index.json"
         target_run = args.rollback
         if args.undo_last:
-            index = load_json(index_path, {"order": []})
-            order = index.get("order") or []
+            order = open_store(cfg.repo_root).ledger_run_order()
             if not order:
                 raise SystemExit("No runs recorded in ledger to undo.")
             target_run = order[-1]
@@ -274,17 +427,22 @@ def main() -> None:
         return
 
     if args.cmd == "init":
-        rows = []
         run_id = args.run_id or uuid.uuid4().hex[:12]
-        for a in accounts:
+
+        def _init(a: AccountConfig) -> Dict[str, Any]:
             logger.info("Initialising %s (%s)", a.email, a.label)
-            res = init_account(cfg, a, runner_reply, run_id=run_id)
-            rows.append(res)
+            if args.async_graph:
+                return asyncio.run(ainit_account(cfg, a, runner_reply, run_id=run_id))
+            return init_account(cfg, a, runner_reply, run_id=run_id)
+
+        rows = _run_accounts(cfg.repo_root, "init", accounts, _init, args.parallel)
         md = (
             "# init report\n\n"
             + "\n".join(
                 [
-                    f"- **{r['account']}**: sender_stats={r['sender_stats']}, tone_contacts={r['tone_contacts']}"
+                    f"- **{r['account']}**: error={r['error']}"
+                    if r.get("error")
+                    else f"- **{r['account']}**: sender_stats={r['sender_stats']}, tone_contacts={r['tone_contacts']}"
                     for r in rows
                 ]
             )
@@ -292,42 +450,86 @@ def main() -> None:
         )
         report_path = _write_report(cfg.repo_root, "init", md)
         print(f"Report: {report_path}")
+        if _failed_rows(rows):
+            raise SystemExit(f"init failed for {len(_failed_rows(rows))} account(s)")
         return
 
     if args.cmd == "run":
-        rows = []
         run_id = args.run_id or uuid.uuid4().hex[:12]
-        for a in accounts:
+
+        def _run(a: AccountConfig) -> Dict[str, Any]:
             logger.info("Running triage for %s (%s)", a.email, a.label)
-            res = run_for_account(cfg, a, runner_triage, runner_reply, run_id=run_id)
-            rows.append(res)
+            if args.async_graph:
+                # One event loop per account thread.
+                return asyncio.run(
+                    arun_for_account(
+                        cfg,
+                        a,
+                        runner_triage,
+                        runner_reply,
+                        run_id=run_id,
+                        runner_cascade=runner_cascade,
+                    )
+                )
+            return run_for_account(
+                cfg,
+                a,
+                runner_triage,
+                runner_reply,
+                run_id=run_id,
+                runner_cascade=runner_cascade,
+            )
+
+        rows = _run_accounts(cfg.repo_root, "run", accounts, _run, args.parallel)
         md_lines = ["# run report", ""]
         for r in rows:
+            if r.get("error"):
+                md_lines.append(f"- **{r['account']}**: error={r['error']}")
+                continue
             md_lines.append(
-                f"- **{r['account']}**: processed={r.get('processed')}, drafts={r.get('drafts')}, tasks={r.get('tasks')}, informational={r.get('informational')}, summary_sent={r.get('summary_sent')}"
+                f"- **{r['account']}**: processed={r.get('processed')}, pre_triaged={r.get('pre_triaged')}, escalated={r.get('escalated')}, latency_saved_seconds={r.get('latency_saved_seconds')}, patch_failures={r.get('patch_failures')}, drafts={r.get('drafts')}, tasks={r.get('tasks')}, informational={r.get('informational')}, summary_sent={r.get('summary_sent')}, graph_retries={r.get('graph_retries')}, graph_sleep_seconds={r.get('graph_sleep_seconds')}"
             )
         md_lines.append("")
+        md_lines.append(
+            f"Totals: accounts={len(rows)}, failed={len(_failed_rows(rows))}, "
+            f"processed={sum(r.get('processed') or 0 for r in rows)}, "
+            f"drafts={sum(r.get('drafts') or 0 for r in rows)}, "
+            f"tasks={sum(r.get('tasks') or 0 for r in rows)}"
+        )
+        md_lines.append("")
         report_path = _write_report(cfg.repo_root, "run", "\n".join(md_lines))
         print(f"Report: {report_path}")
+        if _failed_rows(rows):
+            raise SystemExit(f"run failed for {len(_failed_rows(rows))} account(s)")
         return
 
     if args.cmd == "export-finetune":
         out_dir = Path(cfg.repo_root) / args.output_dir
         out_dir.mkdir(parents=True, exist_ok=True)
-        rows = []
-        for a in accounts:
+
+        def _export(a: AccountConfig) -> Dict[str, Any]:
             logger.info("Exporting fine-tune dataset for %s (%s)", a.email, a.label)
             path = out_dir / f"finetune_{a.email.replace('@','_at_')}.jsonl"
-            res = export_reply_dataset(cfg, a, path, max_messages=args.max_messages)
-            rows.append(res)
+            return export_reply_dataset(cfg, a, path, max_messages=args.max_messages)
+
+        rows = _run_accounts(
+            cfg.repo_root, "export-finetune", accounts, _export, args.parallel
+        )
         md_lines = ["# export-finetune report", ""]
         for r in rows:
+            if r.get("error"):
+                md_lines.append(f"- **{r['account']}**: error={r['error']}")
+                continue
             md_lines.append(
                 f"- **{r['account']}**: examples={r['examples']}, path={r['path']}"
             )
         md_lines.append("")
         report_path = _write_report(cfg.repo_root, "export-finetune", "\n".join(md_lines))
         print(f"Report: {report_path}")
+        if _failed_rows(rows):
+            raise SystemExit(
+                f"export-finetune failed for {len(_failed_rows(rows))} account(s)"
+            )
         return
 
     if args.cmd == "train-finetune":
@@ -1,69 +1,66 @@
 from __future__ import annotations
 
-import json
 import logging
 import subprocess
+import tempfile
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import List
 
 logger = logging.getLogger("email_categorise.codex")
 
 
-class CodexRunner:
-    def __init__(self, repo_root: Path, provider: str, model: str) -> None:
-        self.repo_root = repo_root
-        self.provider = provider  # codex | codex-oss
-        self.model = model
+@lru_cache(maxsize=None)
+def resolve_schema_path(path: str) -> Path:
+    """Resolve and check a schema path once per process."""
+    resolved = Path(path).expanduser().resolve()
+    if not resolved.exists():
+        raise FileNotFoundError(f"Schema file not found: {resolved}")
+    return resolved
 
-    def run_with_schema(
-        self, prompt: str, schema_path: Path, output_path: Path
-    ) -> Dict[str, Any]:
-        """Execute `codex exec` with a JSON schema and return the parsed output.
 
-        The prompt is piped via stdin, Codex writes the structured result to
-        `output_path` (for auditability), and this helper returns the parsed
-        JSON payload.
-        """
-        schema_path = schema_path.resolve()
-        output_path.parent.mkdir(parents=True, exist_ok=True)
+def run_codex(cmd: List[str], prompt: str, schema_path: Path) -> str:
+    """Run one `codex exec` call and return its last message.
 
-        cmd = [
-            "codex",
-            "exec",
-            "-",  # read prompt from stdin
-            "--model",
-            self.model,
+    `cmd` is the command line without the schema/output flags, which are added
+    here. `codex exec` is one-shot, so every call is its own process with its
+    own scratch directory; concurrency is capped by the caller (the model's
+    `max_concurrency`). The prompt is written through `communicate`, so a
+    child that exits before reading it is reported by its exit status.
+    """
+    schema = resolve_schema_path(str(schema_path))
+    with tempfile.TemporaryDirectory(prefix="email_categorise_codex_") as td:
+        out_path = Path(td) / "last_message.txt"
+        full_cmd = cmd + [
             "--output-schema",
-            str(schema_path),
-            "-o",
-            str(output_path),
-            "--skip-git-repo-check",
-            "--sandbox",
-            "read-only",
-            "--cd",
-            str(self.repo_root),
+            str(schema),
+            "--output-last-message",
+            str(out_path),
         ]
-        if self.provider == "codex-oss":
-            cmd.append("--oss")
-
-        logger.debug("Running: %s", " ".join(cmd))
-
+        logger.debug("Running Codex CLI: %s", " ".join(full_cmd))
         proc = subprocess.run(
-            cmd,
+            full_cmd,
             input=prompt,
             text=True,
             capture_output=True,
         )
-
-        # Codex streams progress to stderr; capture it for logs.
-        if proc.stderr:
-            logger.debug("codex stderr: %s", proc.stderr[-2000:])
+        stdout = proc.stdout or ""
+        stderr = proc.stderr or ""
+        for label, text in (("stdout", stdout), ("stderr", stderr)):
+            for line in text.splitlines():
+                logger.debug("codex %s: %s", label, line)
 
         if proc.returncode != 0:
+            logger.error(
+                "codex exec failed (rc=%s). stderr=%s", proc.returncode, stderr.strip()
+            )
             raise RuntimeError(
-                f"codex exec failed (code {proc.returncode}): {proc.stderr.strip()}"
+                "codex exec failed. "
+                f"rc={proc.returncode}. "
+                f"stderr={stderr.strip()[:1000]} "
+                f"stdout={stdout.strip()[:1000]}"
             )
-
-        # Output written to file (-o). Parse it.
-        content = output_path.read_text(encoding="utf-8").strip()
-        return json.loads(content)
+        if out_path.exists():
+            return out_path.read_text(encoding="utf-8")
+        # Fallback. Not expected when --output-last-message works.
+        return stdout
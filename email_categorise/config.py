@@ -12,6 +12,8 @@ import toml  # type: ignore[import]
 class AuthConfig:
     auth_mode: str = "application"  # application | delegated
     token_cache_path: str = "./data/msal_token_cache.bin"
+    # Cached access tokens are reacquired this long before they expire.
+    token_refresh_margin_seconds: float = 300.0
 
 
 @dataclass
@@ -25,16 +27,98 @@ class AzureConfig:
     )
 
 
+@dataclass
+class GraphConfig:
+    # Retry policy for throttled (429/503) and transient 5xx Graph responses.
+    max_retries: int = 5
+    backoff_base_seconds: float = 1.0
+    backoff_max_seconds: float = 60.0
+    # Retry-After is honoured as sent; a request asked to wait longer than
+    # this is given up on.
+    max_retry_after_seconds: float = 300.0
+    # Client-side token bucket per mailbox (0 disables). Graph allows roughly
+    # 10,000 requests per 10 minutes per app per mailbox.
+    mailbox_requests_per_second: float = 15.0
+    mailbox_burst: int = 20
+    # AsyncGraphClient (`run --async-graph`): connection pool size and whether
+    # to negotiate HTTP/2 (used only when the `h2` package is installed).
+    async_max_connections: int = 16
+    http2: bool = True
+    # Master category colours are re-checked against Graph at most this often
+    # per mailbox (sooner if the palette changes). 0 checks on every run.
+    category_sync_ttl_hours: float = 24.0
+    # Local mirror of Inbox / Sent Items listings in the state store; entries
+    # not refreshed for this many days are dropped. 0 disables it.
+    message_cache_days: int = 180
+
+
+@dataclass
+class PreTriageRule:
+    """One local triage rule: all given matchers must match.
+
+    `sender` is a glob against the sender address (e.g. "*@news.example.com"),
+    `subject` a case-insensitive regular expression searched in the subject.
+    """
+
+    category: str
+    sender: Optional[str] = None
+    subject: Optional[str] = None
+
+
+@dataclass
+class PreTriageConfig:
+    # Decide obvious bulk/automated mail locally instead of calling the LLM.
+    enabled: bool = False
+    # Treat a List-Unsubscribe header as a bulk/marketing signal (requests the
+    # message headers from Graph while enabled).
+    use_list_unsubscribe: bool = True
+    # Sender local-part fragments identifying automated senders.
+    noreply_patterns: List[str] = field(
+        default_factory=lambda: [
+            "noreply",
+            "no-reply",
+            "donotreply",
+            "do-not-reply",
+            "notifications",
+            "mailer-daemon",
+        ]
+    )
+    # Subjects (regex, case-insensitive) of automated mail that confirms an order.
+    order_subject_patterns: List[str] = field(
+        default_factory=lambda: [
+            r"order (confirmation|confirmed|received)",
+            r"your order",
+            r"order #?\d+",
+            r"receipt for",
+            r"(has|have) (been )?(shipped|dispatched)",
+        ]
+    )
+    rules: List[PreTriageRule] = field(default_factory=list)
+
+
 @dataclass
 class TriageConfig:
     lookback_days_initial: int = 60
     lookback_days_incremental: int = 3
     max_messages_per_run: int = 40
     tone_profile_lookback_days: int = 120
+    # Inbox sync: "lookback" re-scans the last N days each run; "delta" keeps a
+    # Graph deltaLink per account and only fetches changes since the last run.
+    inbox_sync_mode: str = "lookback"  # lookback | delta
     # Body handling
     body_format: str = "plaintext"  # plaintext | html
     body_max_chars: int = 0  # 0 = unlimited
     thread_max_messages: int = 0  # 0 = unlimited
+    # Triage batching: split a run into chunks of at most N messages and an
+    # estimated token budget per prompt (0 = no token limit).
+    triage_chunk_messages: int = 10
+    triage_chunk_max_tokens: int = 24000
+    # Cache of triage decisions in the state store (0 hours disables).
+    triage_cache_ttl_hours: int = 72
+    triage_cache_max_entries: int = 2000
+    # Messages missing from, or invalid in, a chunk's output are re-issued in
+    # halved sub-chunks down to single messages; at most this many retry calls.
+    triage_max_retries: int = 8
     draft_replies: bool = False
     create_tasks: bool = False
     send_summary_email: bool = False
@@ -65,6 +149,11 @@ class LLMConfig:
     provider: str = "codex"  # codex | codex-oss | openai | openai-compatible | hf-local
     triage_model: str = "gpt-4.1-mini"
     reply_model: str = "gpt-4.1"
+    # Optional cheap first-pass model (key under [models]). Its decisions are
+    # kept when confidence >= cascade_confidence_threshold and no reply is
+    # needed; everything else is escalated to triage_model.
+    cascade_model: Optional[str] = None
+    cascade_confidence_threshold: float = 0.7
 
 
 @dataclass
@@ -80,10 +169,19 @@ class ModelDefinition:
     name: str
     provider: str = "codex"
     model: str = ""
+    # Maximum concurrent calls to this model (shared by every caller).
+    max_concurrency: int = 2
+    # Estimated prompt tokens allowed per triage call; bodies and thread tails
+    # are trimmed to fit (0 = no limit). Leave room for the model's output.
+    context_budget_tokens: int = 0
 
     # OpenAI / HTTP-style providers
     api_key_env: str = "OPENAI_API_KEY"
     base_url: Optional[str] = None
+    # Shared HTTP client settings (one pooled client per model definition).
+    http_timeout_seconds: float = 120.0
+    http_max_connections: int = 0  # 0 = max_concurrency
+    http_keepalive_seconds: float = 30.0
 
     # Codex CLI options
     codex_bin: str = "codex"
@@ -94,6 +192,10 @@ class ModelDefinition:
     hf_device: Optional[str] = None  # e.g. "cuda", "cpu", "auto"
     hf_dtype: Optional[str] = None  # e.g. "float16", "bfloat16"
     hf_max_new_tokens: int = 512
+    hf_quantization: Optional[str] = None  # None, "8bit" or "4bit"
+    hf_batch_size: int = 4  # prompts per batched generate() call
+    # Restrict decoding to tokens that keep the output schema-valid JSON.
+    hf_constrained_decoding: bool = True
 
 
 @dataclass
@@ -111,6 +213,7 @@ class TriageOverrides:
     create_tasks: Optional[bool] = None
     send_summary_email: Optional[bool] = None
     log_to_file: Optional[bool] = None
+    inbox_sync_mode: Optional[str] = None
     body_format: Optional[str] = None
     body_max_chars: Optional[int] = None
     thread_max_messages: Optional[int] = None
@@ -140,6 +243,8 @@ class AppConfig:
     models: Dict[str, ModelDefinition]
     accounts: List[AccountConfig]
     repo_root: Path
+    graph: GraphConfig = field(default_factory=GraphConfig)
+    pre_triage: PreTriageConfig = field(default_factory=PreTriageConfig)
 
     def azure_for_account(self, account: AccountConfig) -> AzureConfig:
         base = replace(self.azure)
@@ -170,6 +275,8 @@ class AppConfig:
             base.send_summary_email = ov.send_summary_email
         if ov.log_to_file is not None:
             base.log_to_file = ov.log_to_file
+        if ov.inbox_sync_mode is not None:
+            base.inbox_sync_mode = ov.inbox_sync_mode
         if ov.body_format is not None:
             base.body_format = ov.body_format
         if ov.body_max_chars is not None:
@@ -238,6 +345,7 @@ def load_config(path: str | Path) -> AppConfig:
 
     auth_raw = raw.get("auth", {})
     azure_raw = raw.get("azure", {})
+    graph_raw = raw.get("graph", {})
     triage_raw = raw.get("triage", {})
     llm_raw = raw.get("llm", {})
     models_raw = raw.get("models", {})
@@ -248,6 +356,9 @@ def load_config(path: str | Path) -> AppConfig:
         token_cache_path=str(
             auth_raw.get("token_cache_path", "./data/msal_token_cache.bin")
         ),
+        token_refresh_margin_seconds=float(
+            auth_raw.get("token_refresh_margin_seconds", 300.0)
+        ),
     )
 
     azure = AzureConfig(
@@ -265,6 +376,48 @@ def load_config(path: str | Path) -> AppConfig:
         ],
     )
 
+    graph = GraphConfig(
+        max_retries=int(graph_raw.get("max_retries", 5)),
+        backoff_base_seconds=float(graph_raw.get("backoff_base_seconds", 1.0)),
+        backoff_max_seconds=float(graph_raw.get("backoff_max_seconds", 60.0)),
+        max_retry_after_seconds=float(
+            graph_raw.get("max_retry_after_seconds", 300.0)
+        ),
+        mailbox_requests_per_second=float(
+            graph_raw.get("mailbox_requests_per_second", 15.0)
+        ),
+        mailbox_burst=int(graph_raw.get("mailbox_burst", 20)),
+        async_max_connections=int(graph_raw.get("async_max_connections", 16)),
+        http2=bool(graph_raw.get("http2", True)),
+        category_sync_ttl_hours=float(graph_raw.get("category_sync_ttl_hours", 24.0)),
+        message_cache_days=int(graph_raw.get("message_cache_days", 180)),
+    )
+
+    pre_raw = raw.get("pre_triage", {})
+    pre_defaults = PreTriageConfig()
+    pre_triage = PreTriageConfig(
+        enabled=bool(pre_raw.get("enabled", False)),
+        use_list_unsubscribe=bool(pre_raw.get("use_list_unsubscribe", True)),
+        noreply_patterns=[
+            str(p)
+            for p in pre_raw.get("noreply_patterns", pre_defaults.noreply_patterns)
+        ],
+        order_subject_patterns=[
+            str(p)
+            for p in pre_raw.get(
+                "order_subject_patterns", pre_defaults.order_subject_patterns
+            )
+        ],
+        rules=[
+            PreTriageRule(
+                category=str(r["category"]),
+                sender=r.get("sender"),
+                subject=r.get("subject"),
+            )
+            for r in pre_raw.get("rules", [])
+        ],
+    )
+
     triage_default_read_state = TriageConfig().priority_read_state
     triage_read_state = {
         **triage_default_read_state,
@@ -278,6 +431,7 @@ def load_config(path: str | Path) -> AppConfig:
         tone_profile_lookback_days=int(
             triage_raw.get("tone_profile_lookback_days", 120)
         ),
+        inbox_sync_mode=str(triage_raw.get("inbox_sync_mode", "lookback")),
         body_format=str(
             os.getenv("TRIAGE_BODY_FORMAT", triage_raw.get("body_format", "plaintext"))
         ),
@@ -292,6 +446,13 @@ def load_config(path: str | Path) -> AppConfig:
                 triage_raw.get("thread_max_messages", 0) or 0,
             )
         ),
+        triage_chunk_messages=int(triage_raw.get("triage_chunk_messages", 10)),
+        triage_chunk_max_tokens=int(triage_raw.get("triage_chunk_max_tokens", 24000)),
+        triage_cache_ttl_hours=int(triage_raw.get("triage_cache_ttl_hours", 72)),
+        triage_max_retries=int(triage_raw.get("triage_max_retries", 8)),
+        triage_cache_max_entries=int(
+            triage_raw.get("triage_cache_max_entries", 2000)
+        ),
         draft_replies=bool(triage_raw.get("draft_replies", False)),
         create_tasks=bool(triage_raw.get("create_tasks", False)),
         send_summary_email=bool(triage_raw.get("send_summary_email", False)),
@@ -305,6 +466,10 @@ def load_config(path: str | Path) -> AppConfig:
         provider=str(llm_raw.get("provider", "codex")),
         triage_model=str(llm_raw.get("triage_model", "gpt-4.1-mini")),
         reply_model=str(llm_raw.get("reply_model", "gpt-4.1")),
+        cascade_model=llm_raw.get("cascade_model") or None,
+        cascade_confidence_threshold=float(
+            llm_raw.get("cascade_confidence_threshold", 0.7)
+        ),
     )
 
     # Build model registry (optional in TOML; we fall back to llm.* values).
@@ -313,27 +478,43 @@ def load_config(path: str | Path) -> AppConfig:
         # Each table under [models] becomes one ModelDefinition.
         provider = str(m.get("provider", llm.provider or "codex"))
         model_id = str(m.get("model", "") or "")
+        max_concurrency = int(m.get("max_concurrency", 2))
+        context_budget_tokens = int(m.get("context_budget_tokens", 0))
         api_key_env = str(m.get("api_key_env", "OPENAI_API_KEY"))
         base_url = m.get("base_url")
+        http_timeout_seconds = float(m.get("http_timeout_seconds", 120.0))
+        http_max_connections = int(m.get("http_max_connections", 0))
+        http_keepalive_seconds = float(m.get("http_keepalive_seconds", 30.0))
         codex_bin = str(m.get("codex_bin", "codex"))
         codex_profile = m.get("codex_profile")
         codex_config = [str(s) for s in m.get("codex_config", [])]
         hf_device = m.get("hf_device")
         hf_dtype = m.get("hf_dtype")
         hf_max_new_tokens = int(m.get("hf_max_new_tokens", 512))
+        hf_quantization = m.get("hf_quantization")
+        hf_batch_size = int(m.get("hf_batch_size", 4))
+        hf_constrained_decoding = bool(m.get("hf_constrained_decoding", True))
 
         models[name] = ModelDefinition(
             name=name,
             provider=provider,
             model=model_id or name,
+            max_concurrency=max_concurrency,
+            context_budget_tokens=context_budget_tokens,
             api_key_env=api_key_env,
             base_url=base_url,
+            http_timeout_seconds=http_timeout_seconds,
+            http_max_connections=http_max_connections,
+            http_keepalive_seconds=http_keepalive_seconds,
             codex_bin=codex_bin,
             codex_profile=codex_profile,
             codex_config=codex_config,
             hf_device=hf_device,
             hf_dtype=hf_dtype,
             hf_max_new_tokens=hf_max_new_tokens,
+            hf_quantization=hf_quantization,
+            hf_batch_size=hf_batch_size,
+            hf_constrained_decoding=hf_constrained_decoding,
         )
 
     # Backwards compatibility: if no models are defined, or if llm.triage_model /
@@ -379,6 +560,7 @@ def load_config(path: str | Path) -> AppConfig:
             create_tasks=triage_ov_raw.get("create_tasks"),
             send_summary_email=triage_ov_raw.get("send_summary_email"),
             log_to_file=triage_ov_raw.get("log_to_file"),
+            inbox_sync_mode=triage_ov_raw.get("inbox_sync_mode"),
             body_format=triage_ov_raw.get("body_format"),
             body_max_chars=triage_ov_raw.get("body_max_chars"),
             thread_max_messages=triage_ov_raw.get("thread_max_messages"),
@@ -407,4 +589,6 @@ def load_config(path: str | Path) -> AppConfig:
         models=models,
         accounts=accounts,
         repo_root=repo_root,
+        graph=graph,
+        pre_triage=pre_triage,
     )
@@ -0,0 +1,559 @@
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .graph_client import (
+    _BODY_PAGE_SIZE,
+    _DELTA_HEADERS,
+    GRAPH_PAGE_MAX,
+    TokenProvider,
+    _batch_chunks,
+    _batch_pending,
+    _batch_round,
+    _category_requests,
+    _category_results,
+    _chunk_idempotent,
+    _conversation_page,
+    _conversation_params,
+    _conversation_requests,
+    _delta_result,
+    _delta_start,
+    _draft_id,
+    _GraphClientBase,
+    _html_body,
+    _inbox_since_params,
+    _log_batch_failures,
+    _message_requests,
+    _message_results,
+    _mirror_merge,
+    _paged_params,
+    _relisted,
+    _patch_requests,
+    _patch_statuses,
+    _plan_category_updates,
+    _retry_delay,
+    _send_mail_body,
+    _sent_since_params,
+    _since,
+    _take_page,
+    _thread_order,
+    _UnprocessedCursor,
+    _with_select,
+    logger,
+)
+from .graph_retry import RetryPolicy, TokenBucket, parse_retry_after
+from .message_cache import MessageCache, with_change_key
+
+
+class AsyncGraphClient(_GraphClientBase):
+    """asyncio counterpart of `GraphClient` on a pooled `httpx.AsyncClient`.
+
+    Same mailbox scoping, retry policy, retry stats and per-mailbox token
+    bucket as the sync client, and the same request builders and response
+    handlers; only the transport differs. `list_*` methods are async
+    generators. Requests share one connection pool of `max_connections`, over
+    HTTP/2 when `http2` is set and the `h2` package is installed. Use as an
+    async context manager (or call `aclose`) to release the pool.
+    """
+
+    def __init__(
+        self,
+        access_token: str,
+        user: str,
+        base_url: str = "https://graph.microsoft.com/v1.0",
+        *,
+        retry_policy: Optional[RetryPolicy] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        max_connections: int = 16,
+        http2: bool = True,
+        timeout_seconds: float = 60.0,
+        token_provider: Optional[TokenProvider] = None,
+        token_refresh_margin_seconds: float = 300.0,
+        message_cache: Optional[MessageCache] = None,
+    ) -> None:
+        try:
+            import httpx  # type: ignore[import]
+        except Exception as exc:  # pragma: no cover
+            raise RuntimeError(
+                "The 'httpx' Python package is required for the async Graph client. "
+                "Install the 'async' extra, or run without --async-graph."
+            ) from exc
+
+        super().__init__(
+            access_token,
+            user,
+            base_url,
+            retry_policy=retry_policy,
+            rate_limiter=rate_limiter,
+            token_provider=token_provider,
+            token_refresh_margin_seconds=token_refresh_margin_seconds,
+            message_cache=message_cache,
+        )
+        self._httpx = httpx
+        use_http2 = http2 and importlib.util.find_spec("h2") is not None
+        self.client = httpx.AsyncClient(
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "Accept": "application/json",
+            },
+            limits=httpx.Limits(
+                max_connections=max(1, max_connections),
+                max_keepalive_connections=max(1, max_connections),
+            ),
+            timeout=httpx.Timeout(timeout_seconds),
+            http2=use_http2,
+        )
+        # Concurrent coroutines renew once while the provider runs off-loop.
+        self._token_lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "AsyncGraphClient":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    def _set_auth_header(self, token: str) -> None:
+        self.client.headers["Authorization"] = f"Bearer {token}"
+
+    async def _renew_token(
+        self, force: bool = False, rejected: Optional[str] = None
+    ) -> None:
+        """See `GraphClient._renew_token`; the provider may block on MSAL, so
+        it runs on a worker thread."""
+        if not self._token_due(force, rejected):
+            return
+        async with self._token_lock:
+            if self._token_due(force, rejected):
+                self._set_token(
+                    *await asyncio.to_thread(self.token_provider, force)  # type: ignore[arg-type]
+                )
+
+    async def _request(
+        self, method: str, url: str, *, idempotent: bool = True, **kwargs: Any
+    ) -> Any:
+        """Send one request with the same retry rules as `GraphClient._request`."""
+        httpx = self._httpx
+        attempt = 0
+        replayed = False
+        while True:
+            await self._renew_token()
+            self.stats.record_sleep(await self.rate_limiter.aacquire())
+            status: Optional[int] = None
+            retry_after: Optional[float] = None
+            sent_token = self.access_token
+            try:
+                resp = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError as exc:
+                if not self.retry_policy.should_retry(None, attempt, idempotent):
+                    raise
+                logger.warning("Graph %s %s failed: %s", method, url, exc)
+            else:
+                status = resp.status_code
+                if status == 401 and self.token_provider and not replayed:
+                    logger.warning("Graph %s %s returned 401; renewing token", method, url)
+                    await self._renew_token(force=True, rejected=sent_token)
+                    replayed = True
+                    continue
+                retry_after = parse_retry_after(resp.headers)
+                retryable = self.retry_policy.should_retry(
+                    status, attempt, idempotent
+                ) and not self.retry_policy.retry_after_too_long(retry_after)
+                if resp.is_success or not retryable:
+                    if not resp.is_success:
+                        logger.error(
+                            "Graph %s %s failed: %s", method, resp.url, resp.text
+                        )
+                        resp.raise_for_status()
+                    return resp
+
+            attempt += 1
+            await asyncio.sleep(
+                _retry_delay(
+                    self.retry_policy,
+                    self.stats,
+                    method,
+                    url,
+                    status,
+                    attempt,
+                    retry_after,
+                )
+            )
+
+    async def _get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        resp = await self._request("GET", url, params=params, headers=headers)
+        return resp.json()
+
+    async def _patch(self, url: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        resp = await self._request("PATCH", url, json=body)
+        return resp.json() if resp.text else {}
+
+    async def _post(
+        self, url: str, body: Dict[str, Any], *, idempotent: bool = False
+    ) -> Dict[str, Any]:
+        resp = await self._request("POST", url, idempotent=idempotent, json=body)
+        return resp.json() if resp.text else {}
+
+    async def _delete(self, url: str) -> None:
+        await self._request("DELETE", url)
+
+    async def iter_pages(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        *,
+        max_items: Optional[int] = None,
+        page_size: Optional[int] = None,
+        headers: Optional[Dict[str, str]] = None,
+        prefetch: bool = True,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """See `GraphClient.iter_pages`; the next page is prefetched as a task."""
+        remaining = max_items
+        pending: Optional["asyncio.Future[Dict[str, Any]]"] = None
+        try:
+            data = await self._get(
+                url, params=_paged_params(params, page_size, max_items), headers=headers
+            )
+            while True:
+                page, remaining, next_url = _take_page(data, remaining)
+                if next_url and prefetch:
+                    pending = asyncio.ensure_future(
+                        self._get(next_url, headers=headers)
+                    )
+                if page:
+                    yield page
+                if not next_url:
+                    return
+                if pending is not None:
+                    data, pending = await pending, None
+                else:
+                    data = await self._get(next_url, headers=headers)
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def iter_items(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        async for page in self.iter_pages(url, params, **kwargs):
+            for item in page:
+                yield item
+
+    async def get_messages(
+        self, message_ids: List[str], select: str
+    ) -> Dict[str, Dict[str, Any]]:
+        """See `GraphClient.get_messages`."""
+        if not message_ids:
+            return {}
+        responses = await self.batch(
+            _message_requests(self._user_path, message_ids, select)
+        )
+        return _message_results(message_ids, responses)
+
+    async def _mirrored_items(
+        self,
+        url: str,
+        params: Dict[str, Any],
+        *,
+        max_items: int,
+        page_size: int,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """See `GraphClient._mirrored_items`."""
+        cache = self.message_cache
+        if cache is None or not cache.enabled:
+            async for item in self.iter_items(
+                url, params, max_items=max_items, page_size=page_size
+            ):
+                yield item
+            return
+        select = with_change_key(params["$select"])
+        page_url: Optional[str] = url
+        page_params: Optional[Dict[str, Any]] = _paged_params(
+            dict(params, **{"$select": "id,changeKey"}), page_size, max_items
+        )
+        remaining: Optional[int] = max_items
+        served = 0
+        cold = False
+        while page_url:
+            data = await self._get(page_url, params=page_params)
+            stub_page, remaining, next_url = _take_page(data, remaining)
+            hits, stale = cache.lookup(stub_page, select)
+            if not hits and not served:
+                cold = True
+                break
+            fetched: Dict[str, Dict[str, Any]] = {}
+            if stale:
+                listed = await self._get(*_with_select(page_url, page_params, select))
+                fetched, missing = _relisted(listed.get("value", []), stale)
+                if missing:
+                    fetched.update(await self.get_messages(missing, select))
+                cache.put_many(fetched.values(), select)
+            for msg in _mirror_merge(stub_page, hits, fetched):
+                served += 1
+                yield msg
+            page_url, page_params = next_url, None
+        if cold:
+            async for page in self.iter_pages(
+                url,
+                dict(params, **{"$select": select}),
+                max_items=max_items,
+                page_size=page_size,
+            ):
+                cache.put_many(page, select)
+                for item in page:
+                    yield item
+        cache.prune()
+
+    async def iter_inbox_unprocessed_pages(
+        self,
+        days_back: int,
+        max_messages: int = 100,
+        *,
+        include_headers: bool = False,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield unprocessed inbox messages a page (up to 50) at a time, paged
+        on `receivedDateTime` like `GraphClient.iter_inbox_unprocessed_pages`."""
+        url = f"{self._user_root}/mailFolders/Inbox/messages"
+        cursor = _UnprocessedCursor(_since(days_back), max_messages, include_headers)
+        while not cursor.done:
+            page = cursor.take(await self._get(*cursor.request(url)))
+            if page:
+                yield page
+
+    async def list_inbox_unprocessed_messages(
+        self,
+        days_back: int,
+        max_messages: int = 100,
+        *,
+        include_headers: bool = False,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Recent inbox messages that have not yet been tagged as Processed."""
+        async for page in self.iter_inbox_unprocessed_pages(
+            days_back, max_messages, include_headers=include_headers
+        ):
+            for m in page:
+                yield m
+
+    async def list_inbox_delta(
+        self,
+        delta_link: Optional[str],
+        days_back: int,
+        max_messages: int = 100,
+        *,
+        include_headers: bool = False,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """See `GraphClient.list_inbox_delta`.
+
+        Not a generator: Graph only hands out the deltaLink after the last
+        page, and the result is filtered and sorted as a whole.
+        """
+        url: Optional[str]
+        url, params = _delta_start(
+            self._user_root, delta_link, days_back, include_headers
+        )
+        changed: List[Dict[str, Any]] = []
+        new_link: Optional[str] = None
+        while url:
+            data = await self._get(url, params=params, headers=_DELTA_HEADERS)
+            params = None
+            changed.extend(data.get("value", []))
+            url = data.get("@odata.nextLink")
+            new_link = data.get("@odata.deltaLink") or new_link
+        return _delta_result(changed, new_link, max_messages)
+
+    def list_inbox_messages_since(
+        self, days_back: int, max_messages: int = 500
+    ) -> AsyncIterator[Dict[str, Any]]:
+        return self._mirrored_items(
+            f"{self._user_root}/mailFolders/Inbox/messages",
+            _inbox_since_params(days_back),
+            max_items=max_messages,
+            page_size=GRAPH_PAGE_MAX,
+        )
+
+    def list_sent_messages_since(
+        self, days_back: int, max_messages: int = 500
+    ) -> AsyncIterator[Dict[str, Any]]:
+        return self._mirrored_items(
+            f"{self._user_root}/mailFolders/SentItems/messages",
+            _sent_since_params(days_back),
+            max_items=max_messages,
+            page_size=_BODY_PAGE_SIZE,
+        )
+
+    async def list_conversation_messages(
+        self, conversation_id: str, max_messages: int = 20
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Messages of one conversation, oldest first."""
+        if not conversation_id:
+            return
+        out = [
+            m
+            async for m in self.iter_items(
+                f"{self._user_root}/messages",
+                _conversation_params(conversation_id),
+                max_items=max_messages,
+                page_size=_BODY_PAGE_SIZE,
+                prefetch=False,
+            )
+        ]
+        for m in _thread_order(out):
+            yield m
+
+    async def list_conversations_messages(
+        self, conversation_ids: List[Optional[str]], max_messages: int = 20
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """See `GraphClient.list_conversations_messages` (one $batch fetch)."""
+        unique = list(dict.fromkeys(c for c in conversation_ids if c))
+        if not unique:
+            return {}
+        responses = await self.batch(
+            _conversation_requests(self._user_path, unique, max_messages)
+        )
+        threads: Dict[str, List[Dict[str, Any]]] = {}
+        for i, conv in enumerate(unique):
+            first = _conversation_page(responses.get(str(i)))
+            if first is None:
+                threads[conv] = [
+                    m async for m in self.list_conversation_messages(conv, max_messages)
+                ]
+                continue
+            out, url = first
+            if url and len(out) < max_messages:
+                async for page in self.iter_pages(
+                    url, max_items=max_messages - len(out), prefetch=False
+                ):
+                    out.extend(page)
+            threads[conv] = _thread_order(out)[:max_messages]
+        return threads
+
+    async def update_message(self, message_id: str, patch_body: Dict[str, Any]) -> None:
+        await self._patch(f"{self._user_root}/messages/{message_id}", patch_body)
+
+    async def _post_batch_chunk(
+        self, chunk: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        # Graph meters each sub-request against the mailbox limits, so the
+        # outer POST draws the remaining tokens for the chunk.
+        self.stats.record_sleep(await self.rate_limiter.aacquire(len(chunk) - 1))
+        return await self._post(
+            f"{self.base_url}/$batch",
+            {"requests": chunk},
+            idempotent=_chunk_idempotent(chunk),
+        )
+
+    async def batch(
+        self,
+        sub_requests: List[Dict[str, Any]],
+        *,
+        max_retries: Optional[int] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """See `GraphClient.batch`; the 20-request POSTs of a round run concurrently."""
+        if max_retries is None:
+            max_retries = self.retry_policy.max_retries
+        results: Dict[str, Dict[str, Any]] = {}
+        pending = _batch_pending(sub_requests)
+
+        attempt = 0
+        while pending:
+            chunks = _batch_chunks(pending)
+            replies = await asyncio.gather(
+                *(self._post_batch_chunk(chunk) for chunk in chunks)
+            )
+            pending, delay = _batch_round(
+                self.retry_policy,
+                self.stats,
+                chunks,
+                list(replies),
+                results,
+                attempt,
+                max_retries,
+            )
+            if pending:
+                attempt += 1
+                await asyncio.sleep(delay)
+
+        _log_batch_failures(results)
+        return results
+
+    async def update_messages(
+        self,
+        patches: Dict[str, Dict[str, Any]],
+        *,
+        max_retries: Optional[int] = None,
+    ) -> Dict[str, int]:
+        """PATCH many messages through $batch; returns message id -> status."""
+        if not patches:
+            return {}
+        responses = await self.batch(
+            _patch_requests(self._user_path, patches), max_retries=max_retries
+        )
+        return _patch_statuses(patches, responses)
+
+    async def create_draft_reply(
+        self, message_id: str, reply_body_html: str
+    ) -> Optional[str]:
+        """Create a draft reply for a message and return the draft id (None on failure)."""
+        data = await self._post(
+            f"{self._user_root}/messages/{message_id}/createReply", {}
+        )
+        draft_id = _draft_id(data, message_id)
+        if draft_id:
+            await self._patch(
+                f"{self._user_root}/messages/{draft_id}", _html_body(reply_body_html)
+            )
+        return draft_id
+
+    async def delete_message(self, message_id: str) -> None:
+        await self._delete(f"{self._user_root}/messages/{message_id}")
+
+    async def send_mail(
+        self, subject: str, html_body: str, to_address: str, save_to_sent: bool = True
+    ) -> None:
+        await self._post(
+            f"{self._user_root}/sendMail",
+            _send_mail_body(subject, html_body, to_address, save_to_sent),
+        )
+
+    def list_master_categories(self) -> AsyncIterator[Dict[str, Any]]:
+        return self.iter_items(
+            f"{self._user_root}/outlook/masterCategories",
+            {"$select": "id,displayName,color"},
+            prefetch=False,
+        )
+
+    async def create_master_category(
+        self, display_name: str, color: str
+    ) -> Dict[str, Any]:
+        body = {"displayName": display_name, "color": color}
+        return await self._post(f"{self._user_root}/outlook/masterCategories", body)
+
+    async def update_master_category(
+        self, category_id: str, color: str
+    ) -> Dict[str, Any]:
+        return await self._patch(
+            f"{self._user_root}/outlook/masterCategories/{category_id}",
+            {"color": color},
+        )
+
+    async def ensure_master_categories(
+        self, desired_colors: Dict[str, str]
+    ) -> Dict[str, str]:
+        """See `GraphClient.ensure_master_categories`."""
+        existing = [c async for c in self.list_master_categories()]
+        plan = _plan_category_updates(desired_colors, existing)
+        actions, sub_requests, names = _category_requests(self._user_path, plan)
+        responses = await self.batch(sub_requests) if sub_requests else {}
+        return _category_results(actions, names, responses)
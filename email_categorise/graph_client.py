@@ -1,16 +1,303 @@
 from __future__ import annotations
 
 import logging
+import threading
 import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import timedelta, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
 
 import requests  # type: ignore[import]
 
+from .graph_retry import (
+    RETRYABLE_STATUSES,
+    RetryPolicy,
+    RetryStats,
+    TokenBucket,
+    parse_retry_after,
+)
+from .message_cache import MessageCache, with_change_key
 from .utils import utc_now
 
 logger = logging.getLogger("email_categorise.graph")
 
+# Graph rejects JSON batches with more than 20 sub-requests.
+# https://learn.microsoft.com/graph/json-batching
+GRAPH_BATCH_MAX = 20
+# Largest $top Graph honours for message collections.
+GRAPH_PAGE_MAX = 1000
+# Pages carrying full message bodies are slow to serve at the maximum size.
+_BODY_PAGE_SIZE = 100
+_CONVERSATION_SELECT = "id,subject,from,toRecipients,ccRecipients,receivedDateTime,sentDateTime,bodyPreview,uniqueBody,isRead"
+# Called with force_refresh; returns (access_token, expires_at epoch seconds).
+TokenProvider = Callable[[bool], Tuple[str, float]]
+_INBOX_SELECT = "id,subject,from,receivedDateTime,bodyPreview,uniqueBody,conversationId,categories,flag,importance,isRead,webLink"
+
+
+def _inbox_select(include_headers: bool) -> str:
+    return _INBOX_SELECT + (",internetMessageHeaders" if include_headers else "")
+
+
+def _is_success(status: int) -> bool:
+    return 200 <= status < 300
+
+
+def _since(days_back: int) -> str:
+    """`$filter` timestamp for `days_back` days ago."""
+    since = utc_now() - timedelta(days=days_back)
+    return since.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _mailbox_path(user: str) -> str:
+    """Mailbox path relative to the API version root (used by $batch)."""
+    if user.lower() == "me":
+        return "/me"
+    return f"/users/{user}"
+
+
+# The GraphClient / AsyncGraphClient methods below share these builders for
+# requests and handlers for responses, so each client only adds transport.
+
+
+def _paged_params(
+    params: Optional[Dict[str, Any]],
+    page_size: Optional[int],
+    max_items: Optional[int],
+) -> Optional[Dict[str, Any]]:
+    """Add the `$top` hint, capped at GRAPH_PAGE_MAX and `max_items`."""
+    if not page_size:
+        return params
+    top = min(page_size, GRAPH_PAGE_MAX, max_items or GRAPH_PAGE_MAX)
+    return dict(params or {}, **{"$top": top})
+
+
+def _take_page(
+    data: Dict[str, Any], remaining: Optional[int]
+) -> Tuple[List[Dict[str, Any]], Optional[int], Optional[str]]:
+    """Trim one collection response to `remaining` items.
+
+    Returns the page, the items still wanted and the nextLink to follow
+    (None once the collection or `remaining` is exhausted).
+    """
+    page = data.get("value", [])
+    if remaining is not None:
+        page = page[:remaining]
+        remaining -= len(page)
+    next_url = data.get("@odata.nextLink")
+    if remaining is not None and remaining <= 0:
+        next_url = None
+    return page, remaining, next_url
+
+
+def _message_requests(
+    user_path: str, message_ids: List[str], select: str
+) -> List[Dict[str, Any]]:
+    query = urlencode({"$select": select}, quote_via=quote)
+    return [
+        {"id": str(i), "method": "GET", "url": f"{user_path}/messages/{msg_id}?{query}"}
+        for i, msg_id in enumerate(message_ids)
+    ]
+
+
+def _message_results(
+    message_ids: List[str], responses: Dict[str, Dict[str, Any]]
+) -> Dict[str, Dict[str, Any]]:
+    """Bodies of the message GETs that succeeded, by message id."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for i, msg_id in enumerate(message_ids):
+        resp = responses.get(str(i)) or {}
+        if _is_success(int(resp.get("status") or 0)):
+            out[msg_id] = resp.get("body") or {}
+    return out
+
+
+def _mirror_merge(
+    stub_page: List[Dict[str, Any]],
+    hits: Dict[str, Dict[str, Any]],
+    fetched: Dict[str, Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """A listing page rebuilt from mirror hits and freshly fetched messages."""
+    out = []
+    for stub in stub_page:
+        msg = hits.get(stub["id"]) or fetched.get(stub["id"])
+        if msg is not None:
+            out.append(msg)
+    return out
+
+
+def _with_select(
+    url: str, params: Optional[Dict[str, Any]], select: str
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """The same listing page with another `$select`: in `params` for a first
+    page, rewritten in the query string of a nextLink."""
+    if params is not None:
+        return url, dict(params, **{"$select": select})
+    parts = urlsplit(url)
+    query = [
+        (k, select if k == "$select" else v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+    ]
+    encoded = urlencode(query, quote_via=quote, safe="$,'()/:")
+    return urlunsplit(parts._replace(query=encoded)), None
+
+
+def _relisted(
+    listed: List[Dict[str, Any]], stale: List[str]
+) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    """Stale messages found in a re-listed page, and the ids it no longer
+    returned (moved by mail arriving in between)."""
+    wanted = set(stale)
+    found = {m["id"]: m for m in listed if m.get("id") in wanted}
+    return found, [i for i in stale if i not in found]
+
+
+def _inbox_since_params(days_back: int) -> Dict[str, Any]:
+    return {
+        "$select": "id,subject,from,receivedDateTime,bodyPreview,conversationId,categories,isRead,webLink",
+        "$orderby": "receivedDateTime desc",
+        "$filter": f"receivedDateTime ge {_since(days_back)}",
+    }
+
+
+def _sent_since_params(days_back: int) -> Dict[str, Any]:
+    return {
+        "$select": "id,subject,body,bodyPreview,from,toRecipients,ccRecipients,sentDateTime",
+        "$orderby": "sentDateTime desc",
+        "$filter": f"sentDateTime ge {_since(days_back)}",
+    }
+
+
+# Delta pages are requested at 50 messages, like the other Inbox listings.
+_DELTA_HEADERS = {"Prefer": "odata.maxpagesize=50"}
+
+
+def _delta_start(
+    user_root: str,
+    delta_link: Optional[str],
+    days_back: int,
+    include_headers: bool,
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """URL and params of the first delta request."""
+    if delta_link:
+        return delta_link, None
+    return f"{user_root}/mailFolders/Inbox/messages/delta", {
+        "$select": _inbox_select(include_headers),
+        "$filter": f"receivedDateTime ge {_since(days_back)}",
+        "$orderby": "receivedDateTime desc",
+    }
+
+
+def _delta_result(
+    changed: List[Dict[str, Any]], new_link: Optional[str], max_messages: int
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Drop removed and `Processed` items, newest first, capped at
+    `max_messages`; the deltaLink is withheld when that cap cut messages."""
+    messages = [
+        m
+        for m in changed
+        if "@removed" not in m and "Processed" not in (m.get("categories") or [])
+    ]
+    messages.sort(key=lambda m: m.get("receivedDateTime") or "", reverse=True)
+    if len(messages) > max_messages:
+        new_link = None
+    return messages[:max_messages], new_link
+
+
+def _conversation_params(conversation_id: str) -> Dict[str, Any]:
+    conv_id = conversation_id.replace("'", "''")
+    return {
+        "$select": _CONVERSATION_SELECT,
+        "$filter": f"conversationId eq '{conv_id}'",
+    }
+
+
+def _thread_order(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Oldest first. Graph can return 400 InefficientFilter when combining the
+    conversationId filter with server-side ordering, so sort locally."""
+    return sorted(
+        messages,
+        key=lambda m: m.get("receivedDateTime") or m.get("sentDateTime") or "",
+    )
+
+
+def _conversation_requests(
+    user_path: str, conversation_ids: List[str], max_messages: int
+) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": str(i),
+            "method": "GET",
+            "url": f"{user_path}/messages?"
+            + urlencode(
+                dict(_conversation_params(conv), **{"$top": min(max_messages, 50)}),
+                quote_via=quote,
+            ),
+        }
+        for i, conv in enumerate(conversation_ids)
+    ]
+
+
+def _conversation_page(
+    resp: Optional[Dict[str, Any]],
+) -> Optional[Tuple[List[Dict[str, Any]], Optional[str]]]:
+    """First page and nextLink of a conversation sub-response; None on failure."""
+    resp = resp or {}
+    if not _is_success(int(resp.get("status") or 0)):
+        return None
+    body = resp.get("body") or {}
+    return list(body.get("value", [])), body.get("@odata.nextLink")
+
+
+def _patch_requests(
+    user_path: str, patches: Dict[str, Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": str(i),
+            "method": "PATCH",
+            "url": f"{user_path}/messages/{msg_id}",
+            "body": body,
+        }
+        for i, (msg_id, body) in enumerate(patches.items())
+    ]
+
+
+def _patch_statuses(
+    patches: Dict[str, Dict[str, Any]], responses: Dict[str, Dict[str, Any]]
+) -> Dict[str, int]:
+    return {
+        msg_id: int((responses.get(str(i)) or {}).get("status") or 0)
+        for i, msg_id in enumerate(patches)
+    }
+
+
+def _draft_id(data: Dict[str, Any], message_id: str) -> Optional[str]:
+    """Draft id from a createReply response (None, logged, when missing)."""
+    draft = data.get("message") or data
+    draft_id = draft.get("id")
+    if not draft_id:
+        logger.error("createReply did not return a draft id for %s", message_id)
+    return draft_id
+
+
+def _html_body(html: str) -> Dict[str, Any]:
+    return {"body": {"contentType": "HTML", "content": html}}
+
+
+def _send_mail_body(
+    subject: str, html_body: str, to_address: str, save_to_sent: bool
+) -> Dict[str, Any]:
+    return {
+        "message": {
+            "subject": subject,
+            **_html_body(html_body),
+            "toRecipients": [{"emailAddress": {"address": to_address}}],
+        },
+        "saveToSentItems": bool(save_to_sent),
+    }
+
 
 def _plan_category_updates(
     desired: Dict[str, str], existing: List[Dict[str, Any]]
@@ -43,168 +330,853 @@ def _plan_category_updates(
     return plan
 
 
-class GraphClient:
-    """Thin Microsoft Graph wrapper scoped to a single user/mailbox."""
+def _category_requests(
+    user_path: str, plan: Dict[str, Dict[str, Any]]
+) -> Tuple[Dict[str, str], List[Dict[str, Any]], Dict[str, str]]:
+    """Turn a category plan into $batch sub-requests.
+
+    Returns the action per category name, the sub-requests for the creates
+    and updates, and the sub-request id -> category name map.
+    """
+    actions: Dict[str, str] = {}
+    sub_requests: List[Dict[str, Any]] = []
+    names: Dict[str, str] = {}
+    for name, step in plan.items():
+        action = step.get("action") or "unchanged"
+        color = step.get("color")
+        if action == "update" and not step.get("id"):
+            logger.warning("Category %s missing id during update; recreating", name)
+            action = "create"
+        actions[name] = action
+        if action == "create":
+            req = {
+                "method": "POST",
+                "url": f"{user_path}/outlook/masterCategories",
+                "body": {"displayName": name, "color": color},
+            }
+        elif action == "update":
+            req = {
+                "method": "PATCH",
+                "url": f"{user_path}/outlook/masterCategories/{step['id']}",
+                "body": {"color": color},
+            }
+        else:
+            continue
+        rid = str(len(sub_requests))
+        names[rid] = name
+        sub_requests.append(dict(req, id=rid))
+    return actions, sub_requests, names
+
+
+def _category_results(
+    actions: Dict[str, str],
+    names: Dict[str, str],
+    responses: Dict[str, Dict[str, Any]],
+) -> Dict[str, str]:
+    """Mark categories whose batch sub-request failed as "failed"."""
+    results = dict(actions)
+    for rid, name in names.items():
+        if not _is_success(int((responses.get(rid) or {}).get("status") or 0)):
+            results[name] = "failed"
+    return results
+
+
+# Sub-request methods Graph can apply twice without changing the outcome.
+_IDEMPOTENT_METHODS = {"GET", "PATCH", "PUT", "DELETE"}
+
+
+def _batch_pending(sub_requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Normalise sub-request ids to strings and add JSON content types."""
+    pending = [dict(r, id=str(r["id"])) for r in sub_requests]
+    for r in pending:
+        if "body" in r:
+            r.setdefault("headers", {"Content-Type": "application/json"})
+    return pending
+
+
+def _batch_chunks(pending: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    return [
+        pending[start : start + GRAPH_BATCH_MAX]
+        for start in range(0, len(pending), GRAPH_BATCH_MAX)
+    ]
+
+
+def _chunk_idempotent(chunk: List[Dict[str, Any]]) -> bool:
+    """Whether the outer $batch POST for `chunk` may be sent twice."""
+    return all(str(r.get("method")).upper() in _IDEMPOTENT_METHODS for r in chunk)
+
+
+def _resend_subrequest(
+    req: Dict[str, Any], status: int, retry_after: Optional[float]
+) -> bool:
+    """Whether a failed $batch sub-request is safe to send again.
+
+    GET/PATCH/PUT/DELETE are re-sent on any retryable status (status 0 means
+    Graph did not answer). Anything else, such as the POSTs behind category
+    creation or createReply, is only re-sent when Graph signals it did not
+    process the request: 429, or 503 with Retry-After.
+    """
+    if str(req.get("method")).upper() in _IDEMPOTENT_METHODS:
+        return status == 0 or status in RETRYABLE_STATUSES
+    return status == 429 or (status == 503 and retry_after is not None)
+
+
+def _sort_batch_replies(
+    chunk: List[Dict[str, Any]],
+    data: Dict[str, Any],
+    results: Dict[str, Dict[str, Any]],
+    stats: RetryStats,
+    can_retry: bool,
+) -> Tuple[List[Dict[str, Any]], Optional[float]]:
+    """Record a chunk's sub-responses in `results`.
+
+    Returns the sub-requests to send again and the largest Retry-After hint
+    among them.
+    """
+    retry: List[Dict[str, Any]] = []
+    wait: Optional[float] = None
+    by_id = {r["id"]: r for r in chunk}
+    answered = {}
+    for resp in data.get("responses") or []:
+        rid = str(resp.get("id"))
+        if rid in by_id:
+            answered[rid] = resp
+    for rid, req in by_id.items():
+        # Sub-requests Graph did not answer are treated as transient.
+        resp = answered.get(rid) or {"id": rid, "status": 0, "body": {}}
+        results[rid] = resp
+        status = int(resp.get("status") or 0)
+        hint = parse_retry_after(resp.get("headers") or {})
+        if can_retry and _resend_subrequest(req, status, hint):
+            retry.append(req)
+            stats.record_retry(status or None)
+            if hint is not None:
+                wait = max(wait or 0.0, hint)
+    return retry, wait
+
+
+def _log_batch_failures(results: Dict[str, Dict[str, Any]]) -> None:
+    for rid, resp in results.items():
+        status = int(resp.get("status") or 0)
+        if not _is_success(status):
+            logger.error(
+                "Graph batch sub-request %s failed (status=%s): %s",
+                rid,
+                status,
+                (resp.get("body") or {}).get("error"),
+            )
+
+
+def _batch_round(
+    policy: RetryPolicy,
+    stats: RetryStats,
+    chunks: List[List[Dict[str, Any]]],
+    replies: List[Dict[str, Any]],
+    results: Dict[str, Dict[str, Any]],
+    attempt: int,
+    max_retries: int,
+) -> Tuple[List[Dict[str, Any]], float]:
+    """Record one round of $batch replies in `results`.
+
+    Returns the sub-requests to send in the next round (empty when done) and
+    the delay before it, honouring the largest Retry-After hint seen.
+    """
+    retry: List[Dict[str, Any]] = []
+    wait: Optional[float] = None
+    for chunk, data in zip(chunks, replies):
+        again, hint = _sort_batch_replies(
+            chunk, data, results, stats, attempt < max_retries
+        )
+        retry.extend(again)
+        if hint is not None:
+            wait = max(wait or 0.0, hint)
+    if not retry:
+        return [], 0.0
+    if policy.retry_after_too_long(wait):
+        logger.error(
+            "Graph asked to wait %.0fs before retrying %s batch "
+            "sub-request(s); giving up on them",
+            wait,
+            len(retry),
+        )
+        return [], 0.0
+    delay = policy.delay(attempt + 1, wait)
+    logger.warning(
+        "Retrying %s failed batch sub-request(s) in %.1fs (attempt %s/%s)",
+        len(retry),
+        delay,
+        attempt + 1,
+        max_retries,
+    )
+    stats.record_sleep(delay)
+    return retry, delay
+
+
+def _retry_delay(
+    policy: RetryPolicy,
+    stats: RetryStats,
+    method: str,
+    url: str,
+    status: Optional[int],
+    attempt: int,
+    retry_after: Optional[float],
+) -> float:
+    """Record and log retry number `attempt` of a request; returns its delay."""
+    delay = policy.delay(attempt, retry_after)
+    stats.record_retry(status)
+    stats.record_sleep(delay)
+    logger.warning(
+        "Graph %s %s returned %s; retry %s/%s in %.1fs",
+        method,
+        url,
+        status or "connection error",
+        attempt,
+        policy.max_retries,
+        delay,
+    )
+    return delay
+
+
+class _UnprocessedCursor:
+    """Pages the unprocessed-Inbox listing on `receivedDateTime`, not `$skip`.
+
+    Callers tag messages `Processed` while paging, which shrinks the filtered
+    set under a `$skip` nextLink so later pages would skip messages. Each page
+    is instead a fresh query for messages received at or before the oldest
+    one seen so far; messages already yielded are dropped.
+
+    A full page on a single timestamp cannot be paged past that way, and
+    Graph cannot filter on `id` to break the tie. That timestamp's messages
+    are then listed without the `Processed` filter, a set tagging cannot
+    shrink, by following nextLinks and dropping `Processed` ones locally.
+    Paging then resumes strictly before it.
+    """
+
+    page_size = 50
+
+    def __init__(self, since: str, max_items: int, include_headers: bool) -> None:
+        self.since = since
+        self.remaining = max_items
+        self.include_headers = include_headers
+        self.oldest: Optional[str] = None
+        self.before_oldest = False
+        self.tie: Optional[str] = None
+        self.next_url: Optional[str] = None
+        self.seen: Set[str] = set()
+        self.done = max_items <= 0
+
+    def request(self, url: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """URL and query parameters of the next page."""
+        if self.next_url:
+            return self.next_url, None
+        select = _inbox_select(self.include_headers)
+        if self.tie:
+            return url, {
+                "$select": select,
+                "$filter": f"receivedDateTime eq {self.tie}",
+                "$top": self.page_size,
+            }
+        where = f"receivedDateTime ge {self.since}"
+        if self.oldest:
+            op = "lt" if self.before_oldest else "le"
+            where += f" and receivedDateTime {op} {self.oldest}"
+        return url, {
+            "$select": select,
+            "$orderby": "receivedDateTime desc",
+            "$filter": f"{where} and not(categories/any(c:c eq 'Processed'))",
+            "$top": min(self.page_size, self.remaining),
+        }
+
+    def take(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """The unseen messages of one response, advancing the cursor."""
+        value = data.get("value", [])
+        next_link = data.get("@odata.nextLink")
+        page = [
+            m
+            for m in value
+            if m.get("id") not in self.seen
+            and "Processed" not in (m.get("categories") or [])
+        ][: self.remaining]
+        self.seen.update(m.get("id") for m in page)
+        self.remaining -= len(page)
+        if self.tie:
+            self.next_url = next_link
+            if not next_link:
+                self.oldest, self.before_oldest, self.tie = self.tie, True, None
+            self.done = self.remaining <= 0
+            return page
+        if value:
+            first = value[0].get("receivedDateTime")
+            last = value[-1].get("receivedDateTime")
+            self.oldest, self.before_oldest = last or self.oldest, False
+            if next_link and last and first == last:
+                self.tie = last
+                self.done = self.remaining <= 0
+                return page
+        self.done = not page or not next_link or self.remaining <= 0
+        return page
+
+
+class _GraphClientBase(ABC):
+    """Mailbox scoping, retry settings and token renewal shared by
+    `GraphClient` and `AsyncGraphClient`; subclasses add the transport."""
 
     def __init__(
         self,
         access_token: str,
         user: str,
-        base_url: str = "https://graph.microsoft.com/v1.0",
+        base_url: str,
+        *,
+        retry_policy: Optional[RetryPolicy],
+        rate_limiter: Optional[TokenBucket],
+        token_provider: Optional[TokenProvider],
+        token_refresh_margin_seconds: float,
+        message_cache: Optional[MessageCache],
     ) -> None:
         self.access_token = access_token
         self.user = user  # "me" for delegated, or userPrincipalName for app-only
         self.base_url = base_url.rstrip("/")
+        self.retry_policy = retry_policy or RetryPolicy()
+        # Unlimited unless the caller hands in the shared per-mailbox bucket.
+        self.rate_limiter = rate_limiter or TokenBucket(0, 1)
+        self.stats = RetryStats()
+        # Without a provider the token is static; with one it is renewed near
+        # expiry and after a 401 (expiry unknown until the first request).
+        self.token_provider = token_provider
+        self.token_refresh_margin_seconds = token_refresh_margin_seconds
+        self._token_expires_at: Optional[float] = None
+        # Local mirror consulted by the Inbox / Sent Items listings.
+        self.message_cache = message_cache
+
+    @abstractmethod
+    def _set_auth_header(self, token: str) -> None:
+        """Send `token` as the bearer token on later requests."""
+
+    def _token_due(self, force: bool, rejected: Optional[str] = None) -> bool:
+        if self.token_provider is None:
+            return False
+        if force:
+            # Concurrent requests that hit 401 with the same token renew it
+            # once; the others replay with whatever replaced it.
+            return rejected is None or rejected == self.access_token
+        if self._token_expires_at is None:
+            return True
+        return time.time() + self.token_refresh_margin_seconds >= self._token_expires_at
+
+    def _set_token(self, token: str, expires_at: float) -> None:
+        self._token_expires_at = expires_at
+        if token != self.access_token:
+            logger.info("Renewed Graph access token for %s", self.user)
+            self.access_token = token
+            self._set_auth_header(token)
+
+    @property
+    def _user_path(self) -> str:
+        """Mailbox path relative to the API version root (used by $batch)."""
+        return _mailbox_path(self.user)
+
+    @property
+    def _user_root(self) -> str:
+        return f"{self.base_url}{self._user_path}"
+
+
+class GraphClient(_GraphClientBase):
+    """Thin Microsoft Graph wrapper scoped to a single user/mailbox."""
+
+    def __init__(
+        self,
+        access_token: str,
+        user: str,
+        base_url: str = "https://graph.microsoft.com/v1.0",
+        *,
+        retry_policy: Optional[RetryPolicy] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        token_provider: Optional[TokenProvider] = None,
+        token_refresh_margin_seconds: float = 300.0,
+        message_cache: Optional[MessageCache] = None,
+    ) -> None:
+        super().__init__(
+            access_token,
+            user,
+            base_url,
+            retry_policy=retry_policy,
+            rate_limiter=rate_limiter,
+            token_provider=token_provider,
+            token_refresh_margin_seconds=token_refresh_margin_seconds,
+            message_cache=message_cache,
+        )
         self.session = requests.Session()
         self.session.headers.update(
             {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
         )
+        # The run pipeline's stages and the paginator's prefetch thread share
+        # this client, so renewal (and the header it rewrites) is serialised.
+        self._token_lock = threading.Lock()
 
-    @property
-    def _user_root(self) -> str:
-        if self.user.lower() == "me":
-            return f"{self.base_url}/me"
-        return f"{self.base_url}/users/{self.user}"
-
-    def _get(self, url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        resp = self.session.get(url, params=params)
-        if not resp.ok:
-            logger.error("Graph GET %s failed: %s", resp.url, resp.text)
-            resp.raise_for_status()
+    def _set_auth_header(self, token: str) -> None:
+        self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def _renew_token(self, force: bool = False, rejected: Optional[str] = None) -> None:
+        """Take a fresh token from `token_provider` when the current one is
+        close to expiry, or after a 401 for token `rejected` (`force`)."""
+        if not self._token_due(force, rejected):
+            return
+        with self._token_lock:
+            if self._token_due(force, rejected):
+                self._set_token(*self.token_provider(force))  # type: ignore[misc]
+
+    def _request(
+        self, method: str, url: str, *, idempotent: bool = True, **kwargs: Any
+    ) -> requests.Response:
+        """Send one request, retrying throttling and transient failures.
+
+        429/503 honour Retry-After (giving up when it exceeds the policy's
+        `max_retry_after_seconds`); other 5xx and connection errors use jittered
+        exponential backoff. Non-idempotent calls (sendMail, createReply) are
+        only retried when Graph signals it did not process the request
+        (429/503), so a flaky 500 cannot send the same mail twice. With a
+        `token_provider`, a 401 renews the token and replays the request once.
+        """
+        attempt = 0
+        replayed = False
+        while True:
+            self._renew_token()
+            self.stats.record_sleep(self.rate_limiter.acquire())
+            status: Optional[int] = None
+            retry_after: Optional[float] = None
+            sent_token = self.access_token
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                if not self.retry_policy.should_retry(None, attempt, idempotent):
+                    raise
+                logger.warning("Graph %s %s failed: %s", method, url, exc)
+            else:
+                status = resp.status_code
+                if status == 401 and self.token_provider and not replayed:
+                    # Graph rejected the token before processing the request,
+                    # so even a POST is safe to replay.
+                    logger.warning("Graph %s %s returned 401; renewing token", method, url)
+                    self._renew_token(force=True, rejected=sent_token)
+                    replayed = True
+                    continue
+                retry_after = parse_retry_after(resp.headers)
+                retryable = self.retry_policy.should_retry(
+                    status, attempt, idempotent
+                ) and not self.retry_policy.retry_after_too_long(retry_after)
+                if resp.ok or not retryable:
+                    if not resp.ok:
+                        logger.error(
+                            "Graph %s %s failed: %s", method, resp.url, resp.text
+                        )
+                        resp.raise_for_status()
+                    return resp
+
+            attempt += 1
+            time.sleep(
+                _retry_delay(
+                    self.retry_policy,
+                    self.stats,
+                    method,
+                    url,
+                    status,
+                    attempt,
+                    retry_after,
+                )
+            )
+
+    def _get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        resp = self._request("GET", url, params=params, headers=headers)
         return resp.json()
 
     def _patch(self, url: str, body: Dict[str, Any]) -> Dict[str, Any]:
-        resp = self.session.patch(url, json=body)
-        if not resp.ok:
-            logger.error("Graph PATCH %s failed: %s", resp.url, resp.text)
-            resp.raise_for_status()
+        resp = self._request("PATCH", url, json=body)
         return resp.json() if resp.text else {}
 
-    def _post(self, url: str, body: Dict[str, Any]) -> Dict[str, Any]:
-        resp = self.session.post(url, json=body)
-        if not resp.ok:
-            logger.error("Graph POST %s failed: %s", resp.url, resp.text)
-            resp.raise_for_status()
+    def _post(
+        self, url: str, body: Dict[str, Any], *, idempotent: bool = False
+    ) -> Dict[str, Any]:
+        resp = self._request("POST", url, idempotent=idempotent, json=body)
         return resp.json() if resp.text else {}
 
     def _delete(self, url: str) -> None:
-        resp = self.session.delete(url)
-        if not resp.ok:
-            logger.error("Graph DELETE %s failed: %s", resp.url, resp.text)
-            resp.raise_for_status()
+        self._request("DELETE", url)
+
+    def iter_pages(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        *,
+        max_items: Optional[int] = None,
+        page_size: Optional[int] = None,
+        headers: Optional[Dict[str, str]] = None,
+        prefetch: bool = True,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the pages of a Graph collection, following `@odata.nextLink`.
+
+        `page_size` is sent as `$top` (capped at GRAPH_PAGE_MAX and
+        `max_items`). With `prefetch`, the next page is requested on a
+        background thread while the caller works on the current one. Paging
+        stops after `max_items` items, or as soon as the caller stops iterating;
+        a prefetched page is then discarded and no further page is requested.
+        """
+        remaining = max_items
+        pool: Optional[ThreadPoolExecutor] = None
+        pending: Optional["Future[Dict[str, Any]]"] = None
+        try:
+            data = self._get(
+                url, params=_paged_params(params, page_size, max_items), headers=headers
+            )
+            while True:
+                page, remaining, next_url = _take_page(data, remaining)
+                if next_url and prefetch:
+                    if pool is None:
+                        # Named after the caller so per-account log filters match.
+                        pool = ThreadPoolExecutor(
+                            max_workers=1,
+                            thread_name_prefix=threading.current_thread().name,
+                        )
+                    pending = pool.submit(self._get, next_url, None, headers)
+                if page:
+                    yield page
+                if not next_url:
+                    return
+                if pending is not None:
+                    data, pending = pending.result(), None
+                else:
+                    data = self._get(next_url, headers=headers)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def iter_items(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> Iterator[Dict[str, Any]]:
+        """Items of `iter_pages` one at a time (same keyword arguments)."""
+        for page in self.iter_pages(url, params, **kwargs):
+            yield from page
+
+    def get_messages(
+        self, message_ids: List[str], select: str
+    ) -> Dict[str, Dict[str, Any]]:
+        """Fetch messages by id through $batch (20 per request).
+
+        Messages whose sub-request failed are left out of the result.
+        """
+        if not message_ids:
+            return {}
+        responses = self.batch(_message_requests(self._user_path, message_ids, select))
+        return _message_results(message_ids, responses)
+
+    def _mirrored_items(
+        self,
+        url: str,
+        params: Dict[str, Any],
+        *,
+        max_items: int,
+        page_size: int,
+    ) -> Iterator[Dict[str, Any]]:
+        """`iter_items` backed by `message_cache`.
+
+        Lists only ids and changeKeys and serves unchanged messages from the
+        mirror. A page with new or changed messages is listed again with the
+        full `$select`; only messages that listing no longer returns are
+        fetched by id. A listing with nothing mirrored yet falls back to one
+        full listing, which also fills the mirror.
+        """
+        cache = self.message_cache
+        if cache is None or not cache.enabled:
+            yield from self.iter_items(
+                url, params, max_items=max_items, page_size=page_size
+            )
+            return
+        select = with_change_key(params["$select"])
+        page_url: Optional[str] = url
+        page_params: Optional[Dict[str, Any]] = _paged_params(
+            dict(params, **{"$select": "id,changeKey"}), page_size, max_items
+        )
+        remaining: Optional[int] = max_items
+        served = fetched_count = 0
+        cold = False
+        while page_url:
+            data = self._get(page_url, params=page_params)
+            stub_page, remaining, next_url = _take_page(data, remaining)
+            hits, stale = cache.lookup(stub_page, select)
+            if not hits and not served:
+                cold = True
+                break
+            fetched: Dict[str, Dict[str, Any]] = {}
+            if stale:
+                listed = self._get(*_with_select(page_url, page_params, select))
+                fetched, missing = _relisted(listed.get("value", []), stale)
+                if missing:
+                    fetched.update(self.get_messages(missing, select))
+                cache.put_many(fetched.values(), select)
+            fetched_count += len(fetched)
+            page = _mirror_merge(stub_page, hits, fetched)
+            served += len(page)
+            yield from page
+            page_url, page_params = next_url, None
+        if cold:
+            for page in self.iter_pages(
+                url,
+                dict(params, **{"$select": select}),
+                max_items=max_items,
+                page_size=page_size,
+            ):
+                cache.put_many(page, select)
+                yield from page
+        else:
+            logger.debug(
+                "Message mirror served %s of %s messages for %s",
+                served - fetched_count,
+                served,
+                self.user,
+            )
+        cache.prune()
 
     def list_inbox_unprocessed_messages(
-        self, days_back: int, max_messages: int = 100
+        self,
+        days_back: int,
+        max_messages: int = 100,
+        *,
+        include_headers: bool = False,
     ) -> List[Dict[str, Any]]:
-        """Return recent inbox messages that have not yet been tagged as Processed."""
-        since = utc_now() - timedelta(days=days_back)
-        since_str = since.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        """Return recent inbox messages that have not yet been tagged as Processed.
+
+        `include_headers` also selects `internetMessageHeaders`.
+        """
+        return [
+            m
+            for page in self.iter_inbox_unprocessed_pages(
+                days_back, max_messages, include_headers=include_headers
+            )
+            for m in page
+        ]
+
+    def iter_inbox_unprocessed_pages(
+        self,
+        days_back: int,
+        max_messages: int = 100,
+        *,
+        include_headers: bool = False,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Yield unprocessed inbox messages a page (up to 50) at a time.
+
+        Same query as `list_inbox_unprocessed_messages`, paged with
+        `_UnprocessedCursor` so patching earlier pages cannot make later ones
+        skip messages. The run pipeline fetches the next page on its own
+        thread while the current one is processed.
+        """
         url = f"{self._user_root}/mailFolders/Inbox/messages"
-        params: Dict[str, Any] = {
-            "$select": "id,subject,from,receivedDateTime,bodyPreview,uniqueBody,conversationId,categories,flag,importance,isRead,webLink",
-            "$orderby": "receivedDateTime desc",
-            "$filter": f"receivedDateTime ge {since_str} and not(categories/any(c:c eq 'Processed'))",
-            "$top": min(max_messages, 50),
-        }
-        messages: List[Dict[str, Any]] = []
-        while url and len(messages) < max_messages:
-            data = self._get(url, params=params)
+        cursor = _UnprocessedCursor(_since(days_back), max_messages, include_headers)
+        while not cursor.done:
+            page = cursor.take(self._get(*cursor.request(url)))
+            if page:
+                yield page
+
+    def list_inbox_delta(
+        self,
+        delta_link: Optional[str],
+        days_back: int,
+        max_messages: int = 100,
+        *,
+        include_headers: bool = False,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return unprocessed Inbox messages changed since `delta_link`.
+
+        Without a delta link this starts a fresh delta sync limited to the last
+        `days_back` days. Graph only hands out the next deltaLink once every
+        page has been read, so all pages are drained; `Processed` and removed
+        items are then dropped client-side. Returns the messages (newest first)
+        and the new deltaLink, which is None when more than `max_messages`
+        unprocessed messages were found so the caller re-reads the same delta
+        next time instead of skipping the remainder. The `$select` (including
+        `include_headers`) is baked into the delta link when a sync starts.
+        """
+        url: Optional[str]
+        url, params = _delta_start(
+            self._user_root, delta_link, days_back, include_headers
+        )
+        changed: List[Dict[str, Any]] = []
+        new_link: Optional[str] = None
+        while url:
+            data = self._get(url, params=params, headers=_DELTA_HEADERS)
             params = None
-            messages.extend(data.get("value", []))
+            changed.extend(data.get("value", []))
             url = data.get("@odata.nextLink")
-            if not url:
-                break
-        return messages[:max_messages]
+            new_link = data.get("@odata.deltaLink") or new_link
+        return _delta_result(changed, new_link, max_messages)
 
     def list_inbox_messages_since(
         self, days_back: int, max_messages: int = 500
-    ) -> List[Dict[str, Any]]:
-        since = utc_now() - timedelta(days=days_back)
-        since_str = since.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-        url = f"{self._user_root}/mailFolders/Inbox/messages"
-        params: Dict[str, Any] = {
-            "$select": "id,subject,from,receivedDateTime,bodyPreview,conversationId,categories,isRead,webLink",
-            "$orderby": "receivedDateTime desc",
-            "$filter": f"receivedDateTime ge {since_str}",
-            "$top": min(max_messages, 50),
-        }
-        out: List[Dict[str, Any]] = []
-        while url and len(out) < max_messages:
-            data = self._get(url, params=params)
-            params = None
-            out.extend(data.get("value", []))
-            url = data.get("@odata.nextLink")
-            if not url:
-                break
-        return out[:max_messages]
+    ) -> Iterator[Dict[str, Any]]:
+        """Inbox messages (metadata only) received in the last `days_back` days,
+        newest first, streamed in pages of up to GRAPH_PAGE_MAX (through the
+        message mirror when one is configured)."""
+        return self._mirrored_items(
+            f"{self._user_root}/mailFolders/Inbox/messages",
+            _inbox_since_params(days_back),
+            max_items=max_messages,
+            page_size=GRAPH_PAGE_MAX,
+        )
 
     def list_sent_messages_since(
         self, days_back: int, max_messages: int = 500
-    ) -> List[Dict[str, Any]]:
-        since = utc_now() - timedelta(days=days_back)
-        since_str = since.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-        url = f"{self._user_root}/mailFolders/SentItems/messages"
-        params: Dict[str, Any] = {
-            "$select": "id,subject,body,bodyPreview,from,toRecipients,ccRecipients,sentDateTime",
-            "$orderby": "sentDateTime desc",
-            "$filter": f"sentDateTime ge {since_str}",
-            "$top": min(max_messages, 50),
-        }
-        out: List[Dict[str, Any]] = []
-        while url and len(out) < max_messages:
-            data = self._get(url, params=params)
-            params = None
-            out.extend(data.get("value", []))
-            url = data.get("@odata.nextLink")
-            if not url:
-                break
-        return out[:max_messages]
+    ) -> Iterator[Dict[str, Any]]:
+        """Sent Items (with bodies) from the last `days_back` days, newest first.
+
+        With a message mirror, only messages whose changeKey changed are
+        downloaded again.
+        """
+        return self._mirrored_items(
+            f"{self._user_root}/mailFolders/SentItems/messages",
+            _sent_since_params(days_back),
+            max_items=max_messages,
+            page_size=_BODY_PAGE_SIZE,
+        )
 
     def list_conversation_messages(
         self, conversation_id: str, max_messages: int = 20
     ) -> List[Dict[str, Any]]:
         if not conversation_id:
             return []
-        conv_id = conversation_id.replace("'", "''")
-        url = f"{self._user_root}/messages"
-        params: Dict[str, Any] = {
-            "$select": "id,subject,from,toRecipients,ccRecipients,receivedDateTime,sentDateTime,bodyPreview,uniqueBody,isRead",
-            "$filter": f"conversationId eq '{conv_id}'",
-            "$top": min(max_messages, 50),
-        }
-        out: List[Dict[str, Any]] = []
-        while url and len(out) < max_messages:
-            data = self._get(url, params=params)
-            params = None
-            out.extend(data.get("value", []))
-            url = data.get("@odata.nextLink")
-            if not url:
-                break
-        # Graph can return 400 InefficientFilter when combining conversationId
-        # filter with server-side ordering; sort locally instead.
-        out = sorted(
-            out,
-            key=lambda m: m.get("receivedDateTime") or m.get("sentDateTime") or "",
+        return _thread_order(
+            list(
+                self.iter_items(
+                    f"{self._user_root}/messages",
+                    _conversation_params(conversation_id),
+                    max_items=max_messages,
+                    page_size=_BODY_PAGE_SIZE,
+                    prefetch=False,
+                )
+            )
         )
-        return out[:max_messages]
+
+    def list_conversations_messages(
+        self, conversation_ids: List[Optional[str]], max_messages: int = 20
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Fetch several conversations at once through $batch.
+
+        Duplicate ids are fetched once. Returns a map of conversation id to its
+        messages (sorted oldest first, like `list_conversation_messages`);
+        conversations whose sub-request failed fall back to a direct fetch.
+        """
+
+        unique = list(dict.fromkeys(c for c in conversation_ids if c))
+        if not unique:
+            return {}
+        responses = self.batch(
+            _conversation_requests(self._user_path, unique, max_messages)
+        )
+        threads: Dict[str, List[Dict[str, Any]]] = {}
+        for i, conv in enumerate(unique):
+            first = _conversation_page(responses.get(str(i)))
+            if first is None:
+                threads[conv] = self.list_conversation_messages(conv, max_messages)
+                continue
+            out, url = first
+            if url and len(out) < max_messages:
+                out.extend(
+                    self.iter_items(
+                        url, max_items=max_messages - len(out), prefetch=False
+                    )
+                )
+            threads[conv] = _thread_order(out)[:max_messages]
+        return threads
 
     def update_message(self, message_id: str, patch_body: Dict[str, Any]) -> None:
         self._patch(f"{self._user_root}/messages/{message_id}", patch_body)
 
+    def _post_batch_chunk(self, chunk: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # Graph meters each sub-request against the mailbox limits, so the
+        # outer POST draws the remaining tokens for the chunk.
+        self.stats.record_sleep(self.rate_limiter.acquire(len(chunk) - 1))
+        return self._post(
+            f"{self.base_url}/$batch",
+            {"requests": chunk},
+            idempotent=_chunk_idempotent(chunk),
+        )
+
+    def batch(
+        self,
+        sub_requests: List[Dict[str, Any]],
+        *,
+        max_retries: Optional[int] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Send sub-requests through Graph JSON batching, 20 per POST.
+
+        Each sub-request is a dict with `id`, `method`, `url` (relative to the
+        API version root, e.g. `/me/messages/{id}`) and optionally `body` /
+        `headers`. Returns the final sub-response per request id. Throttled or
+        5xx sub-requests are re-sent on their own (up to `max_retries` times,
+        defaulting to the client's retry policy), honouring the largest
+        Retry-After hint seen in the round. Non-idempotent sub-requests are
+        only re-sent when Graph did not process them (see `_resend_subrequest`).
+        """
+
+        if max_retries is None:
+            max_retries = self.retry_policy.max_retries
+        results: Dict[str, Dict[str, Any]] = {}
+        pending = _batch_pending(sub_requests)
+
+        attempt = 0
+        while pending:
+            chunks = _batch_chunks(pending)
+            replies = [self._post_batch_chunk(chunk) for chunk in chunks]
+            pending, delay = _batch_round(
+                self.retry_policy,
+                self.stats,
+                chunks,
+                replies,
+                results,
+                attempt,
+                max_retries,
+            )
+            if pending:
+                attempt += 1
+                time.sleep(delay)
+
+        _log_batch_failures(results)
+        return results
+
+    def update_messages(
+        self,
+        patches: Dict[str, Dict[str, Any]],
+        *,
+        max_retries: Optional[int] = None,
+    ) -> Dict[str, int]:
+        """PATCH many messages through $batch.
+
+        Returns a map of message id to the final HTTP status of its PATCH
+        (0 when Graph never answered the sub-request).
+        """
+
+        if not patches:
+            return {}
+        responses = self.batch(
+            _patch_requests(self._user_path, patches), max_retries=max_retries
+        )
+        return _patch_statuses(patches, responses)
+
     def create_draft_reply(
         self, message_id: str, reply_body_html: str
     ) -> Optional[str]:
         """Create a draft reply for a message and return the draft id (None on failure)."""
         data = self._post(f"{self._user_root}/messages/{message_id}/createReply", {})
-        draft = data.get("message") or data
-        draft_id = draft.get("id")
-        if not draft_id:
-            logger.error("createReply did not return a draft id for %s", message_id)
-            return None
-        self._patch(
-            f"{self._user_root}/messages/{draft_id}",
-            {"body": {"contentType": "HTML", "content": reply_body_html}},
-        )
+        draft_id = _draft_id(data, message_id)
+        if draft_id:
+            self._patch(
+                f"{self._user_root}/messages/{draft_id}", _html_body(reply_body_html)
+            )
         return draft_id
 
     def delete_message(self, message_id: str) -> None:
@@ -213,15 +1185,10 @@ class GraphClient:
     def send_mail(
         self, subject: str, html_body: str, to_address: str, save_to_sent: bool = True
     ) -> None:
-        body = {
-            "message": {
-                "subject": subject,
-                "body": {"contentType": "HTML", "content": html_body},
-                "toRecipients": [{"emailAddress": {"address": to_address}}],
-            },
-            "saveToSentItems": bool(save_to_sent),
-        }
-        self._post(f"{self._user_root}/sendMail", body)
+        self._post(
+            f"{self._user_root}/sendMail",
+            _send_mail_body(subject, html_body, to_address, save_to_sent),
+        )
 
     def wait_for_message_by_subject(
         self,
@@ -275,15 +1242,13 @@ class GraphClient:
         )
 
     def list_master_categories(self) -> List[Dict[str, Any]]:
-        url = f"{self._user_root}/outlook/masterCategories"
-        params = {"$select": "id,displayName,color"}
-        out: List[Dict[str, Any]] = []
-        while url:
-            data = self._get(url, params=params)
-            params = None
-            out.extend(data.get("value", []))
-            url = data.get("@odata.nextLink")
-        return out
+        return list(
+            self.iter_items(
+                f"{self._user_root}/outlook/masterCategories",
+                {"$select": "id,displayName,color"},
+                prefetch=False,
+            )
+        )
 
     def create_master_category(self, display_name: str, color: str) -> Dict[str, Any]:
         body = {"displayName": display_name, "color": color}
@@ -300,29 +1265,13 @@ class GraphClient:
     ) -> Dict[str, str]:
         """Create or update master categories so they carry the desired colours.
 
-        Returns a map of category name to action taken (create/update/unchanged).
+        All creates and updates go out in one $batch request. Returns a map of
+        category name to action taken (create/update/unchanged, or failed when
+        Graph rejected the change).
         """
 
         existing = self.list_master_categories()
         plan = _plan_category_updates(desired_colors, existing)
-        results: Dict[str, str] = {}
-
-        for name, step in plan.items():
-            action = step.get("action")
-            color = step.get("color")
-            if action == "create":
-                self.create_master_category(name, color)
-            elif action == "update":
-                cat_id = step.get("id")
-                if cat_id:
-                    self.update_master_category(cat_id, color)
-                else:
-                    logger.warning(
-                        "Category %s missing id during update; recreating", name
-                    )
-                    self.create_master_category(name, color)
-                    action = "create"
-
-            results[name] = action or "unchanged"
-
-        return results
+        actions, sub_requests, names = _category_requests(self._user_path, plan)
+        responses = self.batch(sub_requests) if sub_requests else {}
+        return _category_results(actions, names, responses)
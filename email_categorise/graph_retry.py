@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional
+
+from .utils import utc_now
+
+logger = logging.getLogger("email_categorise.graph")
+
+# Throttling (429) and transient server errors are worth retrying; everything
+# else is a caller error and surfaces immediately.
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(headers: Mapping[str, Any]) -> Optional[float]:
+    """Return the Retry-After delay in seconds, or None when absent/invalid.
+
+    Graph sends delta-seconds, but the HTTP spec also allows an HTTP-date.
+    """
+    value = None
+    for key, val in headers.items():
+        if str(key).lower() == "retry-after":
+            value = val
+            break
+    if value is None or value == "":
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        when = parsedate_to_datetime(str(value))
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - utc_now()).total_seconds())
+
+
+@dataclass
+class RetryPolicy:
+    """Retry/backoff settings shared by every Graph request path."""
+
+    max_retries: int = 5
+    backoff_base_seconds: float = 1.0
+    backoff_max_seconds: float = 60.0
+    max_retry_after_seconds: float = 300.0
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Seconds to wait before retry number `attempt` (1-based).
+
+        Retry-After is honoured as sent (see `retry_after_too_long`);
+        otherwise full-jitter exponential backoff capped at
+        `backoff_max_seconds`.
+        """
+        if retry_after is not None:
+            return retry_after
+        ceiling = min(
+            self.backoff_max_seconds, self.backoff_base_seconds * (2 ** (attempt - 1))
+        )
+        return random.uniform(0, ceiling)
+
+    def retry_after_too_long(self, retry_after: Optional[float]) -> bool:
+        """Whether Graph asked for a longer wait than the run will sit out.
+
+        Retrying sooner than Retry-After only earns another 429, so such a
+        request is given up on instead.
+        """
+        return retry_after is not None and retry_after > self.max_retry_after_seconds
+
+    def should_retry(self, status: Optional[int], attempt: int, idempotent: bool) -> bool:
+        """Whether a failed request is retried (`status` None = connection error).
+
+        Non-idempotent calls are only retried when Graph signals it did not
+        process the request (429/503).
+        """
+        if attempt >= self.max_retries:
+            return False
+        if status is None:
+            return idempotent
+        return status in RETRYABLE_STATUSES and (idempotent or status in {429, 503})
+
+
+@dataclass
+class RetryStats:
+    """Counters for retries and time spent sleeping, safe to share across threads."""
+
+    retries: int = 0
+    throttled: int = 0
+    sleep_seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record_retry(self, status: Optional[int]) -> None:
+        with self._lock:
+            self.retries += 1
+            if status == 429:
+                self.throttled += 1
+
+    def record_sleep(self, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        with self._lock:
+            self.sleep_seconds += seconds
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "sleep_seconds": round(self.sleep_seconds, 3),
+            }
+
+
+class TokenBucket:
+    """Classic token bucket limiting request rate against one mailbox."""
+
+    def __init__(self, rate_per_second: float, capacity: float) -> None:
+        self.rate = float(rate_per_second)
+        self.capacity = max(1.0, float(capacity))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def _take(self, tokens: float) -> float:
+        """Take `tokens` if available (returns 0) or return the seconds to wait."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until `tokens` are available; return the seconds spent waiting."""
+        if self.rate <= 0:
+            return 0.0
+        tokens = min(float(tokens), self.capacity)
+        waited = 0.0
+        while True:
+            wait = self._take(tokens)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def aacquire(self, tokens: float = 1.0) -> float:
+        """`acquire` for event loops: waits with `asyncio.sleep` instead."""
+        if self.rate <= 0:
+            return 0.0
+        tokens = min(float(tokens), self.capacity)
+        waited = 0.0
+        while True:
+            wait = self._take(tokens)
+            if wait <= 0:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+
+_BUCKETS: Dict[str, TokenBucket] = {}
+_BUCKETS_LOCK = threading.Lock()
+
+
+def mailbox_bucket(mailbox: str, rate_per_second: float, burst: float) -> TokenBucket:
+    """Return the process-wide token bucket for a mailbox.
+
+    Graph's Outlook limits apply per app per mailbox, so every GraphClient
+    (and worker thread) targeting the same mailbox draws from one bucket.
+    """
+    key = mailbox.lower()
+    with _BUCKETS_LOCK:
+        bucket = _BUCKETS.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate_per_second, burst)
+            _BUCKETS[key] = bucket
+        return bucket
@@ -0,0 +1,445 @@
+from __future__ import annotations
+
+import json
+import logging
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+logger = logging.getLogger("email_categorise.grammar")
+
+_WS = " \t\n\r"
+_HEX = "0123456789abcdefABCDEF"
+_NUMBER_CHARS = "0123456789-+.eE"
+_NUMBER_PREFIX_RE = re.compile(r"-?(0|[1-9]\d*)?(\.\d*)?([eE][+-]?\d*)?")
+_NUMBER_RE = re.compile(r"-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?")
+_ALL_TYPES = frozenset(
+    {"object", "array", "string", "number", "integer", "boolean", "null"}
+)
+
+# Parser state: (stack of frames, consecutive whitespace count). Frames are
+# plain tuples so a state can be shared between candidate tokens for free.
+Frame = Tuple[Any, ...]
+State = Tuple[Tuple[Frame, ...], int]
+
+
+def _types(schema: Dict[str, Any]) -> FrozenSet[str]:
+    t = schema.get("type")
+    if t is None:
+        return _ALL_TYPES
+    if isinstance(t, str):
+        return frozenset({t})
+    return frozenset(t)
+
+
+def _enum_literals(schema: Dict[str, Any]) -> Optional[Tuple[str, ...]]:
+    """Serialisations of the values `enum` / `const` allow, or None."""
+    if "const" in schema:
+        values = [schema["const"]]
+    elif "enum" in schema:
+        values = list(schema["enum"])
+    else:
+        return None
+    literals: Set[str] = set()
+    for v in values:
+        for ascii_only in (True, False):
+            literals.add(json.dumps(v, ensure_ascii=ascii_only))
+            literals.add(json.dumps(v, ensure_ascii=ascii_only, separators=(",", ":")))
+    return tuple(sorted(literals))
+
+
+def _bounds(schema: Dict[str, Any]) -> Tuple[float, float, bool, bool]:
+    """(low, high, low exclusive, high exclusive) from the numeric keywords."""
+    low, high = float("-inf"), float("inf")
+    low_ex = high_ex = False
+    if "minimum" in schema:
+        low = float(schema["minimum"])
+    if isinstance(schema.get("exclusiveMinimum"), (int, float)):
+        if float(schema["exclusiveMinimum"]) >= low:
+            low, low_ex = float(schema["exclusiveMinimum"]), True
+    if "maximum" in schema:
+        high = float(schema["maximum"])
+    if isinstance(schema.get("exclusiveMaximum"), (int, float)):
+        if float(schema["exclusiveMaximum"]) <= high:
+            high, high_ex = float(schema["exclusiveMaximum"]), True
+    return low, high, low_ex, high_ex
+
+
+def _within(value: float, bounds: Tuple[float, float, bool, bool]) -> bool:
+    low, high, low_ex, high_ex = bounds
+    above = value > low if low_ex else value >= low
+    below = value < high if high_ex else value <= high
+    return above and below
+
+
+def _reachable(buf: str, bounds: Tuple[float, float, bool, bool]) -> bool:
+    """Can a number starting with `buf` (no exponent) still land in `bounds`?"""
+    negative = buf.startswith("-")
+    digits = buf.lstrip("-")
+    if not digits:
+        # Only the sign so far: any number of that sign.
+        return not negative or bounds[0] < 0
+    whole, _, frac = digits.partition(".")
+    smallest = float(whole + "." + frac) if frac else float(whole)
+    if "." in digits or whole == "0":
+        largest = smallest + 10.0 ** -len(frac) if "." in digits else 1.0
+    else:
+        largest = float("inf")
+    if negative:
+        smallest, largest = -largest, -smallest
+    low, high, low_ex, high_ex = bounds
+    return largest >= low and smallest <= high
+
+
+def _property_schema(schema: Dict[str, Any], key: str) -> Optional[Dict[str, Any]]:
+    props = schema.get("properties") or {}
+    if key in props:
+        return props[key]
+    extra = schema.get("additionalProperties", True)
+    if extra is False:
+        return None
+    return extra if isinstance(extra, dict) else {}
+
+
+class JsonSchemaPrefix:
+    """Incremental checker for "is this text a prefix of a schema-valid JSON value?".
+
+    Supports the subset of JSON Schema used in `json_schemas/`: `type` (single
+    or list), `properties`, `required`, `additionalProperties`, array `items`,
+    `enum` / `const`, and `minimum` / `maximum` (and their exclusive forms).
+    Object keys are restricted to the declared properties, `}` is only
+    accepted once every required key is present, and runs of whitespace are
+    capped at `max_whitespace` so a constrained model cannot pad forever.
+    Enumerated values must be written as `json.dumps` would write them, and
+    bounded numbers without an exponent, so every accepted prefix can still
+    be completed to a value the validator accepts.
+    """
+
+    def __init__(self, schema: Dict[str, Any], max_whitespace: int = 32) -> None:
+        self.schema = schema
+        self.max_whitespace = max_whitespace
+
+    def initial(self) -> State:
+        return ((("root", False), ("value", self.schema)), 0)
+
+    def feed(self, state: Optional[State], text: str) -> Optional[State]:
+        """Advance `state` by `text`; None means the text cannot be valid."""
+        for ch in text:
+            if state is None:
+                return None
+            state = self._step(state, ch)
+        return state
+
+    @staticmethod
+    def is_complete(state: Optional[State]) -> bool:
+        return state is not None and state[0] == (("root", True),)
+
+    # -----------------------------
+    # Transitions
+    # -----------------------------
+
+    def _ws(self, stack: Tuple[Frame, ...], ws: int) -> Optional[State]:
+        if ws >= self.max_whitespace:
+            return None
+        return stack, ws + 1
+
+    def _step(self, state: State, ch: str) -> Optional[State]:
+        stack, ws = state
+        top = stack[-1]
+        kind = top[0]
+
+        if kind in {"str", "key"}:
+            handler = self._in_string if kind == "str" else self._in_key
+            nxt = handler(stack, ch)
+            return (nxt, 0) if nxt is not None else None
+        if kind == "num":
+            _, buf, integer_only, bounds = top
+            if ch in _NUMBER_CHARS:
+                buf += ch
+                if "." in buf.lstrip("-") or "e" in buf.lower():
+                    if integer_only:
+                        return None
+                if not _NUMBER_PREFIX_RE.fullmatch(buf):
+                    return None
+                if bounds is not None:
+                    if "e" in buf.lower() or not _reachable(buf, bounds):
+                        return None
+                return stack[:-1] + (("num", buf, integer_only, bounds),), 0
+            if not _NUMBER_RE.fullmatch(buf):
+                return None
+            if bounds is not None and not _within(float(buf), bounds):
+                return None
+            # The number ended; the character belongs to the parent.
+            return self._step((self._complete(stack), ws), ch)
+
+        if kind == "enum":
+            _, buf, literals = top
+            extended = buf + ch
+            if any(lit.startswith(extended) for lit in literals):
+                return self._in_enum(stack, extended, literals), 0
+            if buf not in literals:
+                return None
+            # A number literal ended; the character belongs to the parent.
+            return self._step((self._complete(stack), ws), ch)
+
+        if kind == "lit":
+            rest = top[1]
+            if ch != rest[0]:
+                return None
+            if len(rest) == 1:
+                return self._complete(stack), 0
+            return stack[:-1] + (("lit", rest[1:]),), 0
+
+        if ch in _WS:
+            return self._ws(stack, ws)
+
+        if kind == "root":
+            return None
+        if kind == "value":
+            nxt = self._start_value(stack, top[1], ch)
+            return (nxt, 0) if nxt is not None else None
+        if kind == "obj":
+            nxt = self._in_object(stack, ch)
+            return (nxt, 0) if nxt is not None else None
+        if kind == "arr":
+            return self._in_array(stack, ch)
+        return None
+
+    def _in_enum(
+        self, stack: Tuple[Frame, ...], buf: str, literals: Tuple[str, ...]
+    ) -> Tuple[Frame, ...]:
+        """Advance an enumerated value, completing it once `buf` is a literal
+        nothing longer extends."""
+        if buf in literals and not any(
+            len(lit) > len(buf) and lit.startswith(buf) for lit in literals
+        ):
+            return self._complete(stack)
+        return stack[:-1] + (("enum", buf, literals),)
+
+    def _start_value(
+        self, stack: Tuple[Frame, ...], schema: Dict[str, Any], ch: str
+    ) -> Optional[Tuple[Frame, ...]]:
+        types = _types(schema)
+        base = stack[:-1]
+        literals = _enum_literals(schema)
+        if literals is not None:
+            if not any(lit.startswith(ch) for lit in literals):
+                return None
+            return self._in_enum(stack, ch, literals)
+        if ch == "{" and "object" in types:
+            return base + (("obj", schema, frozenset(), "key_or_end", None),)
+        if ch == "[" and "array" in types:
+            return base + (("arr", schema, "value_or_end"),)
+        if ch == '"' and "string" in types:
+            return base + (("str", 0),)
+        if ch == "t" and "boolean" in types:
+            return base + (("lit", "rue"),)
+        if ch == "f" and "boolean" in types:
+            return base + (("lit", "alse"),)
+        if ch == "n" and "null" in types:
+            return base + (("lit", "ull"),)
+        if (ch == "-" or ch.isdigit()) and types & {"number", "integer"}:
+            bounds = _bounds(schema)
+            if bounds == (float("-inf"), float("inf"), False, False):
+                bounds = None
+            elif not _reachable(ch, bounds):
+                return None
+            return base + (("num", ch, "number" not in types, bounds),)
+        return None
+
+    def _in_string(
+        self, stack: Tuple[Frame, ...], ch: str
+    ) -> Optional[Tuple[Frame, ...]]:
+        esc = stack[-1][1]
+        if esc == 0:
+            if ch == '"':
+                return self._complete(stack)
+            if ch == "\\":
+                return stack[:-1] + (("str", 1),)
+            if ord(ch) < 0x20:
+                return None
+            return stack
+        if esc == 1:
+            if ch in '"\\/bfnrt':
+                return stack[:-1] + (("str", 0),)
+            if ch == "u":
+                return stack[:-1] + (("str", 2),)
+            return None
+        if ch not in _HEX:
+            return None
+        return stack[:-1] + (("str", 0 if esc == 5 else esc + 1),)
+
+    def _allowed_keys(self, obj: Frame) -> Optional[Set[str]]:
+        """Unseen declared keys, or None when any key is allowed."""
+        schema, seen = obj[1], obj[2]
+        if schema.get("additionalProperties", True) is not False:
+            return None
+        return set(schema.get("properties") or {}) - seen
+
+    def _in_key(
+        self, stack: Tuple[Frame, ...], ch: str
+    ) -> Optional[Tuple[Frame, ...]]:
+        buf = stack[-1][1]
+        obj = stack[-2]
+        allowed = self._allowed_keys(obj)
+        if ch == '"':
+            if allowed is not None and buf not in allowed:
+                return None
+            if buf in obj[2]:
+                return None
+            return stack[:-2] + (("obj", obj[1], obj[2] | {buf}, "colon", buf),)
+        if ch == "\\" or ord(ch) < 0x20:
+            return None
+        buf += ch
+        if allowed is not None and not any(k.startswith(buf) for k in allowed):
+            return None
+        return stack[:-1] + (("key", buf),)
+
+    def _in_object(
+        self, stack: Tuple[Frame, ...], ch: str
+    ) -> Optional[Tuple[Frame, ...]]:
+        _, schema, seen, phase, key = stack[-1]
+        required = set(schema.get("required") or [])
+        if ch == "}" and phase in {"key_or_end", "comma_or_end"}:
+            return self._complete(stack) if required <= seen else None
+        if ch == '"' and phase in {"key_or_end", "key"}:
+            allowed = self._allowed_keys(stack[-1])
+            if allowed is not None and not allowed:
+                return None
+            return stack + (("key", ""),)
+        if ch == ":" and phase == "colon":
+            value_schema = _property_schema(schema, key)
+            if value_schema is None:
+                return None
+            return stack[:-1] + (
+                ("obj", schema, seen, "value", key),
+                ("value", value_schema),
+            )
+        if ch == "," and phase == "comma_or_end":
+            allowed = self._allowed_keys(stack[-1])
+            if allowed is not None and not allowed:
+                return None
+            return stack[:-1] + (("obj", schema, seen, "key", None),)
+        return None
+
+    def _in_array(self, stack: Tuple[Frame, ...], ch: str) -> Optional[State]:
+        _, schema, phase = stack[-1]
+        items = schema.get("items") or {}
+        if ch == "]" and phase in {"value_or_end", "comma_or_end"}:
+            return self._complete(stack), 0
+        if ch == "," and phase == "comma_or_end":
+            return stack[:-1] + (("arr", schema, "value"), ("value", items)), 0
+        if phase == "value_or_end":
+            pushed = stack[:-1] + (("arr", schema, "value"), ("value", items))
+            return self._step((pushed, 0), ch)
+        return None
+
+    @staticmethod
+    def _complete(stack: Tuple[Frame, ...]) -> Tuple[Frame, ...]:
+        """Pop a finished value and advance its parent."""
+        stack = stack[:-1]
+        parent = stack[-1]
+        if parent[0] == "root":
+            return (("root", True),)
+        if parent[0] == "obj":
+            return stack[:-1] + (parent[:3] + ("comma_or_end", None),)
+        # Array element.
+        return stack[:-1] + (("arr", parent[1], "comma_or_end"),)
+
+
+def schema_prefix_for(schema_path: Path) -> JsonSchemaPrefix:
+    """Shared `JsonSchemaPrefix` for a schema file.
+
+    Rebuilt when the file's mtime changes, like `schema_validator`, so
+    constrained decoding and validation always use the same schema.
+    """
+    path = Path(schema_path)
+    return _schema_prefix(path, path.stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=32)
+def _schema_prefix(schema_path: Path, mtime_ns: int) -> JsonSchemaPrefix:
+    return JsonSchemaPrefix(json.loads(schema_path.read_text(encoding="utf-8")))
+
+
+class SchemaLogitsProcessor:
+    """`transformers` logits processor that only lets schema-valid tokens through.
+
+    For every row of a (left-padded) batch it keeps the parser state of the
+    text generated so far. At each step the `top_k` highest-scoring tokens are
+    checked against the grammar (widening up to `max_candidates` when none
+    fits) and every other token is masked out. Once the JSON value is complete
+    only EOS is allowed, so generation stops at the closing brace. A row for
+    which no valid continuation can be found falls back to unconstrained
+    decoding rather than stalling.
+    """
+
+    def __init__(
+        self,
+        tokenizer: Any,
+        grammar: JsonSchemaPrefix,
+        prompt_length: int,
+        top_k: int = 32,
+        max_candidates: int = 2048,
+    ) -> None:
+        self.tokenizer = tokenizer
+        self.grammar = grammar
+        self.prompt_length = prompt_length
+        self.top_k = top_k
+        self.max_candidates = max_candidates
+        self.eos_token_id = tokenizer.eos_token_id
+        self._rows: Dict[int, Tuple[str, Optional[State]]] = {}
+
+    def _decode(self, ids: List[int]) -> str:
+        return self.tokenizer.decode(ids, skip_special_tokens=True)
+
+    def _row_state(self, row: int, generated: List[int]) -> Optional[State]:
+        text = self._decode(generated)
+        prev_text, state = self._rows.get(row, ("", self.grammar.initial()))
+        if state is not None:
+            if text.startswith(prev_text):
+                state = self.grammar.feed(state, text[len(prev_text) :])
+            else:
+                state = self.grammar.feed(self.grammar.initial(), text)
+            if state is None:
+                logger.debug("Row %s left the grammar; decoding unconstrained", row)
+        self._rows[row] = (text, state)
+        return state
+
+    def __call__(self, input_ids: Any, scores: Any) -> Any:
+        import torch  # type: ignore[import]
+
+        for row in range(input_ids.shape[0]):
+            generated = input_ids[row, self.prompt_length :].tolist()
+            state = self._row_state(row, generated)
+            if state is None:
+                continue
+
+            allowed: List[int] = []
+            if self.grammar.is_complete(state):
+                if self.eos_token_id is not None:
+                    allowed = [self.eos_token_id]
+            else:
+                # A short tail is enough context for the tokenizer to render
+                # the candidate's text (leading spaces, merges) correctly.
+                tail = generated[-4:]
+                tail_text = self._decode(tail)
+                order = torch.argsort(scores[row], descending=True).tolist()
+                limit = self.top_k
+                checked = 0
+                while not allowed and checked < min(limit, self.max_candidates):
+                    for token_id in order[checked:limit]:
+                        if token_id == self.eos_token_id:
+                            continue
+                        piece = self._decode(tail + [token_id])[len(tail_text) :]
+                        if piece and self.grammar.feed(state, piece) is not None:
+                            allowed.append(token_id)
+                    checked = limit
+                    limit *= 4
+            if not allowed:
+                continue
+            mask = torch.full_like(scores[row], float("-inf"))
+            mask[allowed] = 0
+            scores[row] = scores[row] + mask
+        return scores
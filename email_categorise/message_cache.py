@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from typing import Any, Dict, FrozenSet, Iterable, List, Tuple
+
+from .state_store import StateStore
+from .utils import utc_now
+
+logger = logging.getLogger("email_categorise.cache")
+
+
+def _field_set(select: str) -> FrozenSet[str]:
+    fields = {f.strip() for f in select.split(",") if f.strip()}
+    return frozenset(fields | {"id", "changeKey"})
+
+
+def with_change_key(select: str) -> str:
+    """`select` plus `changeKey`, which the mirror needs on every message."""
+    return ",".join(sorted(_field_set(select)))
+
+
+class MessageCache:
+    """Per-account mirror of Graph messages keyed by id and changeKey.
+
+    Rows live (zlib-compressed) in the `message_cache` table of the state
+    store. A cached message is served only while Graph still lists it with the
+    same changeKey and only for a `$select` its stored fields cover. Rows not
+    rewritten for `max_age_days` are pruned; 0 disables the mirror.
+    """
+
+    def __init__(self, store: StateStore, account: str, max_age_days: int) -> None:
+        self.store = store
+        self.account = account
+        self.max_age = timedelta(days=max_age_days)
+        self.enabled = max_age_days > 0
+
+    def lookup(
+        self, listed: List[Dict[str, Any]], select: str
+    ) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        """Split `{id, changeKey}` stubs into cached messages and ids to fetch."""
+        if not self.enabled:
+            return {}, [m["id"] for m in listed]
+        wanted = _field_set(select)
+        rows = self.store.messages_get_many(self.account, [m["id"] for m in listed])
+        hits: Dict[str, Dict[str, Any]] = {}
+        stale: List[str] = []
+        for m in listed:
+            row = rows.get(m["id"])
+            if row and row[0] == m.get("changeKey") and wanted <= _field_set(row[1]):
+                hits[m["id"]] = row[2]
+            else:
+                stale.append(m["id"])
+        return hits, stale
+
+    def put_many(self, messages: Iterable[Dict[str, Any]], select: str) -> None:
+        if not self.enabled:
+            return
+        batch = list(messages)
+        if batch:
+            self.store.messages_put_many(self.account, with_change_key(select), batch)
+
+    def prune(self) -> None:
+        if self.enabled:
+            self.store.messages_prune(
+                self.account, (utc_now() - self.max_age).isoformat()
+            )
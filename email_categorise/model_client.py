@@ -1,22 +1,196 @@
 from __future__ import annotations
 
+import asyncio
+import atexit
+import contextlib
 import json
 import logging
 import os
 import re
-import subprocess
-import tempfile
-from dataclasses import dataclass
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Optional
-
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from .codex_runner import run_codex
 from .config import AppConfig, ModelDefinition
+from .json_grammar import SchemaLogitsProcessor, schema_prefix_for
 
 logger = logging.getLogger("email_categorise.model")
 
 
 _JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
 
+# OpenAI clients are cached per model definition so calls share one HTTP
+# connection pool (and TLS sessions). Async clients are bound to the event loop
+# that made them, so they all live on one long-lived background loop (see
+# `model_loop`) and are closed when the process exits.
+_OPENAI_CLIENTS: Dict[Tuple[Any, ...], Any] = {}
+_ASYNC_OPENAI_CLIENTS: Dict[Tuple[Any, ...], Any] = {}
+_OPENAI_LOCK = threading.Lock()
+_ASYNC_LOCK = threading.Lock()
+_MODEL_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+_T = TypeVar("_T")
+
+
+def _openai_client_key(definition: ModelDefinition) -> Tuple[Any, ...]:
+    return (
+        definition.name,
+        definition.base_url,
+        definition.api_key_env,
+        definition.http_timeout_seconds,
+        definition.http_max_connections or definition.max_concurrency,
+        definition.http_keepalive_seconds,
+    )
+
+
+def _new_openai_client(definition: ModelDefinition, use_async: bool) -> Any:
+    # Lazy import so Codex-only installs don't need the dependency.
+    from .utils import load_env_file
+
+    load_env_file()
+    try:
+        import httpx  # type: ignore[import]
+        from openai import AsyncOpenAI, OpenAI  # type: ignore[import]
+    except Exception as exc:  # pragma: no cover
+        raise RuntimeError(
+            "The 'openai' Python package is required for provider='openai' or 'openai-compatible'. "
+            "Install it, or switch provider to 'codex' to use the Codex CLI instead."
+        ) from exc
+
+    api_key = os.environ.get(definition.api_key_env)
+    if not api_key:
+        raise RuntimeError(
+            f"Environment variable {definition.api_key_env} is not set. "
+            f"Cannot authenticate for model {definition.name}."
+        )
+
+    max_connections = max(
+        1, definition.http_max_connections or definition.max_concurrency
+    )
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=definition.http_keepalive_seconds,
+    )
+    timeout = httpx.Timeout(definition.http_timeout_seconds)
+    kwargs: Dict[str, Any] = {"api_key": api_key, "timeout": timeout}
+    if definition.base_url:
+        kwargs["base_url"] = definition.base_url
+
+    logger.debug(
+        "Creating %s OpenAI client for %s (base_url=%s, max_connections=%s)",
+        "async" if use_async else "sync",
+        definition.name,
+        definition.base_url or "https://api.openai.com/v1",
+        max_connections,
+    )
+    if use_async:
+        return AsyncOpenAI(
+            http_client=httpx.AsyncClient(limits=limits, timeout=timeout), **kwargs
+        )
+    return OpenAI(http_client=httpx.Client(limits=limits, timeout=timeout), **kwargs)
+
+
+def model_loop() -> asyncio.AbstractEventLoop:
+    """The process-wide event loop async model calls run on, started on first use."""
+    global _MODEL_LOOP
+    with _ASYNC_LOCK:
+        if _MODEL_LOOP is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="model-async", daemon=True
+            ).start()
+            atexit.register(close_async_clients)
+            _MODEL_LOOP = loop
+        return _MODEL_LOOP
+
+
+def run_on_model_loop(coro: Awaitable[_T]) -> _T:
+    """Run `coro` on `model_loop()` and block the calling thread for its result.
+
+    Must not be called from the model loop itself.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, model_loop()).result()  # type: ignore[arg-type]
+
+
+def close_async_clients() -> None:
+    """Close the cached async OpenAI clients (and their connection pools)."""
+    with _ASYNC_LOCK:
+        loop = _MODEL_LOOP
+        clients = list(_ASYNC_OPENAI_CLIENTS.values())
+        _ASYNC_OPENAI_CLIENTS.clear()
+    if loop is None or not clients:
+        return
+
+    async def _close() -> None:
+        for client in clients:
+            with contextlib.suppress(Exception):
+                await client.close()
+
+    asyncio.run_coroutine_threadsafe(_close(), loop).result(timeout=10)
+
+
+def openai_client(definition: ModelDefinition, *, use_async: bool = False) -> Any:
+    """Return the shared (Async)OpenAI client for `definition`.
+
+    Both are process-wide; async clients may only be used on `model_loop()`.
+    """
+    key = _openai_client_key(definition)
+    if not use_async:
+        with _OPENAI_LOCK:
+            client = _OPENAI_CLIENTS.get(key)
+            if client is None:
+                client = _new_openai_client(definition, use_async=False)
+                _OPENAI_CLIENTS[key] = client
+            return client
+
+    with _ASYNC_LOCK:
+        client = _ASYNC_OPENAI_CLIENTS.get(key)
+        if client is None:
+            client = _new_openai_client(definition, use_async=True)
+            _ASYNC_OPENAI_CLIENTS[key] = client
+        return client
+
+
+def _openai_request(
+    definition: ModelDefinition, system_prompt: str, user_content: str
+) -> Dict[str, Any]:
+    logger.debug(
+        "Calling OpenAI model %s (provider=%s, base_url=%s)",
+        definition.model,
+        definition.provider,
+        definition.base_url or "https://api.openai.com/v1",
+    )
+    return {
+        "model": definition.model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content},
+        ],
+        "response_format": {"type": "json_object"},
+        "temperature": 0.2,
+    }
+
+
+def _openai_content(completion: Any) -> Dict[str, Any]:
+    content = completion.choices[0].message.content
+    if not content:
+        raise RuntimeError("Model returned empty content")
+    return _parse_json_lenient(content)
+
 
 @dataclass
 class ModelClient:
@@ -26,10 +200,18 @@ class ModelClient:
       and Codex model selection.
     - The OpenAI API (optional fallback) if you want to run without Codex.
 
-    The rest of the code calls `chat_json(...)` and expects a dict.
+    The rest of the code calls `chat_json(...)` and expects a dict. Calls are
+    capped at `definition.max_concurrency` in flight, across all threads and
+    both the sync and async paths.
     """
 
     definition: ModelDefinition
+    _slots: threading.BoundedSemaphore = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._slots = threading.BoundedSemaphore(
+            max(1, self.definition.max_concurrency)
+        )
 
     def chat_json(
         self,
@@ -37,6 +219,104 @@ class ModelClient:
         user_content: str,
         *,
         schema_path: Optional[Path] = None,
+    ) -> Dict[str, Any]:
+        with self._slots:
+            return self._chat_json(
+                system_prompt, user_content, schema_path=schema_path
+            )
+
+    @property
+    def supports_batch(self) -> bool:
+        """True when `chat_json_batch` generates several prompts in one pass."""
+        return (self.definition.provider or "").strip().lower() == "hf-local"
+
+    def chat_json_batch(
+        self,
+        system_prompt: str,
+        user_contents: List[str],
+        *,
+        schema_path: Optional[Path] = None,
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """Answer several prompts; failures are returned in place, not raised.
+
+        hf-local generates them in padded batches on the shared model. Other
+        providers fan out over `chat_json` up to `max_concurrency` at a time.
+        """
+        if self.supports_batch:
+            with self._slots:
+                return self._chat_json_hf_local_batch(
+                    system_prompt, user_contents, schema_path=schema_path
+                )
+
+        def _one(content: str) -> Union[Dict[str, Any], Exception]:
+            try:
+                return self.chat_json(
+                    system_prompt, content, schema_path=schema_path
+                )
+            except Exception as exc:
+                return exc
+
+        workers = max(1, min(len(user_contents), self.definition.max_concurrency))
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix=threading.current_thread().name
+        ) as pool:
+            return list(pool.map(_one, user_contents))
+
+    @property
+    def supports_async(self) -> bool:
+        """True when `achat_json` is natively async (no worker thread per call)."""
+        provider = (self.definition.provider or "").strip().lower()
+        return provider in {"openai", "openai-compatible"}
+
+    async def achat_json(
+        self,
+        system_prompt: str,
+        user_content: str,
+        *,
+        schema_path: Optional[Path] = None,
+    ) -> Dict[str, Any]:
+        """Async variant of `chat_json`.
+
+        OpenAI-style providers use the shared `AsyncOpenAI` client on
+        `model_loop()` (hopping there from any other loop); the other
+        providers run `chat_json` in a worker thread.
+        """
+        if not self.supports_async:
+            return await asyncio.to_thread(
+                self.chat_json, system_prompt, user_content, schema_path=schema_path
+            )
+        loop = model_loop()
+        if asyncio.get_running_loop() is not loop:
+            return await asyncio.wrap_future(
+                asyncio.run_coroutine_threadsafe(
+                    self.achat_json(system_prompt, user_content), loop
+                )
+            )
+        async with self._async_slot():
+            return await self._achat_json_openai(system_prompt, user_content)
+
+    @contextlib.asynccontextmanager
+    async def _async_slot(self) -> AsyncIterator[None]:
+        """Hold one of `_slots` (shared with `chat_json`) without blocking the loop."""
+        if not self._slots.acquire(blocking=False):
+            acquiring = asyncio.ensure_future(asyncio.to_thread(self._slots.acquire))
+            try:
+                await asyncio.shield(acquiring)
+            except asyncio.CancelledError:
+                # The worker thread still takes the slot; hand it straight back.
+                acquiring.add_done_callback(lambda _: self._slots.release())
+                raise
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def _chat_json(
+        self,
+        system_prompt: str,
+        user_content: str,
+        *,
+        schema_path: Optional[Path] = None,
     ) -> Dict[str, Any]:
         provider = (self.definition.provider or "").strip().lower()
 
@@ -53,7 +333,9 @@ class ModelClient:
             return self._chat_json_openai(system_prompt, user_content)
 
         if provider == "hf-local":
-            return self._chat_json_hf_local(system_prompt, user_content)
+            return self._chat_json_hf_local(
+                system_prompt, user_content, schema_path=schema_path
+            )
 
         raise ValueError(
             f"Unknown model provider '{self.definition.provider}' for model '{self.definition.name}'. "
@@ -67,10 +349,6 @@ class ModelClient:
     def _chat_json_codex(
         self, system_prompt: str, user_content: str, *, schema_path: Path
     ) -> Dict[str, Any]:
-        schema_path = schema_path.expanduser().resolve()
-        if not schema_path.exists():
-            raise FileNotFoundError(f"Schema file not found: {schema_path}")
-
         codex_bin = (self.definition.codex_bin or "codex").strip() or "codex"
         provider = (self.definition.provider or "").strip().lower()
 
@@ -83,64 +361,30 @@ class ModelClient:
             + "\n\nReturn ONLY valid JSON that matches the provided JSON Schema."
         )
 
-        with tempfile.TemporaryDirectory(prefix="email_categorise_codex_") as td:
-            out_path = Path(td) / "last_message.txt"
-
-            cmd = [
-                codex_bin,
-                "exec",
-                "-",
-                "--model",
-                self.definition.model,
-                "--sandbox",
-                "read-only",
-                "--skip-git-repo-check",
-                "--color",
-                "never",
-                "--output-schema",
-                str(schema_path),
-                "--output-last-message",
-                str(out_path),
-            ]
-
-            if provider == "codex-oss":
-                cmd.append("--oss")
-
-            if self.definition.codex_profile:
-                cmd.extend(["--profile", self.definition.codex_profile])
-
-            for ov in self.definition.codex_config:
-                # Supports `-c key=value` multiple times.
-                cmd.extend(["-c", ov])
-
-            logger.debug("Running Codex CLI: %s", " ".join(cmd))
-            proc = subprocess.run(
-                cmd,
-                input=prompt,
-                text=True,
-                capture_output=True,
-            )
+        cmd = [
+            codex_bin,
+            "exec",
+            "-",
+            "--model",
+            self.definition.model,
+            "--sandbox",
+            "read-only",
+            "--skip-git-repo-check",
+            "--color",
+            "never",
+        ]
 
-            if proc.returncode != 0:
-                stderr = (proc.stderr or "").strip()
-                stdout = (proc.stdout or "").strip()
-                logger.error(
-                    "codex exec failed (rc=%s). stderr=%s", proc.returncode, stderr
-                )
-                raise RuntimeError(
-                    "codex exec failed. "
-                    f"rc={proc.returncode}. "
-                    f"stderr={stderr[:1000]} "
-                    f"stdout={stdout[:1000]}"
-                )
+        if provider == "codex-oss":
+            cmd.append("--oss")
+
+        if self.definition.codex_profile:
+            cmd.extend(["--profile", self.definition.codex_profile])
 
-            raw = ""
-            if out_path.exists():
-                raw = out_path.read_text(encoding="utf-8")
-            else:
-                # Fallback. Not expected when --output-last-message works.
-                raw = proc.stdout or ""
+        for ov in self.definition.codex_config:
+            # Supports `-c key=value` multiple times.
+            cmd.extend(["-c", ov])
 
+        raw = run_codex(cmd, prompt, schema_path)
         return _parse_json_lenient(raw)
 
     # -----------------------------
@@ -150,126 +394,209 @@ class ModelClient:
     def _chat_json_openai(
         self, system_prompt: str, user_content: str
     ) -> Dict[str, Any]:
-        # Lazy import so Codex-only installs don't need the dependency.
-        from .utils import load_env_file
-
-        load_env_file()
-        try:
-            from openai import OpenAI  # type: ignore[import]
-        except Exception as exc:  # pragma: no cover
-            raise RuntimeError(
-                "The 'openai' Python package is required for provider='openai' or 'openai-compatible'. "
-                "Install it, or switch provider to 'codex' to use the Codex CLI instead."
-            ) from exc
-
-        api_key = os.environ.get(self.definition.api_key_env)
-        if not api_key:
-            raise RuntimeError(
-                f"Environment variable {self.definition.api_key_env} is not set. "
-                f"Cannot authenticate for model {self.definition.name}."
-            )
-
-        kwargs: Dict[str, Any] = {"api_key": api_key}
-        if self.definition.base_url:
-            kwargs["base_url"] = self.definition.base_url
-
-        client = OpenAI(**kwargs)
-        logger.debug(
-            "Calling OpenAI model %s (provider=%s, base_url=%s)",
-            self.definition.model,
-            self.definition.provider,
-            self.definition.base_url or "https://api.openai.com/v1",
+        client = openai_client(self.definition)
+        completion = client.chat.completions.create(
+            **_openai_request(self.definition, system_prompt, user_content)
         )
+        return _openai_content(completion)
 
-        completion = client.chat.completions.create(
-            model=self.definition.model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content},
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.2,
+    async def _achat_json_openai(
+        self, system_prompt: str, user_content: str
+    ) -> Dict[str, Any]:
+        client = openai_client(self.definition, use_async=True)
+        completion = await client.chat.completions.create(
+            **_openai_request(self.definition, system_prompt, user_content)
         )
-        content = completion.choices[0].message.content
-        if not content:
-            raise RuntimeError("Model returned empty content")
-        return _parse_json_lenient(content)
+        return _openai_content(completion)
 
     # -----------------------------
     # Hugging Face local provider
     # -----------------------------
 
     def _chat_json_hf_local(
-        self, system_prompt: str, user_content: str
+        self,
+        system_prompt: str,
+        user_content: str,
+        *,
+        schema_path: Optional[Path] = None,
     ) -> Dict[str, Any]:
         """Run a local Hugging Face model to produce JSON.
 
         This assumes you have installed `transformers` (and usually `torch`)
         and downloaded the model specified in `self.definition.model`.
         """
+        result = self._chat_json_hf_local_batch(
+            system_prompt, [user_content], schema_path=schema_path
+        )[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
 
-        try:
-            import torch  # type: ignore[import]
-            from transformers import (  # type: ignore[import]
-                AutoModelForCausalLM,
-                AutoTokenizer,
-            )
-        except Exception as exc:  # pragma: no cover
-            raise RuntimeError(
-                "Provider 'hf-local' requires the 'transformers' and 'torch' "
-                "packages to be installed."
-            ) from exc
-
-        # Lazy-load and cache model/tokenizer on the client instance.
-        if not hasattr(self, "_hf_model"):
-            model_id = self.definition.model
-            if not model_id:
-                raise RuntimeError(
-                    f"Model id is required for provider='hf-local' "
-                    f"(definition={self.definition.name})."
-                )
-
-            logger.info("Loading Hugging Face model %s for %s", model_id, self.definition.name)
-            tokenizer = AutoTokenizer.from_pretrained(model_id)
-            model = AutoModelForCausalLM.from_pretrained(model_id)
-
-            device = self.definition.hf_device or (
-                "cuda" if torch.cuda.is_available() else "cpu"
-            )
-            model.to(device)
-
-            setattr(self, "_hf_tokenizer", tokenizer)
-            setattr(self, "_hf_model", model)
-            setattr(self, "_hf_device", device)
+    def _chat_json_hf_local_batch(
+        self,
+        system_prompt: str,
+        user_contents: List[str],
+        *,
+        schema_path: Optional[Path] = None,
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """Generate JSON for several prompts with padded, batched `generate()` calls.
 
-        tokenizer = getattr(self, "_hf_tokenizer")
-        model = getattr(self, "_hf_model")
-        device = getattr(self, "_hf_device")
+        Batches hold at most `hf_batch_size` prompts. The loaded model is shared
+        through the process-wide registry (see `hf_local_model`). With a schema
+        and `hf_constrained_decoding`, decoding is restricted to schema-valid
+        JSON and stops once the value is complete.
+        """
+        import torch  # type: ignore[import]
+        from transformers import LogitsProcessorList  # type: ignore[import]
 
-        prompt = (
+        loaded = hf_local_model(self.definition)
+        tokenizer = loaded.tokenizer
+        prompts = [
             "System instructions:\n"
             + system_prompt.strip()
             + "\n\nUser input:\n"
-            + user_content.strip()
+            + content.strip()
             + "\n\nReturn ONLY valid JSON that matches the expected schema."
-        )
+            for content in user_contents
+        ]
+        max_new_tokens = self.definition.hf_max_new_tokens or 512
+        batch_size = max(1, self.definition.hf_batch_size)
+        grammar = None
+        if schema_path is not None and self.definition.hf_constrained_decoding:
+            grammar = schema_prefix_for(schema_path.expanduser().resolve())
+
+        results: List[Union[Dict[str, Any], Exception]] = []
+        for start in range(0, len(prompts), batch_size):
+            batch = prompts[start : start + batch_size]
+            inputs = tokenizer(batch, return_tensors="pt", padding=True)
+            inputs = {k: v.to(loaded.device) for k, v in inputs.items()}
+            processors = LogitsProcessorList()
+            if grammar is not None:
+                processors.append(
+                    SchemaLogitsProcessor(
+                        tokenizer, grammar, prompt_length=inputs["input_ids"].shape[1]
+                    )
+                )
+            # One generate() at a time per loaded model; callers sharing the
+            # model queue here instead of competing for memory.
+            with loaded.lock, torch.no_grad():
+                output_ids = loaded.model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    temperature=0.2,
+                    pad_token_id=tokenizer.pad_token_id,
+                    logits_processor=processors,
+                )
+            # Prompts are left-padded, so generation starts at the same offset.
+            generated = output_ids[:, inputs["input_ids"].shape[1] :]
+            for text in tokenizer.batch_decode(generated, skip_special_tokens=True):
+                try:
+                    results.append(_parse_json_lenient(text))
+                except RuntimeError as exc:
+                    results.append(exc)
+        return results
 
-        inputs = tokenizer(prompt, return_tensors="pt")
-        inputs = {k: v.to(device) for k, v in inputs.items()}
 
-        max_new_tokens = self.definition.hf_max_new_tokens or 512
+@dataclass
+class _LoadedHFModel:
+    tokenizer: Any
+    model: Any
+    device: str
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
 
-        with torch.no_grad():
-            output_ids = model.generate(
-                **inputs,
-                max_new_tokens=max_new_tokens,
-                temperature=0.2,
+# Loaded hf-local models keyed by (model id, device, dtype, quantization), so
+# triage and reply definitions pointing at the same weights share one copy.
+_HF_MODELS: Dict[Tuple[str, str, str, str], _LoadedHFModel] = {}
+_HF_LOCK = threading.Lock()
+
+
+def _hf_torch_dtype(torch: Any, name: Optional[str]) -> Any:
+    if not name:
+        return None
+    if name == "auto":
+        return "auto"
+    dtype = getattr(torch, name, None)
+    if not isinstance(dtype, torch.dtype):
+        raise ValueError(f"Unknown hf_dtype '{name}' (use e.g. float16, bfloat16)")
+    return dtype
+
+
+def hf_local_model(definition: ModelDefinition) -> _LoadedHFModel:
+    """Return the process-wide loaded tokenizer/model for `definition`."""
+    try:
+        import torch  # type: ignore[import]
+        from transformers import (  # type: ignore[import]
+            AutoModelForCausalLM,
+            AutoTokenizer,
+        )
+    except Exception as exc:  # pragma: no cover
+        raise RuntimeError(
+            "Provider 'hf-local' requires the 'transformers' and 'torch' "
+            "packages to be installed."
+        ) from exc
+
+    model_id = definition.model
+    if not model_id:
+        raise RuntimeError(
+            f"Model id is required for provider='hf-local' "
+            f"(definition={definition.name})."
+        )
+    device = definition.hf_device or "auto"
+    if device == "auto":
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    quant = (definition.hf_quantization or "").strip().lower()
+    if quant not in {"", "8bit", "4bit"}:
+        raise ValueError(
+            f"Unknown hf_quantization '{definition.hf_quantization}' for model "
+            f"'{definition.name}' (use 8bit or 4bit)."
+        )
+    key = (model_id, device, definition.hf_dtype or "", quant)
+
+    with _HF_LOCK:
+        loaded = _HF_MODELS.get(key)
+        if loaded is not None:
+            return loaded
+
+        logger.info(
+            "Loading Hugging Face model %s for %s (device=%s, dtype=%s, quantization=%s)",
+            model_id,
+            definition.name,
+            device,
+            definition.hf_dtype or "default",
+            quant or "none",
+        )
+        tokenizer = AutoTokenizer.from_pretrained(model_id, padding_side="left")
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        kwargs: Dict[str, Any] = {}
+        dtype = _hf_torch_dtype(torch, definition.hf_dtype)
+        if dtype is not None:
+            kwargs["torch_dtype"] = dtype
+        # CPU 8-bit uses torch dynamic quantization after loading; everything
+        # else goes through bitsandbytes at load time.
+        cpu_dynamic = quant == "8bit" and device == "cpu"
+        if quant and not cpu_dynamic:
+            from transformers import BitsAndBytesConfig  # type: ignore[import]
+
+            kwargs["quantization_config"] = BitsAndBytesConfig(
+                load_in_8bit=quant == "8bit", load_in_4bit=quant == "4bit"
             )
+            kwargs["device_map"] = device
 
-        # Only keep tokens generated beyond the prompt.
-        generated = output_ids[0][inputs["input_ids"].shape[1] :]
-        text = tokenizer.decode(generated, skip_special_tokens=True)
-        return _parse_json_lenient(text)
+        model = AutoModelForCausalLM.from_pretrained(model_id, **kwargs)
+        if cpu_dynamic:
+            model = torch.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        if "device_map" not in kwargs:
+            model.to(device)
+        model.eval()
+
+        loaded = _LoadedHFModel(tokenizer=tokenizer, model=model, device=device)
+        _HF_MODELS[key] = loaded
+        return loaded
 
 
 def _parse_json_lenient(text: str) -> Dict[str, Any]:
@@ -315,22 +642,24 @@ def _parse_json_lenient(text: str) -> Dict[str, Any]:
 class StructuredLLMRunner:
     """Adapter to run a ModelClient with JSON Schema validation and file output.
 
-    This mirrors the existing CodexRunner.run_with_schema interface so that
-    triage and init code can stay provider-agnostic.
+    Every provider is driven through `run_with_schema` so that triage and
+    init code can stay provider-agnostic.
     """
 
     client: ModelClient
 
     def run_with_schema(
-        self, prompt: str, schema_path: Path, output_path: Path
+        self, prompt: str, schema_path: Path, output_path: Optional[Path] = None
     ) -> Dict[str, Any]:
+        """Call the model, validate against `schema_path` and return the result.
+
+        When `output_path` is given the validated JSON is also written there;
+        callers that persist results in the state store pass None.
+        """
         schema_path = schema_path.expanduser().resolve()
         if not schema_path.exists():
             raise FileNotFoundError(f"Schema file not found: {schema_path}")
 
-        output_path = output_path.expanduser()
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-
         # Call through the generic interface. We treat the entire prompt as the
         # "user" content; system_prompt is left empty.
         result = self.client.chat_json(
@@ -338,30 +667,123 @@ class StructuredLLMRunner:
             user_content=prompt,
             schema_path=schema_path,
         )
+        return self._validate_and_write(result, schema_path, output_path)
 
-        # Provider-agnostic JSON Schema validation.
-        try:
-            import jsonschema  # type: ignore[import]
-        except Exception as exc:  # pragma: no cover
-            logger.error(
-                "jsonschema package is required for schema validation. Error: %s", exc
-            )
-            raise RuntimeError(
-                "jsonschema package is required for validating LLM output "
-                "against JSON schemas."
-            ) from exc
+    def run_batch_with_schema(
+        self, prompts: List[str], schema_path: Path, *, validate: bool = True
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """Run several prompts through `ModelClient.chat_json_batch`.
 
-        schema = json.loads(schema_path.read_text(encoding="utf-8"))
-        try:
-            jsonschema.validate(instance=result, schema=schema)  # type: ignore[attr-defined]
-        except jsonschema.ValidationError as exc:  # type: ignore[attr-defined]
-            logger.error("Model output failed schema validation: %s", exc)
-            raise
+        Each result is validated on its own; a prompt whose output is missing
+        or invalid yields the exception in its slot instead of failing the batch.
+        With `validate=False` the parsed JSON is returned as-is, for callers
+        that validate parts of it themselves.
+        """
+        schema_path = schema_path.expanduser().resolve()
+        if not schema_path.exists():
+            raise FileNotFoundError(f"Schema file not found: {schema_path}")
 
-        output_path.write_text(json.dumps(result, indent=2), encoding="utf-8")
+        outputs = self.client.chat_json_batch(
+            system_prompt="", user_contents=prompts, schema_path=schema_path
+        )
+        results: List[Union[Dict[str, Any], Exception]] = []
+        for output in outputs:
+            if isinstance(output, Exception) or not validate:
+                results.append(output)
+                continue
+            try:
+                results.append(self._validate_and_write(output, schema_path, None))
+            except Exception as exc:
+                results.append(exc)
+        return results
+
+    async def arun_with_schema(
+        self,
+        prompt: str,
+        schema_path: Path,
+        output_path: Optional[Path] = None,
+        *,
+        validate: bool = True,
+    ) -> Dict[str, Any]:
+        """Async variant of `run_with_schema` built on `ModelClient.achat_json`."""
+        schema_path = schema_path.expanduser().resolve()
+        if not schema_path.exists():
+            raise FileNotFoundError(f"Schema file not found: {schema_path}")
+
+        result = await self.client.achat_json(
+            system_prompt="",
+            user_content=prompt,
+            schema_path=schema_path,
+        )
+        if not validate:
+            return result
+        return self._validate_and_write(result, schema_path, output_path)
+
+    def _validate_and_write(
+        self,
+        result: Dict[str, Any],
+        schema_path: Path,
+        output_path: Optional[Path],
+    ) -> Dict[str, Any]:
+        # Provider-agnostic JSON Schema validation.
+        validator = schema_validator(schema_path)
+        error = _best_match(validator.iter_errors(result))
+        if error is not None:
+            logger.error("Model output failed schema validation: %s", error)
+            raise error
+
+        if output_path is not None:
+            output_path = output_path.expanduser()
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            output_path.write_text(json.dumps(result, indent=2), encoding="utf-8")
         return result
 
 
+# Compiled validators keyed by resolved schema path, with the file's mtime so
+# edits to a schema are picked up without restarting.
+_VALIDATORS: Dict[Path, Tuple[int, Any]] = {}
+_VALIDATORS_LOCK = threading.Lock()
+
+
+def _best_match(errors: Any) -> Any:
+    from jsonschema.exceptions import best_match  # type: ignore[import]
+
+    return best_match(errors)
+
+
+def schema_validator(schema_path: Path) -> Any:
+    """Return a compiled jsonschema validator for `schema_path`.
+
+    Validators are built once per schema file and reused until the file's
+    mtime changes.
+    """
+    try:
+        import jsonschema  # type: ignore[import]
+    except Exception as exc:  # pragma: no cover
+        logger.error(
+            "jsonschema package is required for schema validation. Error: %s", exc
+        )
+        raise RuntimeError(
+            "jsonschema package is required for validating LLM output "
+            "against JSON schemas."
+        ) from exc
+
+    mtime = schema_path.stat().st_mtime_ns
+    with _VALIDATORS_LOCK:
+        cached = _VALIDATORS.get(schema_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+    schema = json.loads(schema_path.read_text(encoding="utf-8"))
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)
+    validator = cls(schema)
+    logger.debug("Compiled %s for %s", cls.__name__, schema_path)
+    with _VALIDATORS_LOCK:
+        _VALIDATORS[schema_path] = (mtime, validator)
+    return validator
+
+
 def build_model_clients(config: AppConfig) -> Dict[str, ModelClient]:
     return {
         name: ModelClient(definition=definition)
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import threading
+from typing import (
+    Any,
+    AsyncIterable,
+    Awaitable,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+logger = logging.getLogger("email_categorise.pipeline")
+
+# A named step: `fn` maps one item from the previous stage to one item for the
+# next. Each stage runs on its own thread.
+Stage = Tuple[str, Callable[[Any], Any]]
+AsyncStage = Tuple[str, Callable[[Any], Awaitable[Any]]]
+
+_DONE = object()
+_POLL_SECONDS = 0.1
+
+
+def run_pipeline(
+    source: Iterable[Any],
+    stages: Sequence[Stage],
+    *,
+    maxsize: int = 1,
+    source_name: str = "source",
+) -> List[Any]:
+    """Stream items from `source` through `stages`, overlapping the stages.
+
+    The source is iterated on its own thread and every stage runs on another,
+    connected by queues of at most `maxsize` items, so a stage works on item N
+    while the previous one produces item N+1 and no stage runs more than
+    `maxsize` items ahead of the next. Items keep their order. Returns the
+    outputs of the last stage.
+
+    If the source or any stage raises, the other threads stop at their next
+    item and the first exception is re-raised once every thread has exited.
+    Thread names extend the caller's (e.g. `acct-x-classify`) so per-account
+    log filters still match.
+    """
+    prefix = threading.current_thread().name
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    queues: List["queue.Queue[Any]"] = [queue.Queue(maxsize=maxsize) for _ in stages]
+    results: List[Any] = []
+
+    def _put(q: "queue.Queue[Any]", item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(q: "queue.Queue[Any]") -> Any:
+        while not stop.is_set():
+            try:
+                return q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(name: str, exc: BaseException) -> None:
+        logger.error("Pipeline stage %s failed: %s", name, exc)
+        errors.append(exc)
+        stop.set()
+
+    def _feed() -> None:
+        try:
+            for item in source:
+                if not _put(queues[0], item):
+                    return
+        except BaseException as exc:
+            _fail(source_name, exc)
+            return
+        _put(queues[0], _DONE)
+
+    def _work(
+        name: str,
+        fn: Callable[[Any], Any],
+        inbox: "queue.Queue[Any]",
+        outbox: Optional["queue.Queue[Any]"],
+    ) -> None:
+        try:
+            while True:
+                item = _get(inbox)
+                if item is _DONE:
+                    break
+                out = fn(item)
+                if outbox is None:
+                    results.append(out)
+                elif not _put(outbox, out):
+                    return
+        except BaseException as exc:
+            _fail(name, exc)
+            return
+        if outbox is not None:
+            _put(outbox, _DONE)
+
+    threads = [
+        threading.Thread(target=_feed, name=f"{prefix}-{source_name}", daemon=True)
+    ]
+    for i, (name, fn) in enumerate(stages):
+        outbox = queues[i + 1] if i + 1 < len(stages) else None
+        threads.append(
+            threading.Thread(
+                target=_work,
+                args=(name, fn, queues[i], outbox),
+                name=f"{prefix}-{name}",
+                daemon=True,
+            )
+        )
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+async def arun_pipeline(
+    source: AsyncIterable[Any],
+    stages: Sequence[AsyncStage],
+    *,
+    maxsize: int = 1,
+) -> List[Any]:
+    """`run_pipeline` for coroutines: each stage is a task on the running loop.
+
+    Same ordering and back-pressure; the first failure cancels the other
+    tasks and is re-raised.
+    """
+    queues: List["asyncio.Queue[Any]"] = [
+        asyncio.Queue(maxsize=maxsize) for _ in stages
+    ]
+    results: List[Any] = []
+
+    async def _feed() -> None:
+        async for item in source:
+            await queues[0].put(item)
+        await queues[0].put(_DONE)
+
+    async def _work(
+        fn: Callable[[Any], Awaitable[Any]],
+        inbox: "asyncio.Queue[Any]",
+        outbox: Optional["asyncio.Queue[Any]"],
+    ) -> None:
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                break
+            out = await fn(item)
+            if outbox is None:
+                results.append(out)
+            else:
+                await outbox.put(out)
+        if outbox is not None:
+            await outbox.put(_DONE)
+
+    tasks = [asyncio.ensure_future(_feed())]
+    for i, (_, fn) in enumerate(stages):
+        outbox = queues[i + 1] if i + 1 < len(stages) else None
+        tasks.append(asyncio.ensure_future(_work(fn, queues[i], outbox)))
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return results
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import fnmatch
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .config import PreTriageConfig
+
+logger = logging.getLogger("email_categorise.pre_triage")
+
+
+def _header(message: Dict[str, Any], name: str) -> Optional[str]:
+    for header in message.get("internetMessageHeaders") or []:
+        if str(header.get("name", "")).lower() == name.lower():
+            return str(header.get("value") or "")
+    return None
+
+
+def _any_search(patterns: Iterable[str], text: str) -> bool:
+    return any(re.search(p, text, re.IGNORECASE) for p in patterns)
+
+
+def _decision(msg_id: str, category: str, subject: str) -> Dict[str, Any]:
+    """A full triage decision (same shape as the LLM output) for `category`."""
+    return {
+        "id": msg_id,
+        "primary_category": category,
+        "secondary_categories": [],
+        "flag": None,
+        "needs_reply": False,
+        "is_marketing": category == "Marketing",
+        "is_informational": category == "Informational",
+        "mark_complete": False,
+        "mark_possibly_complete": False,
+        "pin": False,
+        "create_task": False,
+        "task_summary": None,
+        "summary": subject or None,
+    }
+
+
+def _is_ambiguous(
+    entry: Dict[str, Any], account_email: str, tone_contacts: Iterable[str]
+) -> bool:
+    """Mail from people the user actually corresponds with always goes to the LLM."""
+    sender = (entry.get("from") or {}).get("address") or ""
+    domain = account_email.lower().rsplit("@", 1)[-1]
+    stats = entry.get("sender_stats") or {}
+    return bool(
+        not sender
+        or stats.get("internal")
+        or sender.endswith("@" + domain)
+        or sender in tone_contacts
+        or entry.get("has_user_replied_in_thread")
+    )
+
+
+def classify(
+    message: Dict[str, Any],
+    entry: Dict[str, Any],
+    cfg: PreTriageConfig,
+    *,
+    account_email: str,
+    tone_contacts: Iterable[str] = (),
+) -> Optional[Tuple[Dict[str, Any], str]]:
+    """Return `(decision, reason)` for obvious mail, or None to ask the LLM.
+
+    `message` is the raw Graph message (for headers) and `entry` its triage
+    payload entry (sender, sender stats, thread flags). Configured rules are
+    applied first; the built-in heuristics only fire for automated or bulk
+    senders the user does not correspond with.
+    """
+    sender = ((entry.get("from") or {}).get("address") or "").lower()
+    subject = entry.get("subject") or ""
+
+    for rule in cfg.rules:
+        if not rule.sender and not rule.subject:
+            continue
+        if rule.sender and not fnmatch.fnmatch(sender, rule.sender.lower()):
+            continue
+        if rule.subject and not re.search(rule.subject, subject, re.IGNORECASE):
+            continue
+        return _decision(entry["id"], rule.category, subject), "rule"
+
+    if _is_ambiguous(entry, account_email, tone_contacts):
+        return None
+
+    local_part = sender.split("@", 1)[0]
+    noreply = any(p in local_part for p in cfg.noreply_patterns)
+    bulk = (
+        cfg.use_list_unsubscribe
+        and _header(message, "List-Unsubscribe") is not None
+    )
+    if not (noreply or bulk):
+        return None
+    if _any_search(cfg.order_subject_patterns, subject):
+        return _decision(entry["id"], "Order Confirmation", subject), "order"
+    if bulk:
+        return _decision(entry["id"], "Marketing", subject), "list-unsubscribe"
+    return _decision(entry["id"], "Informational", subject), "noreply"
+
+
+def pre_triage(
+    messages: List[Dict[str, Any]],
+    payload: List[Dict[str, Any]],
+    cfg: PreTriageConfig,
+    *,
+    account_email: str,
+    tone_contacts: Iterable[str] = (),
+) -> Tuple[Dict[str, Dict[str, Any]], List[Dict[str, Any]]]:
+    """Split a run into locally decided messages and payload entries for the LLM.
+
+    `messages` and `payload` are parallel lists. Returns the local decisions
+    keyed by message id and the payload entries that still need the LLM.
+    """
+    if not cfg.enabled:
+        return {}, list(payload)
+    contacts = {c.lower() for c in tone_contacts}
+    decided: Dict[str, Dict[str, Any]] = {}
+    remaining: List[Dict[str, Any]] = []
+    reasons: Dict[str, int] = {}
+    for message, entry in zip(messages, payload):
+        hit = classify(
+            message, entry, cfg, account_email=account_email, tone_contacts=contacts
+        )
+        if hit is None:
+            remaining.append(entry)
+            continue
+        decision, reason = hit
+        decided[entry["id"]] = decision
+        reasons[reason] = reasons.get(reason, 0) + 1
+    if decided:
+        logger.info(
+            "Pre-triaged %s of %s message(s) locally for %s (%s)",
+            len(decided),
+            len(payload),
+            account_email,
+            ", ".join(f"{k}={v}" for k, v in sorted(reasons.items())),
+        )
+    return decided, remaining
@@ -0,0 +1,533 @@
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .utils import ensure_dir, load_json, utc_now
+
+logger = logging.getLogger("email_categorise.state")
+
+DEFAULT_ACCOUNT_STATE: Dict[str, Any] = {
+    "first_run_completed": False,
+    "last_run_utc": None,
+}
+
+# Row key used for the fallback tone profile in `tone_profiles`.
+_DEFAULT_TONE = "__default__"
+# run_id given to triage outputs imported from the legacy JSON files.
+_MIGRATED_RUN = "migrated"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS account_state (
+    account TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sender_stats (
+    account TEXT NOT NULL,
+    address TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (account, address)
+);
+CREATE TABLE IF NOT EXISTS tone_profiles (
+    account TEXT NOT NULL,
+    contact TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (account, contact)
+);
+CREATE TABLE IF NOT EXISTS triage_outputs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account TEXT NOT NULL,
+    run_id TEXT,
+    created TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS triage_outputs_account
+    ON triage_outputs (account, created);
+CREATE TABLE IF NOT EXISTS triage_cache (
+    account TEXT NOT NULL,
+    key TEXT NOT NULL,
+    created TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (account, key)
+);
+CREATE TABLE IF NOT EXISTS message_cache (
+    account TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    change_key TEXT,
+    fields TEXT NOT NULL,
+    updated TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (account, message_id)
+);
+CREATE TABLE IF NOT EXISTS ledger_runs (
+    run_id TEXT NOT NULL,
+    account TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (run_id, account)
+);
+CREATE TABLE IF NOT EXISTS ledger_actions (
+    run_id TEXT NOT NULL,
+    account TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (run_id, account, seq)
+);
+"""
+
+
+def _stamp_to_iso(stamp: str) -> str:
+    """Convert a legacy `triage_<YYYYmmdd-HHMMSS>[_NN]` file stamp to ISO-8601."""
+    try:
+        parsed = datetime.strptime(stamp[:15], "%Y%m%d-%H%M%S")
+    except ValueError:
+        return utc_now().isoformat()
+    return parsed.replace(tzinfo=timezone.utc).isoformat()
+
+
+def _dumps(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, sort_keys=True)
+
+
+class StateStore:
+    """Embedded SQLite (WAL) store for all per-account state.
+
+    Replaces the per-account JSON files (state, sender stats, tone profiles,
+    triage outputs, triage cache), the Graph message mirror and the run
+    ledger, so updates touch only the
+    rows that changed instead of rewriting whole files. One connection is
+    shared by all threads and serialised with a lock.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        ensure_dir(path.parent)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            str(path), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql: str, params: Iterable[Any] = ()) -> List[Tuple[Any, ...]]:
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).fetchall()
+
+    def _transaction(self, statements: List[Tuple[str, Iterable[Any]]]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for sql, params in statements:
+                    self._conn.execute(sql, tuple(params))
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    # -----------------------------
+    # Account state
+    # -----------------------------
+
+    def get_state(self, account: str) -> Dict[str, Any]:
+        rows = self._execute(
+            "SELECT data FROM account_state WHERE account = ?", (account.lower(),)
+        )
+        if not rows:
+            return dict(DEFAULT_ACCOUNT_STATE)
+        return json.loads(rows[0][0])
+
+    def has_state(self, account: str) -> bool:
+        return bool(
+            self._execute(
+                "SELECT 1 FROM account_state WHERE account = ?", (account.lower(),)
+            )
+        )
+
+    def set_state(self, account: str, state: Dict[str, Any]) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO account_state (account, data) VALUES (?, ?)",
+            (account.lower(), _dumps(state)),
+        )
+
+    # -----------------------------
+    # Sender stats / tone profiles
+    # -----------------------------
+
+    def get_sender_stats(self, account: str) -> Dict[str, Any]:
+        rows = self._execute(
+            "SELECT address, data FROM sender_stats WHERE account = ?",
+            (account.lower(),),
+        )
+        return {addr: json.loads(data) for addr, data in rows}
+
+    def replace_sender_stats(self, account: str, stats: Dict[str, Any]) -> None:
+        acct = account.lower()
+        statements: List[Tuple[str, Iterable[Any]]] = [
+            ("DELETE FROM sender_stats WHERE account = ?", (acct,))
+        ]
+        statements.extend(
+            (
+                "INSERT INTO sender_stats (account, address, data) VALUES (?, ?, ?)",
+                (acct, addr, _dumps(entry)),
+            )
+            for addr, entry in stats.items()
+        )
+        self._transaction(statements)
+
+    def get_tone_profiles(self, account: str) -> Dict[str, Any]:
+        rows = self._execute(
+            "SELECT contact, data FROM tone_profiles WHERE account = ?",
+            (account.lower(),),
+        )
+        profiles: Dict[str, Any] = {"contacts": {}, "default": {}}
+        for contact, data in rows:
+            if contact == _DEFAULT_TONE:
+                profiles["default"] = json.loads(data)
+            else:
+                profiles["contacts"][contact] = json.loads(data)
+        return profiles
+
+    def replace_tone_profiles(self, account: str, profiles: Dict[str, Any]) -> None:
+        acct = account.lower()
+        rows = dict(profiles.get("contacts") or {})
+        if profiles.get("default"):
+            rows[_DEFAULT_TONE] = profiles["default"]
+        statements: List[Tuple[str, Iterable[Any]]] = [
+            ("DELETE FROM tone_profiles WHERE account = ?", (acct,))
+        ]
+        statements.extend(
+            (
+                "INSERT INTO tone_profiles (account, contact, data) VALUES (?, ?, ?)",
+                (acct, contact, _dumps(profile)),
+            )
+            for contact, profile in rows.items()
+        )
+        self._transaction(statements)
+
+    # -----------------------------
+    # Triage outputs / cache
+    # -----------------------------
+
+    def record_triage_output(
+        self,
+        account: str,
+        data: Dict[str, Any],
+        run_id: Optional[str] = None,
+        created: Optional[str] = None,
+    ) -> None:
+        self._execute(
+            "INSERT INTO triage_outputs (account, run_id, created, data) "
+            "VALUES (?, ?, ?, ?)",
+            (account.lower(), run_id, created or utc_now().isoformat(), _dumps(data)),
+        )
+
+    def list_triage_outputs(self, account: str) -> List[Dict[str, Any]]:
+        rows = self._execute(
+            "SELECT run_id, created, data FROM triage_outputs "
+            "WHERE account = ? ORDER BY created, id",
+            (account.lower(),),
+        )
+        return [
+            {"run_id": run_id, "created": created, "data": json.loads(data)}
+            for run_id, created, data in rows
+        ]
+
+    def cache_get(
+        self, account: str, key: str
+    ) -> Optional[Tuple[str, Dict[str, Any]]]:
+        rows = self._execute(
+            "SELECT created, data FROM triage_cache WHERE account = ? AND key = ?",
+            (account.lower(), key),
+        )
+        if not rows:
+            return None
+        return rows[0][0], json.loads(rows[0][1])
+
+    def cache_put_many(
+        self, account: str, entries: Dict[str, Tuple[str, Dict[str, Any]]]
+    ) -> None:
+        acct = account.lower()
+        self._transaction(
+            [
+                (
+                    "INSERT OR REPLACE INTO triage_cache (account, key, created, data) "
+                    "VALUES (?, ?, ?, ?)",
+                    (acct, key, created, _dumps(data)),
+                )
+                for key, (created, data) in entries.items()
+            ]
+        )
+
+    def cache_prune(self, account: str, older_than: str, max_entries: int) -> None:
+        """Delete cache rows created before `older_than` and beyond `max_entries`."""
+        acct = account.lower()
+        statements: List[Tuple[str, Iterable[Any]]] = [
+            (
+                "DELETE FROM triage_cache WHERE account = ? AND created < ?",
+                (acct, older_than),
+            )
+        ]
+        if max_entries > 0:
+            statements.append(
+                (
+                    "DELETE FROM triage_cache WHERE account = ? AND key NOT IN ("
+                    "SELECT key FROM triage_cache WHERE account = ? "
+                    "ORDER BY created DESC LIMIT ?)",
+                    (acct, acct, max_entries),
+                )
+            )
+        self._transaction(statements)
+
+    # -----------------------------
+    # Graph message mirror
+    # -----------------------------
+
+    def messages_get_many(
+        self, account: str, message_ids: List[str]
+    ) -> Dict[str, Tuple[Optional[str], str, Dict[str, Any]]]:
+        """Cached messages by id: `(change_key, fields, message)`."""
+        acct = account.lower()
+        out: Dict[str, Tuple[Optional[str], str, Dict[str, Any]]] = {}
+        # Stay well under SQLite's bound-parameter limit.
+        for start in range(0, len(message_ids), 500):
+            chunk = message_ids[start : start + 500]
+            rows = self._execute(
+                "SELECT message_id, change_key, fields, data FROM message_cache "
+                f"WHERE account = ? AND message_id IN ({','.join('?' * len(chunk))})",
+                (acct, *chunk),
+            )
+            for message_id, change_key, fields, data in rows:
+                out[message_id] = (
+                    change_key,
+                    fields,
+                    json.loads(zlib.decompress(data).decode("utf-8")),
+                )
+        return out
+
+    def messages_put_many(
+        self, account: str, fields: str, messages: List[Dict[str, Any]]
+    ) -> None:
+        """Store messages (zlib-compressed JSON) with the `$select` they were
+        fetched with."""
+        acct = account.lower()
+        now = utc_now().isoformat()
+        self._transaction(
+            [
+                (
+                    "INSERT OR REPLACE INTO message_cache "
+                    "(account, message_id, change_key, fields, updated, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        acct,
+                        m["id"],
+                        m.get("changeKey"),
+                        fields,
+                        now,
+                        zlib.compress(_dumps(m).encode("utf-8")),
+                    ),
+                )
+                for m in messages
+                if m.get("id")
+            ]
+        )
+
+    def messages_prune(self, account: str, older_than: str) -> None:
+        self._execute(
+            "DELETE FROM message_cache WHERE account = ? AND updated < ?",
+            (account.lower(), older_than),
+        )
+
+    # -----------------------------
+    # Run ledger
+    # -----------------------------
+
+    def write_ledger(
+        self,
+        run_id: str,
+        account: str,
+        timestamp: str,
+        actions: List[Dict[str, Any]],
+    ) -> None:
+        acct = account.lower()
+        statements: List[Tuple[str, Iterable[Any]]] = [
+            (
+                "DELETE FROM ledger_actions WHERE run_id = ? AND account = ?",
+                (run_id, acct),
+            ),
+            # Keep the timestamp of a run's first write so `ledger_run_order`
+            # stays stable.
+            (
+                "INSERT OR IGNORE INTO ledger_runs (run_id, account, timestamp) "
+                "VALUES (?, ?, ?)",
+                (run_id, acct, timestamp),
+            ),
+        ]
+        statements.extend(
+            (
+                "INSERT INTO ledger_actions (run_id, account, seq, data) "
+                "VALUES (?, ?, ?, ?)",
+                (run_id, acct, seq, _dumps(action)),
+            )
+            for seq, action in enumerate(actions)
+        )
+        self._transaction(statements)
+
+    def append_ledger(
+        self,
+        run_id: str,
+        account: str,
+        timestamp: str,
+        actions: List[Dict[str, Any]],
+    ) -> None:
+        """Add `actions` after those already recorded for the run, so a run
+        ledgered page by page writes each action once."""
+        acct = account.lower()
+        statements: List[Tuple[str, Iterable[Any]]] = [
+            (
+                "INSERT OR IGNORE INTO ledger_runs (run_id, account, timestamp) "
+                "VALUES (?, ?, ?)",
+                (run_id, acct, timestamp),
+            ),
+        ]
+        statements.extend(
+            (
+                "INSERT INTO ledger_actions (run_id, account, seq, data) "
+                "SELECT ?, ?, COALESCE(MAX(seq), -1) + 1, ? FROM ledger_actions "
+                "WHERE run_id = ? AND account = ?",
+                (run_id, acct, _dumps(action), run_id, acct),
+            )
+            for action in actions
+        )
+        self._transaction(statements)
+
+    def load_ledger(self, run_id: str, account: str) -> Optional[Dict[str, Any]]:
+        acct = account.lower()
+        runs = self._execute(
+            "SELECT timestamp FROM ledger_runs WHERE run_id = ? AND account = ?",
+            (run_id, acct),
+        )
+        if not runs:
+            return None
+        rows = self._execute(
+            "SELECT data FROM ledger_actions WHERE run_id = ? AND account = ? "
+            "ORDER BY seq",
+            (run_id, acct),
+        )
+        return {
+            "run_id": run_id,
+            "account": account,
+            "timestamp": runs[0][0],
+            "actions": [json.loads(data) for (data,) in rows],
+        }
+
+    def ledger_run_order(self) -> List[str]:
+        """Run ids ordered by when they were first recorded (oldest first)."""
+        rows = self._execute(
+            "SELECT run_id FROM ledger_runs GROUP BY run_id ORDER BY MIN(timestamp)"
+        )
+        return [run_id for (run_id,) in rows]
+
+    # -----------------------------
+    # Migration from the JSON layout
+    # -----------------------------
+
+    def import_json(
+        self, data_dir: Path, ledger_dir: Path, accounts: Iterable[str]
+    ) -> Dict[str, int]:
+        """Import the legacy JSON files into the store.
+
+        Reads `data/<account>/{state,sender_stats,tone_profiles,triage_cache}.json`,
+        every `data/<account>/triage_*.json` and `ledger/*.json`. Existing rows
+        for the same keys are replaced, so the import can be re-run safely.
+        """
+        counts = {
+            "accounts": 0,
+            "sender_stats": 0,
+            "tone_profiles": 0,
+            "triage_outputs": 0,
+            "triage_cache": 0,
+            "ledger_runs": 0,
+        }
+        for account in accounts:
+            acct_dir = data_dir / account.replace("@", "_at_").replace("/", "_")
+            if not acct_dir.is_dir():
+                continue
+            counts["accounts"] += 1
+            state = load_json(acct_dir / "state.json", None)
+            if state is not None:
+                self.set_state(account, state)
+            stats = load_json(acct_dir / "sender_stats.json", None)
+            if stats:
+                self.replace_sender_stats(account, stats)
+                counts["sender_stats"] += len(stats)
+            tones = load_json(acct_dir / "tone_profiles.json", None)
+            if tones:
+                self.replace_tone_profiles(account, tones)
+                counts["tone_profiles"] += len(tones.get("contacts") or {}) + bool(
+                    tones.get("default")
+                )
+            cache = load_json(acct_dir / "triage_cache.json", None)
+            if cache:
+                self.cache_put_many(
+                    account,
+                    {
+                        key: (entry["created"], entry["decision"])
+                        for key, entry in cache.items()
+                        if entry.get("created") and "decision" in entry
+                    },
+                )
+                counts["triage_cache"] += len(cache)
+            self._execute(
+                "DELETE FROM triage_outputs WHERE account = ? AND run_id = ?",
+                (account.lower(), _MIGRATED_RUN),
+            )
+            for path in sorted(acct_dir.glob("triage_*.json")):
+                if path.name == "triage_cache.json":
+                    continue
+                self.record_triage_output(
+                    account,
+                    load_json(path, {}),
+                    run_id=_MIGRATED_RUN,
+                    created=_stamp_to_iso(path.stem.removeprefix("triage_")),
+                )
+                counts["triage_outputs"] += 1
+
+        for path in sorted(ledger_dir.glob("*.json")):
+            if path.name == "index.json":
+                continue
+            entry = load_json(path, None)
+            if not entry or not entry.get("run_id") or not entry.get("account"):
+                continue
+            self.write_ledger(
+                entry["run_id"],
+                entry["account"],
+                entry.get("timestamp") or utc_now().isoformat(),
+                entry.get("actions") or [],
+            )
+            counts["ledger_runs"] += 1
+        return counts
+
+
+_STORES: Dict[Path, StateStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def open_store(repo_root: Path) -> StateStore:
+    """Return the process-wide store at `<repo_root>/data/state.db`."""
+    path = (Path(repo_root) / "data" / "state.db").resolve()
+    with _STORES_LOCK:
+        store = _STORES.get(path)
+        if store is None:
+            store = StateStore(path)
+            _STORES[path] = store
+        return store
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from .state_store import StateStore
+from .utils import utc_now
+
+logger = logging.getLogger("email_categorise.cache")
+
+
+def triage_fingerprint(entry: Dict[str, Any], prompt_version: str, model: str) -> str:
+    """Content hash of one triage payload entry plus the prompt/model identity.
+
+    Any change to the message, its thread context, sender stats or tone
+    profile, the prompt version or the model produces a different key.
+    """
+    blob = json.dumps(
+        {"prompt_version": prompt_version, "model": model, "entry": entry},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class TriageCache:
+    """Per-account cache of triage decisions keyed by `triage_fingerprint`.
+
+    Rows live in the `triage_cache` table of the state store. Entries expire
+    after `ttl_hours`, and the oldest entries are evicted beyond
+    `max_entries`. A `ttl_hours` of 0 disables the cache entirely.
+    """
+
+    def __init__(
+        self, store: StateStore, account: str, ttl_hours: int, max_entries: int
+    ) -> None:
+        self.store = store
+        self.account = account
+        self.ttl = timedelta(hours=ttl_hours)
+        self.max_entries = max_entries
+        self.enabled = ttl_hours > 0
+        self._pending: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+
+    def _expired(self, created: Optional[str]) -> bool:
+        if not created:
+            return True
+        try:
+            return utc_now() - datetime.fromisoformat(created) > self.ttl
+        except ValueError:
+            return True
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        hit = self._pending.get(key) or self.store.cache_get(self.account, key)
+        if not hit or self._expired(hit[0]):
+            return None
+        return hit[1]
+
+    def put(self, key: str, decision: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        self._pending[key] = (utc_now().isoformat(), decision)
+
+    def save(self) -> None:
+        """Write pending entries, then drop expired rows and enforce the size cap."""
+        if not self.enabled:
+            return
+        if self._pending:
+            self.store.cache_put_many(self.account, self._pending)
+            logger.debug(
+                "Saved %s triage cache entries for %s", len(self._pending), self.account
+            )
+            self._pending = {}
+        self.store.cache_prune(
+            self.account, (utc_now() - self.ttl).isoformat(), self.max_entries
+        )
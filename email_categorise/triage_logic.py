@@ -1,25 +1,46 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import hashlib
 import json
 import logging
+import os
+import tempfile
+import threading
+import time
 import uuid
 import html
+from concurrent.futures import ThreadPoolExecutor
 from html.parser import HTMLParser
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
-
-from .auth import (
-    acquire_application_token,
-    acquire_delegated_token,
-    build_confidential_client,
-    build_public_client,
-    record_login_event,
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
 )
+
+import requests  # type: ignore[import]
+
+from .auth import credential_manager, record_login_event
 from .config import AppConfig, AccountConfig
-from .graph_client import GraphClient
-from .model_client import StructuredLLMRunner
-from .utils import account_state_dir, load_json, save_json, utc_now, run_ledger_dir
+from .graph_async import AsyncGraphClient
+from .graph_client import GraphClient, TokenProvider
+from .graph_retry import RetryPolicy, mailbox_bucket
+from .message_cache import MessageCache
+from .model_client import StructuredLLMRunner, run_on_model_loop, schema_validator
+from .triage_cache import TriageCache, triage_fingerprint
+from .pipeline import arun_pipeline, run_pipeline
+from .pre_triage import pre_triage
+from .state_store import StateStore, open_store
+from .utils import account_state_dir, utc_now
 
 logger = logging.getLogger("email_categorise.logic")
 
@@ -64,6 +85,16 @@ CATEGORY_COLORS = {
     "Issue": "preset2",  # amber/red
     "Task": "preset8",  # blue-green
 }
+# Stored with each mailbox's last category sync; a changed palette forces a
+# resync regardless of the TTL.
+CATEGORY_COLORS_HASH = hashlib.sha256(
+    json.dumps(CATEGORY_COLORS, sort_keys=True).encode("utf-8")
+).hexdigest()[:16]
+
+
+# Bump whenever the triage prompt or output schema changes meaning, so cached
+# decisions from the old prompt are not reused.
+TRIAGE_PROMPT_VERSION = "3"
 
 
 FLAG_HELP = """Flags (exact strings):
@@ -260,10 +291,17 @@ def _build_followup_flag(flag_name: Optional[str]) -> Optional[Dict[str, Any]]:
     }
 
 
-def _triage_prompt() -> str:
+def _triage_prompt(with_confidence: bool = False) -> str:
+    confidence = (
+        "- confidence (number 0-1: how sure you are that this decision is right)\n"
+        if with_confidence
+        else ""
+    )
     return (
         "You triage email for a busy software developer.\n"
         "You will be given JSON with an array of messages under key 'messages'.\n"
+        "A message's tone_profile and sender_stats values are keys into the\n"
+        "top-level 'tone_profiles' and 'sender_stats' objects.\n"
         "For each message, output exactly one decision object containing:\n"
         "- id (must match)\n"
         "- primary_category (exact string from the list)\n"
@@ -278,7 +316,7 @@ def _triage_prompt() -> str:
         "- create_task (boolean)\n"
         "- task_summary (string or null)\n"
         "- summary (string or null)\n"
-        "- draft_reply_body (string or null)\n\n"
+        f"{confidence}\n"
         f"{CATEGORY_HELP}\n"
         f"{FLAG_HELP}\n\n"
         "Rules:\n"
@@ -286,20 +324,516 @@ def _triage_prompt() -> str:
         "- When in doubt, set mark_possibly_complete=true instead.\n"
         "- Marketing only for obvious newsletters/promotions.\n"
         "- Informational for messages that provide info but don't clearly require action.\n"
-        "- If needs_reply=true, produce a draft_reply_body using the provided tone_profile.\n"
     )
 
 
-def _ensure_category_colors(graph: GraphClient) -> None:
+def _estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token for English/JSON)."""
+    return len(text) // 4 + 1
+
+
+# Messages are at least this long after budget trimming.
+_MIN_BODY_CHARS = 200
+
+
+def _encode_prompt_json(doc: Any) -> str:
+    """Compact JSON for prompts: no indentation or separator padding."""
+    return json.dumps(doc, ensure_ascii=False, separators=(",", ":"))
+
+
+def _shared_context(entry: Dict[str, Any]) -> List[Tuple[str, str, Any]]:
+    """`(section, key, value)` for the context an entry shares with others.
+
+    Tone profiles are keyed by their content (several senders fall back to the
+    same default profile); sender stats by sender address.
+    """
+    shared: List[Tuple[str, str, Any]] = []
+    profile = entry.get("tone_profile")
+    if profile:
+        shared.append(("tone_profiles", json.dumps(profile, sort_keys=True), profile))
+    stats = entry.get("sender_stats")
+    if stats:
+        addr = (entry.get("from") or {}).get("address") or entry["id"]
+        shared.append(("sender_stats", addr, stats))
+    return shared
+
+
+def _compact_chunk(chunk: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Prompt document for `chunk` with shared context listed once.
+
+    Each message's `tone_profile` becomes a key (`t1`, `t2`, ...) into the
+    top-level `tone_profiles` object and its `sender_stats` the sender address
+    keyed into `sender_stats`. The payload entries themselves are not changed.
+    """
+    sections: Dict[str, Dict[str, Any]] = {"tone_profiles": {}, "sender_stats": {}}
+    tone_keys: Dict[str, str] = {}
+    messages: List[Dict[str, Any]] = []
+    for entry in chunk:
+        msg = {
+            k: v for k, v in entry.items() if k not in {"tone_profile", "sender_stats"}
+        }
+        for section, key, value in _shared_context(entry):
+            if section == "tone_profiles":
+                key = tone_keys.setdefault(key, f"t{len(tone_keys) + 1}")
+                msg["tone_profile"] = key
+            else:
+                msg["sender_stats"] = key
+            sections[section][key] = value
+        messages.append(msg)
+    doc: Dict[str, Any] = {k: v for k, v in sections.items() if v}
+    doc["messages"] = messages
+    return doc
+
+
+def _body_cap(lengths: List[int], cut: int, floor: int) -> int:
+    """Largest body length cap (>= floor) that removes at least `cut` chars."""
+    lo, hi = floor, max(lengths, default=floor)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if sum(max(0, n - mid) for n in lengths) >= cut:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _fit_prompt_budget(
+    doc: Dict[str, Any], base_tokens: int, budget_tokens: int
+) -> Dict[str, Any]:
+    """Trim `doc` until the estimated prompt fits in `budget_tokens`.
+
+    Thread tails go first, oldest entries first, keeping the latest thread
+    message of each conversation. Then the longest bodies are cut down to a
+    common length (never below `_MIN_BODY_CHARS`). If that is still not
+    enough the prompt is sent over budget and a warning is logged.
+    """
+    messages = doc["messages"]
+
+    def excess() -> int:
+        return base_tokens + _estimate_tokens(_encode_prompt_json(doc)) - budget_tokens
+
+    while excess() > 0:
+        longest = max(messages, key=lambda m: len(m.get("thread_summary") or []))
+        thread = longest.get("thread_summary") or []
+        if len(thread) <= 1:
+            break
+        longest["thread_summary"] = thread[1:]
+
+    for _ in range(4):
+        over = excess()
+        if over <= 0:
+            break
+        lengths = [len(m.get("body") or "") for m in messages]
+        cap = _body_cap(lengths, over * 4, _MIN_BODY_CHARS)
+        if cap >= max(lengths, default=0):
+            break
+        for m in messages:
+            m["body"] = _trim(m.get("body"), cap)
+
+    if excess() > 0:
+        logger.warning(
+            "Triage prompt exceeds its %s token budget by ~%s tokens after trimming",
+            budget_tokens,
+            excess(),
+        )
+    return doc
+
+
+def _triage_chunk_prompt(
+    chunk: List[Dict[str, Any]],
+    with_confidence: bool = False,
+    budget_tokens: int = 0,
+) -> str:
+    prompt = _triage_prompt(with_confidence) + "\n\nINPUT JSON:\n"
+    doc = _compact_chunk(chunk)
+    if budget_tokens > 0:
+        doc = _fit_prompt_budget(doc, _estimate_tokens(prompt), budget_tokens)
+    return prompt + _encode_prompt_json(doc)
+
+
+def _chunk_payload(
+    payload_msgs: List[Dict[str, Any]], max_messages: int, max_tokens: int
+) -> List[List[Dict[str, Any]]]:
+    """Split triage payload entries into prompt-sized chunks.
+
+    A chunk closes when it reaches `max_messages` entries or when adding the
+    next entry would push the estimated prompt past `max_tokens` (0 disables
+    either limit). A single oversized entry still gets a chunk of its own.
+    Shared tone profiles and sender stats are counted once per chunk, as
+    `_compact_chunk` lists them.
+    """
+    base_tokens = _estimate_tokens(_triage_chunk_prompt([]))
+    chunks: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    current_tokens = base_tokens
+    seen: Set[Tuple[str, str]] = set()
+    for entry in payload_msgs:
+        own = {
+            k: v for k, v in entry.items() if k not in {"tone_profile", "sender_stats"}
+        }
+        entry_tokens = _estimate_tokens(_encode_prompt_json(own))
+        shared = {
+            (section, key): _estimate_tokens(_encode_prompt_json(value))
+            for section, key, value in _shared_context(entry)
+        }
+        new_shared = sum(t for k, t in shared.items() if k not in seen)
+        full = max_messages > 0 and len(current) >= max_messages
+        added = entry_tokens + new_shared
+        over = max_tokens > 0 and current_tokens + added > max_tokens
+        if current and (full or over):
+            chunks.append(current)
+            current, current_tokens, seen = [], base_tokens, set()
+            added = entry_tokens + sum(shared.values())
+        current.append(entry)
+        current_tokens += added
+        seen.update(shared)
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _chunk_for_runner(
+    runner: StructuredLLMRunner, entries: List[Dict[str, Any]], triage_cfg
+) -> List[List[Dict[str, Any]]]:
+    """Chunk `entries` for `runner`, within both the triage chunk size and the
+    model's context budget."""
+    max_tokens = triage_cfg.triage_chunk_max_tokens
+    budget = runner.client.definition.context_budget_tokens
+    if budget > 0:
+        max_tokens = min(max_tokens, budget) if max_tokens > 0 else budget
+    return _chunk_payload(entries, triage_cfg.triage_chunk_messages, max_tokens)
+
+
+def _issue_prompts(
+    runner: StructuredLLMRunner,
+    prompts: List[str],
+    schema: Path,
+    *,
+    validate: bool = True,
+) -> List[Any]:
+    """Send independent prompts concurrently; failures are returned in place."""
+
+    async def _gather() -> List[Any]:
+        return await asyncio.gather(
+            *(
+                runner.arun_with_schema(prompt, schema, validate=validate)
+                for prompt in prompts
+            ),
+            return_exceptions=True,
+        )
+
+    if getattr(runner.client, "supports_async", False):
+        # Native async client: issue every prompt on the shared model loop;
+        # the client's process-wide slots bound how many are in flight.
+        return run_on_model_loop(_gather())
+    # Batched generation for hf-local, a bounded thread fan-out otherwise.
+    return runner.run_batch_with_schema(prompts, schema, validate=validate)
+
+
+def _issue_triage_chunks(
+    runner: StructuredLLMRunner,
+    chunks: List[List[Dict[str, Any]]],
+    schema: Path,
+    with_confidence: bool = False,
+) -> List[Any]:
+    """Send every chunk to the triage model; failures are returned in place.
+
+    Outputs are parsed but not schema-validated here, so that valid decisions
+    can be kept from an output where only some messages are malformed.
+    Prompts are trimmed to the model's `context_budget_tokens`.
+    """
+    budget = runner.client.definition.context_budget_tokens
+    prompts = [_triage_chunk_prompt(c, with_confidence, budget) for c in chunks]
+    return _issue_prompts(runner, prompts, schema, validate=False)
+
+
+def _accept_triage_output(
+    output: Any, chunk: List[Dict[str, Any]], item_validator: Any
+) -> Tuple[Dict[str, Dict[str, Any]], List[Dict[str, Any]]]:
+    """Split one chunk's output into valid decisions and the entries to retry.
+
+    Each decision is validated on its own against the schema's message item;
+    entries of the chunk with no valid decision are returned for a retry.
+    """
+    wanted = {e["id"] for e in chunk}
+    items = output.get("messages") if isinstance(output, dict) else None
+    good: Dict[str, Dict[str, Any]] = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict) or not isinstance(item.get("id"), str):
+            continue
+        if item["id"] not in wanted:
+            continue
+        if item_validator.is_valid(item):
+            good[item["id"]] = item
+        else:
+            logger.debug("Discarding invalid triage decision for %s", item["id"])
+    return good, [e for e in chunk if e["id"] not in good]
+
+
+def _confidence_schema(base: Path) -> Path:
+    """`base` with a required per-decision `confidence` score, for the cascade.
+
+    Derived rather than kept as a second schema file so the two cannot drift.
+    """
+    base = base.resolve()
+    return _write_confidence_schema(base, base.stat().st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=4)
+def _write_confidence_schema(base: Path, mtime_ns: int) -> Path:
+    # Codex takes the schema as a path and validators are cached per path, so
+    # the result is written once to a file named after its content.
+    schema = json.loads(base.read_text(encoding="utf-8"))
+    item = schema["properties"]["messages"]["items"]
+    item["properties"]["confidence"] = {"type": "number", "minimum": 0, "maximum": 1}
+    item["required"] = [*item["required"], "confidence"]
+    text = json.dumps(schema, indent=2) + "\n"
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+    name = base.name.replace(".schema.json", f"_confidence.{digest}.schema.json")
+    path = Path(tempfile.gettempdir()) / name
+    if not path.exists():
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+    return path
+
+
+def _run_triage_chunks(
+    runner: StructuredLLMRunner,
+    chunks: List[List[Dict[str, Any]]],
+    store: StateStore,
+    account_email: str,
+    run_id: Optional[str] = None,
+    max_retries: int = 8,
+    with_confidence: bool = False,
+    record: bool = True,
+) -> Dict[str, Dict[str, Any]]:
+    """Triage chunks concurrently and merge the decisions by message id.
+
+    Concurrency is bounded by the triage model's `max_concurrency`; models with
+    a native async client are driven from one event loop, and hf-local chunks
+    are generated in batches. Valid decisions are kept per message even when
+    other messages in the same output are malformed; messages that fail or go
+    missing are re-issued in halved sub-chunks down to single messages, with
+    at most `max_retries` extra calls overall. Messages still without a
+    decision stay unprocessed for the next run. Accepted decisions are
+    recorded in the state store unless `record` is false; if nothing succeeds
+    the first error is raised. `with_confidence` asks for (and validates) a
+    per-decision confidence score.
+    """
+    schema = Path(__file__).parent / "json_schemas" / "triage_output.schema.json"
+    if with_confidence:
+        schema = _confidence_schema(schema)
+    validator = schema_validator(schema.resolve())
+    item_validator = validator.evolve(
+        schema=validator.schema["properties"]["messages"]["items"]
+    )
+
+    triage_map: Dict[str, Dict[str, Any]] = {}
+    errors: List[BaseException] = []
+    retries_left = max(0, max_retries)
+    pending = list(chunks)
+    attempt = 0
+    while pending:
+        outputs = _issue_triage_chunks(runner, pending, schema, with_confidence)
+        retry: List[List[Dict[str, Any]]] = []
+        for chunk, res in zip(pending, outputs):
+            if isinstance(res, BaseException):
+                logger.error(
+                    "Triage chunk of %s message(s) failed: %s", len(chunk), res
+                )
+                errors.append(res)
+                failed = chunk
+            else:
+                good, failed = _accept_triage_output(res, chunk, item_validator)
+                if good and record:
+                    store.record_triage_output(
+                        account_email,
+                        {"messages": list(good.values())},
+                        run_id=run_id,
+                    )
+                triage_map.update(good)
+            if len(failed) > 1:
+                half = (len(failed) + 1) // 2
+                retry.extend([failed[:half], failed[half:]])
+            elif failed and len(chunk) > 1:
+                retry.append(failed)
+            elif failed:
+                logger.warning(
+                    "Giving up on triage for message %s this run", failed[0]["id"]
+                )
+
+        if len(retry) > retries_left:
+            dropped = sum(len(c) for c in retry[retries_left:])
+            logger.warning(
+                "Triage retry budget exhausted; %s message(s) left for the next run",
+                dropped,
+            )
+            retry = retry[:retries_left]
+        retries_left -= len(retry)
+        attempt += 1
+        if retry:
+            logger.info(
+                "Retrying triage for %s message(s) in %s sub-chunk(s) (round %s)",
+                sum(len(c) for c in retry),
+                len(retry),
+                attempt,
+            )
+        pending = retry
+
+    if errors and not triage_map:
+        raise errors[0]
+    return triage_map
+
+
+def _triage_with_cascade(
+    runner_cascade: StructuredLLMRunner,
+    runner_triage: StructuredLLMRunner,
+    entries: List[Dict[str, Any]],
+    triage_cfg,
+    threshold: float,
+    store: StateStore,
+    account_email: str,
+    run_id: Optional[str] = None,
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Any]]:
+    """Triage with the cheap cascade model, escalating what it is unsure about.
+
+    Decisions with confidence >= `threshold` and no reply needed are kept and
+    recorded; everything else (including messages the cascade model failed on)
+    goes to `runner_triage`. Latency saved is estimated from the triage model's
+    measured per-message time on the escalated messages.
+    """
+
+    started = time.monotonic()
+    try:
+        first = _run_triage_chunks(
+            runner_cascade,
+            _chunk_for_runner(runner_cascade, entries, triage_cfg),
+            store,
+            account_email,
+            run_id=run_id,
+            max_retries=triage_cfg.triage_max_retries,
+            with_confidence=True,
+            record=False,
+        )
+    except Exception as exc:
+        logger.warning("Cascade model failed, escalating every message: %s", exc)
+        first = {}
+    cascade_seconds = time.monotonic() - started
+
+    decisions = {
+        msg_id: d
+        for msg_id, d in first.items()
+        if not d.get("needs_reply") and float(d.get("confidence") or 0) >= threshold
+    }
+    # Only decisions that are applied are recorded; escalated ones are
+    # recorded by the triage model's pass.
+    if decisions:
+        store.record_triage_output(
+            account_email, {"messages": list(decisions.values())}, run_id=run_id
+        )
+    escalate = [e for e in entries if e["id"] not in decisions]
+    escalation_seconds = 0.0
+    if escalate:
+        started = time.monotonic()
+        try:
+            decisions.update(
+                _run_triage_chunks(
+                    runner_triage,
+                    _chunk_for_runner(runner_triage, escalate, triage_cfg),
+                    store,
+                    account_email,
+                    run_id=run_id,
+                    max_retries=triage_cfg.triage_max_retries,
+                )
+            )
+        except Exception as exc:
+            if not decisions:
+                raise
+            logger.error("Escalated triage failed: %s", exc)
+        escalation_seconds = time.monotonic() - started
+
+    saved: Optional[float] = None
+    if escalate and escalation_seconds > 0:
+        per_message = escalation_seconds / len(escalate)
+        saved = per_message * len(entries) - (cascade_seconds + escalation_seconds)
+    logger.info(
+        "Cascade kept %s of %s decision(s) for %s; escalated %s",
+        len(entries) - len(escalate),
+        len(entries),
+        account_email,
+        len(escalate),
+    )
+    stats = {
+        "escalated": len(escalate),
+        "cascade_resolved": len(entries) - len(escalate),
+        "cascade_seconds": round(cascade_seconds, 1),
+        "latency_saved_seconds": round(saved, 1) if saved is not None else None,
+    }
+    return decisions, stats
+
+
+def _category_sync_due(store: StateStore, mailbox: str, ttl_hours: float) -> bool:
+    """True unless the mailbox was synced with the current palette within
+    `ttl_hours` (0 syncs every run)."""
+    synced = store.get_state(mailbox).get("category_sync") or {}
+    if synced.get("hash") != CATEGORY_COLORS_HASH or ttl_hours <= 0:
+        return True
+    try:
+        synced_at = datetime.fromisoformat(synced["synced_utc"])
+    except (KeyError, TypeError, ValueError):
+        return True
+    return utc_now() - synced_at >= timedelta(hours=ttl_hours)
+
+
+def _record_category_sync(
+    store: StateStore, mailbox: str, results: Dict[str, str]
+) -> None:
+    failed = sorted(n for n, a in results.items() if a == "failed")
+    if failed:
+        # Leave the previous record so the next run tries again.
+        logger.warning("Could not sync category colours for %s: %s", mailbox, failed)
+        return
+    state = store.get_state(mailbox)
+    state["category_sync"] = {
+        "hash": CATEGORY_COLORS_HASH,
+        "synced_utc": utc_now().isoformat(),
+        "plan": results,
+    }
+    store.set_state(mailbox, state)
+
+
+def _ensure_category_colors(
+    graph: GraphClient, store: StateStore, mailbox: str, ttl_hours: float
+) -> None:
     """Make sure Outlook master categories carry the desired colours.
 
-    Safe to call repeatedly; only creates/updates mismatched categories.
+    Skipped while the mailbox's last sync used the current CATEGORY_COLORS
+    and is younger than `ttl_hours`; otherwise only mismatched categories
+    are created/updated, in one $batch request.
     """
 
+    if not _category_sync_due(store, mailbox, ttl_hours):
+        return
+    try:
+        results = graph.ensure_master_categories(CATEGORY_COLORS)
+    except Exception as exc:
+        logger.warning("Unable to ensure category colours: %s", exc)
+        return
+    _record_category_sync(store, mailbox, results)
+
+
+async def _aensure_category_colors(
+    graph: AsyncGraphClient, store: StateStore, mailbox: str, ttl_hours: float
+) -> None:
+    if not _category_sync_due(store, mailbox, ttl_hours):
+        return
     try:
-        graph.ensure_master_categories(CATEGORY_COLORS)
+        results = await graph.ensure_master_categories(CATEGORY_COLORS)
     except Exception as exc:
         logger.warning("Unable to ensure category colours: %s", exc)
+        return
+    _record_category_sync(store, mailbox, results)
 
 
 def _tone_prompt() -> str:
@@ -310,13 +844,60 @@ def _tone_prompt() -> str:
     )
 
 
+def _reply_prompt() -> str:
+    return (
+        "You draft email replies for a busy software developer.\n"
+        "You will be given JSON with the message to answer under key 'messages',\n"
+        "including its recent thread, and the tone_profile to write in.\n"
+        "Return JSON only with key draft_reply_body: the reply text (no subject,\n"
+        "no quoted original). Keep it short and follow the style guidelines.\n"
+    )
+
+
+def _draft_replies(
+    runner_reply: StructuredLLMRunner,
+    entries: List[Dict[str, Any]],
+    decisions: Dict[str, Dict[str, Any]],
+) -> Dict[str, str]:
+    """Draft reply bodies with the reply model for entries that need a reply.
+
+    One prompt per message (its thread, sender stats, tone profile and the
+    triage summary), issued concurrently. Returns bodies keyed by message id;
+    messages whose draft failed are logged and left out.
+    """
+    todo = [e for e in entries if (decisions.get(e["id"]) or {}).get("needs_reply")]
+    if not todo:
+        return {}
+    schema = Path(__file__).parent / "json_schemas" / "reply_draft.schema.json"
+    budget = runner_reply.client.definition.context_budget_tokens
+    base = _reply_prompt() + "\n\nINPUT JSON:\n"
+    prompts = []
+    for entry in todo:
+        msg = {k: v for k, v in entry.items() if k != "tone_profile"}
+        msg["triage_summary"] = decisions[entry["id"]].get("summary")
+        doc = {"tone_profile": entry.get("tone_profile") or {}, "messages": [msg]}
+        if budget > 0:
+            doc = _fit_prompt_budget(doc, _estimate_tokens(base), budget)
+        prompts.append(base + _encode_prompt_json(doc))
+
+    bodies: Dict[str, str] = {}
+    for entry, res in zip(todo, _issue_prompts(runner_reply, prompts, schema)):
+        if isinstance(res, Exception):
+            logger.error("Reply draft failed for %s: %s", entry["id"], res)
+            continue
+        body = str(res.get("draft_reply_body") or "").strip()
+        if body:
+            bodies[entry["id"]] = body
+    logger.info("Drafted %s of %s reply body(ies)", len(bodies), len(todo))
+    return bodies
+
+
 def _apply_triage_to_message(
     original: Dict[str, Any],
     triage: Dict[str, Any],
     draft_replies: bool,
     create_tasks: bool,
     priority_read_state: Dict[str, bool],
-    graph: GraphClient,
 ) -> Tuple[
     Dict[str, Any],
     Optional[Dict[str, Any]],
@@ -330,7 +911,7 @@ def _apply_triage_to_message(
       patch_body: fields to update on the message
       info_entry: optional informational summary row
       task_entry: optional task entry
-      draft_id: id of any created draft reply
+      draft_html: body of the draft reply to create, if any
       before_state: snapshot for rollback ledger
     """
     existing_categories: List[str] = list(original.get("categories") or [])
@@ -408,12 +989,11 @@ def _apply_triage_to_message(
             "webLink": original.get("webLink"),
         }
 
-    draft_id: Optional[str] = None
+    draft_html: Optional[str] = None
     if draft_replies and needs_reply and triage.get("draft_reply_body"):
-        html = (
+        draft_html = (
             "<p>" + "<br>".join(str(triage["draft_reply_body"]).splitlines()) + "</p>"
         )
-        draft_id = graph.create_draft_reply(original["id"], html)
 
     before_state = {
         "categories": existing_categories,
@@ -421,7 +1001,7 @@ def _apply_triage_to_message(
         "flag": original.get("flag"),
     }
 
-    return patch_body, info_entry, task_entry, draft_id, before_state
+    return patch_body, info_entry, task_entry, draft_html, before_state
 
 
 def _write_tasks_file(account_dir: Path, tasks: List[Dict[str, Any]]) -> Path:
@@ -469,79 +1049,239 @@ def _summary_email_html(infos: List[Dict[str, Any]], account_email: str) -> str:
     return f"<p>Informational email summary for <strong>{account_email}</strong>.</p><ul>{''.join(rows)}</ul>"
 
 
-def _get_graph(
-    config: AppConfig, account: AccountConfig, run_id: Optional[str] = None
+def _retry_policy(config: AppConfig) -> RetryPolicy:
+    gcfg = config.graph
+    return RetryPolicy(
+        max_retries=gcfg.max_retries,
+        backoff_base_seconds=gcfg.backoff_base_seconds,
+        backoff_max_seconds=gcfg.backoff_max_seconds,
+        max_retry_after_seconds=gcfg.max_retry_after_seconds,
+    )
+
+
+def _graph_client(
+    config: AppConfig,
+    access_token: str,
+    user: str,
+    mailbox: str,
+    token_provider: Optional[TokenProvider] = None,
 ) -> GraphClient:
-    """Construct an authenticated GraphClient respecting auth mode and account overrides."""
+    """Build a GraphClient wired to the configured retry policy and mailbox limiter."""
+    gcfg = config.graph
+    return GraphClient(
+        access_token,
+        user=user,
+        retry_policy=_retry_policy(config),
+        rate_limiter=mailbox_bucket(
+            mailbox, gcfg.mailbox_requests_per_second, gcfg.mailbox_burst
+        ),
+        token_provider=token_provider,
+        token_refresh_margin_seconds=config.auth.token_refresh_margin_seconds,
+        message_cache=_message_cache(config, mailbox),
+    )
+
+
+def _message_cache(config: AppConfig, mailbox: str) -> MessageCache:
+    return MessageCache(
+        open_store(config.repo_root), mailbox, config.graph.message_cache_days
+    )
+
+
+def _token_provider(config: AppConfig, account: AccountConfig) -> TokenProvider:
+    """Token callback for Graph clients: renews through the credential manager
+    near expiry, or unconditionally when Graph returned 401."""
     azure = config.azure_for_account(account)
-    tenant_id = azure.tenant_id
-    cache_path = Path(config.auth.token_cache_path)
-    if config.auth.auth_mode == "delegated":
-        app = build_public_client(azure, cache_path, tenant_id=tenant_id)
-        token = acquire_delegated_token(app, azure.delegated_scopes, account.email)
-        if not token:
-            raise RuntimeError(f"Delegated auth failed for {account.email}")
-        record_login_event(
-            config.repo_root, account.email, "delegated", tenant_id, run_id
-        )
-        return GraphClient(token["access_token"], user="me")
-    if config.auth.auth_mode == "application":
-        app = build_confidential_client(azure, cache_path, tenant_id=tenant_id)
-        token = acquire_application_token(app)
-        if not token:
-            raise RuntimeError("Application auth failed")
-        # app-only tokens cannot use /me, use /users/{upn}
-        record_login_event(
-            config.repo_root, account.email, "application", tenant_id, run_id
+
+    def provide(force_refresh: bool) -> Tuple[str, float]:
+        token = credential_manager().token(
+            config.auth.auth_mode,
+            azure,
+            Path(config.auth.token_cache_path),
+            account.email,
+            refresh_margin_seconds=config.auth.token_refresh_margin_seconds,
+            force_refresh=force_refresh,
         )
-        return GraphClient(token["access_token"], user=account.email)
-    raise RuntimeError(f"Unknown auth_mode: {config.auth.auth_mode}")
+        return token.token, token.expires_at
 
+    return provide
 
-def _safe_account_name(email: str) -> str:
-    return email.replace("@", "_at_").replace("/", "_")
 
+def _graph_token(
+    config: AppConfig, account: AccountConfig, run_id: Optional[str] = None
+) -> Tuple[str, str]:
+    """Graph access token for `account` from the shared credential manager;
+    returns `(token, user)`.
 
-def _ledger_paths(
-    repo_root: Path, run_id: str, account_email: str
-) -> tuple[Path, Path]:
-    ledger_dir = run_ledger_dir(repo_root / "ledger")
-    ledger_path = ledger_dir / f"{_safe_account_name(account_email)}_{run_id}.json"
-    index_path = ledger_dir / "index.json"
-    return ledger_path, index_path
+    `user` is "me" for delegated auth; app-only tokens cannot use /me, so
+    application auth addresses the mailbox as /users/{upn}.
+    """
+    auth_mode = config.auth.auth_mode
+    token, _ = _token_provider(config, account)(False)
+    record_login_event(
+        config.repo_root,
+        account.email,
+        auth_mode,
+        config.azure_for_account(account).tenant_id,
+        run_id,
+    )
+    return token, ("me" if auth_mode == "delegated" else account.email)
 
 
-def _write_ledger(
-    repo_root: Path,
-    account_email: str,
-    actions: List[Dict[str, Any]],
-    run_id: Optional[str] = None,
-) -> str:
-    run_id = run_id or uuid.uuid4().hex[:12]
-    ledger_path, index_path = _ledger_paths(repo_root, run_id, account_email)
-    entry = {
-        "run_id": run_id,
-        "account": account_email,
-        "timestamp": utc_now().isoformat(),
-        "actions": actions,
-    }
-    save_json(ledger_path, entry)
+def _get_graph(
+    config: AppConfig, account: AccountConfig, run_id: Optional[str] = None
+) -> GraphClient:
+    """Construct an authenticated GraphClient respecting auth mode and account overrides.
 
-    index = load_json(index_path, {"order": [], "runs": {}})
-    if run_id not in index.get("runs", {}):
-        index["order"].append(run_id)
-    index["runs"][run_id] = {"timestamp": entry["timestamp"]}
-    save_json(index_path, index)
-    return run_id
+    The client renews its token mid-run, so long runs survive token expiry.
+    """
+    access_token, user = _graph_token(config, account, run_id)
+    return _graph_client(
+        config,
+        access_token,
+        user,
+        account.email,
+        token_provider=_token_provider(config, account),
+    )
 
 
-def _load_ledger(
-    repo_root: Path, account_email: str, run_id: str
-) -> Optional[Dict[str, Any]]:
-    ledger_path, _ = _ledger_paths(repo_root, run_id, account_email)
-    if not ledger_path.exists():
-        return None
-    return load_json(ledger_path, None)
+def _get_async_graph(
+    config: AppConfig, account: AccountConfig, run_id: Optional[str] = None
+) -> AsyncGraphClient:
+    """Authenticated AsyncGraphClient sharing the sync client's retry policy
+    and per-mailbox limiter."""
+    access_token, user = _graph_token(config, account, run_id)
+    gcfg = config.graph
+    return AsyncGraphClient(
+        access_token,
+        user=user,
+        retry_policy=_retry_policy(config),
+        rate_limiter=mailbox_bucket(
+            account.email, gcfg.mailbox_requests_per_second, gcfg.mailbox_burst
+        ),
+        max_connections=gcfg.async_max_connections,
+        http2=gcfg.http2,
+        token_provider=_token_provider(config, account),
+        token_refresh_margin_seconds=config.auth.token_refresh_margin_seconds,
+        message_cache=_message_cache(config, account.email),
+    )
+
+
+def _delta_link_expired(exc: Exception, delta_link: Optional[str]) -> bool:
+    """True when Graph rejected a stored deltaLink (400/404/410).
+
+    Works for both `requests` and `httpx` status errors.
+    """
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    if not delta_link or status not in {400, 404, 410}:
+        return False
+    logger.warning(
+        "Inbox delta link rejected (status=%s); restarting delta sync", status
+    )
+    return True
+
+
+def _next_delta_link(
+    state: Dict[str, Any],
+    delta_link: Optional[str],
+    new_link: Optional[str],
+    triage_cfg,
+) -> Optional[str]:
+    """The deltaLink to store once the run's messages are settled, if any."""
+    if not new_link and delta_link:
+        logger.info(
+            "More than %s unprocessed messages in delta; keeping previous delta link",
+            triage_cfg.max_messages_per_run,
+        )
+    if delta_link is None:
+        # Graph rejected the stored link; never replay it.
+        state.pop("inbox_delta_link", None)
+    return new_link
+
+
+def _store_delta_link(
+    state: Dict[str, Any], new_link: Optional[str], unsettled: List[str]
+) -> None:
+    """Advance the deltaLink only when every listed message was settled.
+
+    A message is unsettled when triage gave up on it or its patch failed.
+    Keeping the previous link makes the next run replay the same delta, in
+    which the messages that were patched `Processed` are dropped again.
+    """
+    if not new_link:
+        return
+    if unsettled:
+        logger.warning(
+            "%s message(s) were not triaged and patched; keeping previous delta "
+            "link so they are fetched again next run",
+            len(unsettled),
+        )
+        return
+    state["inbox_delta_link"] = new_link
+
+
+def _list_inbox_delta(
+    graph: GraphClient,
+    state: Dict[str, Any],
+    triage_cfg,
+    include_headers: bool = False,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Fetch unprocessed Inbox messages via Graph delta sync.
+
+    The deltaLink lives in the account state under `inbox_delta_link`; without one
+    (first run, or after Graph expired the sync state) the initial lookback
+    window seeds a fresh delta. Returns the messages and the deltaLink to
+    store with `_store_delta_link` once they are settled; the caller persists
+    `state` at the end of the run, so a crash before then replays the same
+    delta next time.
+    """
+    delta_link = state.get("inbox_delta_link")
+    try:
+        msgs, new_link = graph.list_inbox_delta(
+            delta_link,
+            triage_cfg.lookback_days_initial,
+            max_messages=triage_cfg.max_messages_per_run,
+            include_headers=include_headers,
+        )
+    except requests.HTTPError as exc:
+        if not _delta_link_expired(exc, delta_link):
+            raise
+        delta_link = None
+        msgs, new_link = graph.list_inbox_delta(
+            None,
+            triage_cfg.lookback_days_initial,
+            max_messages=triage_cfg.max_messages_per_run,
+            include_headers=include_headers,
+        )
+    return msgs, _next_delta_link(state, delta_link, new_link, triage_cfg)
+
+
+async def _alist_inbox_delta(
+    graph: AsyncGraphClient,
+    state: Dict[str, Any],
+    triage_cfg,
+    include_headers: bool = False,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """`_list_inbox_delta` for the async Graph client."""
+    delta_link = state.get("inbox_delta_link")
+    try:
+        msgs, new_link = await graph.list_inbox_delta(
+            delta_link,
+            triage_cfg.lookback_days_initial,
+            max_messages=triage_cfg.max_messages_per_run,
+            include_headers=include_headers,
+        )
+    except Exception as exc:
+        if not _delta_link_expired(exc, delta_link):
+            raise
+        delta_link = None
+        msgs, new_link = await graph.list_inbox_delta(
+            None,
+            triage_cfg.lookback_days_initial,
+            max_messages=triage_cfg.max_messages_per_run,
+            include_headers=include_headers,
+        )
+    return msgs, _next_delta_link(state, delta_link, new_link, triage_cfg)
 
 
 def rollback_run(
@@ -552,14 +1292,15 @@ def rollback_run(
     delete drafts created during the run.
     """
     results = {"run_id": run_id, "accounts": []}
+    store = open_store(config.repo_root)
     for account in accounts:
-        ledger = _load_ledger(config.repo_root, account.email, run_id)
+        ledger = store.load_ledger(run_id, account.email)
         if not ledger:
             continue
         graph = _get_graph(config, account)
         actions = list(reversed(ledger.get("actions", [])))
-        restored = 0
         drafts_deleted = 0
+        restore_patches: Dict[str, Dict[str, Any]] = {}
         for act in actions:
             if act.get("type") == "message_patch":
                 before = act.get("before") or {}
@@ -574,8 +1315,9 @@ def rollback_run(
                 if "flag" in before:
                     patch["flag"] = before["flag"]
                 if patch:
-                    graph.update_message(msg_id, patch)
-                    restored += 1
+                    # Actions are walked newest-first, so the oldest "before"
+                    # snapshot for a message wins, matching serial replay.
+                    restore_patches[msg_id] = patch
             elif act.get("type") == "draft_created":
                 draft_id = act.get("draft_id")
                 if draft_id:
@@ -598,6 +1340,16 @@ def rollback_run(
                             "Failed to rollback tasks file %s: %s", path, exc
                         )
 
+        statuses = graph.update_messages(restore_patches)
+        restored = sum(1 for status in statuses.values() if 200 <= status < 300)
+        if restored < len(restore_patches):
+            logger.warning(
+                "Rollback restored %s of %s messages for %s",
+                restored,
+                len(restore_patches),
+                account.email,
+            )
+
         results["accounts"].append(
             {
                 "account": account.email,
@@ -638,14 +1390,62 @@ def init_account(
     runner_reply: StructuredLLMRunner,
     run_id: Optional[str] = None,
 ) -> Dict[str, Any]:
-    state_root = account_state_dir(Path("./data"), account.email)
-
     triage_cfg = config.triage_for_account(account)
     graph = _get_graph(config, account, run_id=run_id)
-
+    # Both listings are streamed page by page into the stats / tone samples.
     inbox = graph.list_inbox_messages_since(
         triage_cfg.lookback_days_initial, max_messages=1000
     )
+    sent = graph.list_sent_messages_since(
+        triage_cfg.tone_profile_lookback_days, max_messages=800
+    )
+    return _init_from_messages(config, account, runner_reply, inbox, sent)
+
+
+async def ainit_account(
+    config: AppConfig,
+    account: AccountConfig,
+    runner_reply: StructuredLLMRunner,
+    run_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """`init_account` over the async Graph client; Inbox and Sent Items are
+    read concurrently."""
+    triage_cfg = config.triage_for_account(account)
+    async with _get_async_graph(config, account, run_id=run_id) as graph:
+
+        async def _collect(items: Any) -> List[Dict[str, Any]]:
+            return [m async for m in items]
+
+        inbox, sent = await asyncio.gather(
+            _collect(
+                graph.list_inbox_messages_since(
+                    triage_cfg.lookback_days_initial, max_messages=1000
+                )
+            ),
+            _collect(
+                graph.list_sent_messages_since(
+                    triage_cfg.tone_profile_lookback_days, max_messages=800
+                )
+            ),
+        )
+    return await _in_account_thread(
+        _init_from_messages, config, account, runner_reply, inbox, sent
+    )
+
+
+def _init_from_messages(
+    config: AppConfig,
+    account: AccountConfig,
+    runner_reply: StructuredLLMRunner,
+    inbox: Iterable[Dict[str, Any]],
+    sent: Iterable[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Build sender stats and tone profiles from Inbox / Sent Items.
+
+    Both are consumed once, as they stream in; only the counts and the few
+    sent messages used as tone samples are kept.
+    """
+    store = open_store(config.repo_root)
     domain = account.email.split("@")[-1].lower()
     sender_stats: Dict[str, Any] = {}
     for msg in inbox:
@@ -662,24 +1462,29 @@ def init_account(
         }
         entry["count"] += 1
         sender_stats[addr] = entry
-    save_json(state_root / "sender_stats.json", sender_stats)
+    store.replace_sender_stats(account.email, sender_stats)
 
     # tone profiles from sent items
-    sent = graph.list_sent_messages_since(
-        triage_cfg.tone_profile_lookback_days, max_messages=800
-    )
     account_addr = account.email.lower()
-    recip_map: Dict[str, List[Dict[str, Any]]] = {}
+    recip_counts: Dict[str, int] = {}
+    recip_samples: Dict[str, List[Dict[str, Any]]] = {}
+    default_samples: List[Dict[str, Any]] = []
     for m in sent:
+        if len(default_samples) < 20:
+            default_samples.append(m)
         recips = (m.get("toRecipients") or []) + (m.get("ccRecipients") or [])
         for r in recips:
             ed = r.get("emailAddress") or {}
             addr = (ed.get("address") or "").lower()
             if not addr or addr == account_addr:
                 continue
-            recip_map.setdefault(addr, []).append(m)
+            recip_counts[addr] = recip_counts.get(addr, 0) + 1
+            kept = recip_samples.setdefault(addr, [])
+            if len(kept) < 5:
+                kept.append(m)
 
-    top = sorted(recip_map.items(), key=lambda kv: len(kv[1]), reverse=True)[:10]
+    busiest = sorted(recip_counts.items(), key=lambda kv: kv[1], reverse=True)[:10]
+    top = [(addr, recip_samples[addr]) for addr, _ in busiest]
     tone_profiles: Dict[str, Any] = {"contacts": {}, "default": {}}
     schema = Path(__file__).parent / "json_schemas" / "tone_profile.schema.json"
 
@@ -692,36 +1497,42 @@ def init_account(
             )
         return "\n\n".join(parts)
 
-    for addr, msgs in top:
-        prompt = (
+    # One job per top contact plus the default profile; they are independent,
+    # so run them concurrently up to the reply model's max_concurrency.
+    jobs: List[Tuple[Optional[str], str]] = [
+        (
+            addr,
             _tone_prompt()
             + "\n\n"
-            + f"Contact email: {addr}\n\nExamples:\n{samples(msgs)}"
+            + f"Contact email: {addr}\n\nExamples:\n{samples(msgs)}",
         )
-        out_path = state_root / f"tone_{addr.replace('@','_at_')}.json"
-        try:
-            res = runner_reply.run_with_schema(prompt, schema, out_path)
-            tone_profiles["contacts"][addr] = res
-        except Exception as exc:
-            logger.warning("Tone profile failed for %s: %s", addr, exc)
+        for addr, msgs in top
+    ]
+    jobs.append(
+        (None, _tone_prompt() + "\n\nExamples:\n" + samples(default_samples, n=20))
+    )
 
-    # default profile
-    prompt = _tone_prompt() + "\n\nExamples:\n" + samples(sent[:20], n=20)
-    out_path = state_root / "tone_default.json"
-    try:
-        res = runner_reply.run_with_schema(prompt, schema, out_path)
-        res["contact_email"] = "default"
-        tone_profiles["default"] = res
-    except Exception as exc:
-        logger.warning("Default tone profile failed: %s", exc)
+    # hf-local generates these in padded batches; other providers fan out
+    # concurrently up to the reply model's max_concurrency.
+    outputs = runner_reply.run_batch_with_schema([prompt for _, prompt in jobs], schema)
+    for (addr, _), res in zip(jobs, outputs):
+        if isinstance(res, Exception):
+            if addr:
+                logger.warning("Tone profile failed for %s: %s", addr, res)
+            else:
+                logger.warning("Default tone profile failed: %s", res)
+            continue
+        if addr:
+            tone_profiles["contacts"][addr] = res
+        else:
+            res["contact_email"] = "default"
+            tone_profiles["default"] = res
 
-    save_json(state_root / "tone_profiles.json", tone_profiles)
+    store.replace_tone_profiles(account.email, tone_profiles)
 
-    state = load_json(
-        state_root / "state.json", {"first_run_completed": False, "last_run_utc": None}
-    )
+    state = store.get_state(account.email)
     state["first_run_completed"] = True
-    save_json(state_root / "state.json", state)
+    store.set_state(account.email, state)
 
     return {
         "account": account.email,
@@ -730,174 +1541,535 @@ def init_account(
     }
 
 
+async def _in_account_thread(fn: Callable[..., Any], *args: Any) -> Any:
+    """Run blocking `fn` off the event loop on a thread named after the
+    caller's, so per-account log filters still see its records."""
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix=threading.current_thread().name
+    ) as pool:
+        return await loop.run_in_executor(pool, functools.partial(fn, *args))
+
+
+class _AccountRun:
+    """One `run` of one account, shared by the sync and async drivers.
+
+    The drivers own the Graph client and schedule the stages; this holds the
+    rest (payload building, classification, patch planning, ledger and the
+    final bookkeeping) so both paths behave the same.
+    """
+
+    def __init__(
+        self,
+        config: AppConfig,
+        account: AccountConfig,
+        runner_triage: StructuredLLMRunner,
+        runner_reply: StructuredLLMRunner,
+        runner_cascade: Optional[StructuredLLMRunner],
+        run_id: Optional[str],
+    ) -> None:
+        self.config = config
+        self.account = account
+        self.runner_triage = runner_triage
+        self.runner_reply = runner_reply
+        self.runner_cascade = runner_cascade
+        # Patches are ledgered page by page, so every page shares one run id.
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.state_root = account_state_dir(Path("./data"), account.email)
+        self.store = open_store(config.repo_root)
+        self.state = self.store.get_state(account.email)
+        self.triage_cfg = config.triage_for_account(account)
+        self.include_headers = (
+            config.pre_triage.enabled and config.pre_triage.use_list_unsubscribe
+        )
+        self.thread_limit = (
+            self.triage_cfg.thread_max_messages
+            if self.triage_cfg.thread_max_messages > 0
+            else 1000
+        )
+        # Simplified thread context per conversation, reused by later pages.
+        self.thread_context: Dict[str, Dict[str, Any]] = {}
+        self.totals: Dict[str, Any] = {
+            "processed": 0,
+            "pre_triaged": 0,
+            "escalated": 0,
+            "latency_saved_seconds": None,
+            "patch_failures": 0,
+            "patches": 0,
+            "drafts": 0,
+        }
+        self.triage_map: Dict[str, Dict[str, Any]] = {}
+        self.logged: List[Dict[str, Any]] = []
+        self.infos: List[Dict[str, Any]] = []
+        self.tasks: List[Dict[str, Any]] = []
+        self.ledger_actions: List[Dict[str, Any]] = []
+        self.ledgered = 0
+        # Delta sync: the link to store at the end, and the ids of messages
+        # that got no decision or whose patch failed.
+        self.next_delta_link: Optional[str] = None
+        self.unsettled: List[str] = []
+
+    @property
+    def needs_init(self) -> bool:
+        return not self.state.get("first_run_completed")
+
+    @property
+    def days_back(self) -> int:
+        if self.state.get("last_run_utc"):
+            return self.triage_cfg.lookback_days_incremental
+        return self.triage_cfg.lookback_days_initial
+
+    @property
+    def delta_sync(self) -> bool:
+        return self.triage_cfg.inbox_sync_mode.lower() == "delta"
+
+    def begin(self) -> None:
+        """Load per-account context once the account is initialised."""
+        self.state = self.store.get_state(self.account.email)
+        self.sender_stats = self.store.get_sender_stats(self.account.email)
+        self.tone_profiles = self.store.get_tone_profiles(self.account.email)
+        self.tone_contacts = list((self.tone_profiles.get("contacts") or {}).keys())
+        # Reuse decisions for payload entries that were already triaged (e.g.
+        # a previous run crashed before its patches landed).
+        self.cache = TriageCache(
+            self.store,
+            self.account.email,
+            self.triage_cfg.triage_cache_ttl_hours,
+            self.triage_cfg.triage_cache_max_entries,
+        )
+        self.model_name = self.runner_triage.client.definition.model
+        if self.runner_cascade is not None:
+            cascade_model = self.runner_cascade.client.definition.model
+            self.model_name = f"{cascade_model}>{self.model_name}"
+
+    def missing_conversations(self, page: List[Dict[str, Any]]) -> List[str]:
+        return [
+            m["conversationId"]
+            for m in page
+            if m.get("conversationId")
+            and m["conversationId"] not in self.thread_context
+        ]
+
+    def prepare(
+        self,
+        page: List[Dict[str, Any]],
+        fetched: Dict[str, List[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """Stage 1: payload entries, local and cached decisions for a page.
+
+        `fetched` holds the threads of `missing_conversations(page)`.
+        """
+        email = self.account.email
+        for conv, thread in fetched.items():
+            self.thread_context[conv] = {
+                "thread_summary": _simplify_thread(thread, email),
+                "has_user_replied": _has_user_replied(thread, email),
+                "last_from_me": _last_message_from_me(thread, email),
+            }
+
+        entries = []
+        for m in page:
+            fd = (m.get("from") or {}).get("emailAddress") or {}
+            sender_addr = (fd.get("address") or "").lower()
+            ctx = self.thread_context.get(m.get("conversationId") or "") or {}
+            body_html = (m.get("uniqueBody") or {}).get("content") or ""
+            entries.append(
+                {
+                    "id": m["id"],
+                    "subject": m.get("subject"),
+                    "from": {"address": sender_addr, "name": fd.get("name")},
+                    "receivedDateTime": m.get("receivedDateTime"),
+                    "categories": m.get("categories", []),
+                    "importance": m.get("importance"),
+                    "webLink": m.get("webLink"),
+                    "body": _prepare_body(body_html, self.triage_cfg),
+                    "thread_summary": ctx.get("thread_summary", []),
+                    "has_user_replied_in_thread": ctx.get("has_user_replied", False),
+                    "last_message_from_me_in_thread": ctx.get("last_from_me", False),
+                    "sender_stats": self.sender_stats.get(sender_addr, {}),
+                    "tone_profile": _tone_profile_for_sender(
+                        self.tone_profiles, sender_addr
+                    ),
+                }
+            )
+
+        # Obvious bulk/automated mail is decided locally; only the rest is
+        # sent to the triage model.
+        pre_decided, entries = pre_triage(
+            page,
+            entries,
+            self.config.pre_triage,
+            account_email=email,
+            tone_contacts=self.tone_contacts,
+        )
+        fingerprints = {
+            p["id"]: triage_fingerprint(p, TRIAGE_PROMPT_VERSION, self.model_name)
+            for p in entries
+        }
+        decisions: Dict[str, Dict[str, Any]] = dict(pre_decided)
+        for p in entries:
+            cached = self.cache.get(fingerprints[p["id"]])
+            if cached:
+                decisions[p["id"]] = dict(cached, id=p["id"])
+        uncached = [p for p in entries if p["id"] not in decisions]
+        if len(uncached) < len(entries):
+            logger.info(
+                "Reusing %s cached triage decision(s) for %s",
+                len(entries) - len(uncached),
+                email,
+            )
+        self.totals["processed"] += len(page)
+        self.totals["pre_triaged"] += len(pre_decided)
+        return {
+            "messages": page,
+            "entries": entries,
+            "uncached": uncached,
+            "fingerprints": fingerprints,
+            "decisions": decisions,
+        }
+
+    def classify(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        """Stage 2: triage the page's uncached entries, then draft replies."""
+        triage_cfg = self.triage_cfg
+        uncached = batch["uncached"]
+        if uncached:
+            if self.runner_cascade is not None:
+                fresh, stats = _triage_with_cascade(
+                    self.runner_cascade,
+                    self.runner_triage,
+                    uncached,
+                    triage_cfg,
+                    self.config.llm.cascade_confidence_threshold,
+                    self.store,
+                    self.account.email,
+                    run_id=self.run_id,
+                )
+                self.totals["escalated"] += stats["escalated"]
+                if stats["latency_saved_seconds"] is not None:
+                    self.totals["latency_saved_seconds"] = round(
+                        (self.totals["latency_saved_seconds"] or 0.0)
+                        + stats["latency_saved_seconds"],
+                        1,
+                    )
+            else:
+                fresh = _run_triage_chunks(
+                    self.runner_triage,
+                    _chunk_for_runner(self.runner_triage, uncached, triage_cfg),
+                    self.store,
+                    self.account.email,
+                    run_id=self.run_id,
+                    max_retries=triage_cfg.triage_max_retries,
+                )
+            for msg_id, decision in fresh.items():
+                if msg_id in batch["fingerprints"]:
+                    self.cache.put(batch["fingerprints"][msg_id], decision)
+            batch["decisions"].update(fresh)
+            self.cache.save()
+
+        # Classification leaves drafting out; only messages that need a reply
+        # go to the reply model, each with its own thread and tone profile.
+        batch["drafts"] = (
+            _draft_replies(self.runner_reply, batch["entries"], batch["decisions"])
+            if triage_cfg.draft_replies
+            else {}
+        )
+        return batch
+
+    def plan(
+        self, batch: Dict[str, Any]
+    ) -> Tuple[Dict[str, Dict[str, Any]], List[Dict[str, Any]], Dict[str, str]]:
+        """Stage 3a: patches, ledger actions and draft bodies for a page."""
+        triage_cfg = self.triage_cfg
+        patches: Dict[str, Dict[str, Any]] = {}
+        actions: List[Dict[str, Any]] = []
+        drafts: Dict[str, str] = {}
+        for m in batch["messages"]:
+            self.logged.append({"id": m["id"], "subject": m.get("subject")})
+            t = batch["decisions"].get(m["id"])
+            if not t:
+                self.unsettled.append(m["id"])
+                continue
+            self.triage_map[m["id"]] = t
+            if m["id"] in batch["drafts"]:
+                t = dict(t, draft_reply_body=batch["drafts"][m["id"]])
+            patch, info, task, draft_html, before_state = _apply_triage_to_message(
+                m,
+                t,
+                triage_cfg.draft_replies,
+                triage_cfg.create_tasks,
+                triage_cfg.priority_read_state,
+            )
+            actions.append(
+                {
+                    "type": "message_patch",
+                    "message_id": m["id"],
+                    "before": before_state,
+                    "patch": patch,
+                }
+            )
+            patches[m["id"]] = patch
+            if info:
+                self.infos.append(info)
+            if task:
+                self.tasks.append(task)
+            if draft_html:
+                drafts[m["id"]] = draft_html
+        return patches, actions, drafts
+
+    def record(
+        self,
+        actions: List[Dict[str, Any]],
+        statuses: Dict[str, int],
+        draft_ids: Dict[str, Optional[str]],
+    ) -> None:
+        """Stage 3b: record patch statuses and drafts, then append them to the
+        ledger so a failure on a later page can still be rolled back."""
+        for act in actions:
+            act["status"] = statuses.get(act["message_id"], 0)
+            if not 200 <= act["status"] < 300:
+                self.totals["patch_failures"] += 1
+                self.unsettled.append(act["message_id"])
+        self.totals["patches"] += len(actions)
+        for msg_id, draft_id in draft_ids.items():
+            if draft_id:
+                self.totals["drafts"] += 1
+                actions.append(
+                    {"type": "draft_created", "draft_id": draft_id, "message_id": msg_id}
+                )
+        self.ledger_actions.extend(actions)
+        self.flush_ledger()
+
+    def summary_target(self) -> Optional[AccountConfig]:
+        """Account to send the informational digest from, if one is due."""
+        triage_cfg = self.triage_cfg
+        if not (
+            triage_cfg.send_summary_email and self.infos and triage_cfg.summary_email_to
+        ):
+            return None
+        # Send from the mailbox specified in config (must be configured), even
+        # when this run is for another mailbox.
+        from_acc = triage_cfg.summary_email_from_account or self.account.email
+        return next(
+            (a for a in self.config.accounts if a.email.lower() == from_acc.lower()),
+            None,
+        )
+
+    def summary_mail(self) -> Dict[str, Any]:
+        return {
+            "subject": f"Informational email summary for {self.account.label}",
+            "html_body": _summary_email_html(self.infos, self.account.email),
+            "to_address": self.triage_cfg.summary_email_to,
+        }
+
+    def write_outputs(self) -> None:
+        """Tasks file, triage log and the final ledger."""
+        if self.triage_cfg.create_tasks and self.tasks:
+            tasks_path = self.state_root / "tasks.md"
+            prev_size = tasks_path.stat().st_size if tasks_path.exists() else 0
+            written_path = _write_tasks_file(self.state_root, self.tasks)
+            self.ledger_actions.append(
+                {
+                    "type": "tasks_file_append",
+                    "path": str(written_path),
+                    "previous_size": prev_size,
+                }
+            )
+        if self.triage_cfg.log_to_file:
+            _write_log_file(self.state_root, self.logged, self.triage_map)
+        self.flush_ledger()
+
+    def flush_ledger(self) -> None:
+        """Append the actions not yet in the run's ledger."""
+        new = self.ledger_actions[self.ledgered :]
+        if new:
+            self.store.append_ledger(
+                self.run_id, self.account.email, utc_now().isoformat(), new
+            )
+            self.ledgered = len(self.ledger_actions)
+
+    def finish(self, summary_sent: bool, graph_stats: Dict[str, Any]) -> Dict[str, Any]:
+        email = self.account.email
+        _store_delta_link(self.state, self.next_delta_link, self.unsettled)
+        self.state["last_run_utc"] = utc_now().isoformat()
+        self.store.set_state(email, self.state)
+        if not self.totals["processed"]:
+            return {"account": email, "processed": 0}
+
+        patch_failures = self.totals["patch_failures"]
+        if patch_failures:
+            logger.warning(
+                "%s of %s message patches failed for %s",
+                patch_failures,
+                self.totals["patches"],
+                email,
+            )
+        logger.info(
+            "Graph retries for %s: %s (throttled=%s, slept %.1fs)",
+            email,
+            graph_stats["retries"],
+            graph_stats["throttled"],
+            graph_stats["sleep_seconds"],
+        )
+        return {
+            "account": email,
+            "processed": self.totals["processed"],
+            "pre_triaged": self.totals["pre_triaged"],
+            "escalated": self.totals["escalated"],
+            "latency_saved_seconds": self.totals["latency_saved_seconds"],
+            "patch_failures": patch_failures,
+            "drafts": self.totals["drafts"],
+            "tasks": len(self.tasks),
+            "informational": len(self.infos),
+            "summary_sent": summary_sent,
+            "graph_retries": graph_stats["retries"],
+            "graph_sleep_seconds": graph_stats["sleep_seconds"],
+        }
+
+
 def run_for_account(
     config: AppConfig,
     account: AccountConfig,
     runner_triage: StructuredLLMRunner,
     runner_reply: StructuredLLMRunner,
     run_id: Optional[str] = None,
+    runner_cascade: Optional[StructuredLLMRunner] = None,
 ) -> Dict[str, Any]:
-    state_root = account_state_dir(Path("./data"), account.email)
-    state = load_json(
-        state_root / "state.json", {"first_run_completed": False, "last_run_utc": None}
+    run = _AccountRun(
+        config, account, runner_triage, runner_reply, runner_cascade, run_id
     )
-
-    triage_cfg = config.triage_for_account(account)
     graph = _get_graph(config, account, run_id=run_id)
 
     # Ensure category colours exist before tagging messages so Outlook renders
     # the expected palette for priority / status tags.
-    _ensure_category_colors(graph)
+    _ensure_category_colors(
+        graph, run.store, account.email, config.graph.category_sync_ttl_hours
+    )
 
-    if not state.get("first_run_completed"):
+    if run.needs_init:
         init_account(config, account, runner_reply, run_id=run_id)
-        state = load_json(
-            state_root / "state.json",
-            {"first_run_completed": True, "last_run_utc": None},
+    run.begin()
+
+    pages: Iterable[List[Dict[str, Any]]]
+    if run.delta_sync:
+        msgs, run.next_delta_link = _list_inbox_delta(
+            graph, run.state, run.triage_cfg, include_headers=run.include_headers
+        )
+        pages = [msgs] if msgs else []
+    else:
+        pages = graph.iter_inbox_unprocessed_pages(
+            run.days_back,
+            max_messages=run.triage_cfg.max_messages_per_run,
+            include_headers=run.include_headers,
         )
 
-    days_back = (
-        triage_cfg.lookback_days_incremental
-        if state.get("last_run_utc")
-        else triage_cfg.lookback_days_initial
-    )
-    msgs = graph.list_inbox_unprocessed_messages(
-        days_back, max_messages=triage_cfg.max_messages_per_run
-    )
-    if not msgs:
-        state["last_run_utc"] = utc_now().isoformat()
-        save_json(state_root / "state.json", state)
-        return {"account": account.email, "processed": 0}
-
-    sender_stats = load_json(state_root / "sender_stats.json", {})
-    tone_profiles = load_json(
-        state_root / "tone_profiles.json", {"contacts": {}, "default": {}}
-    )
+    def _load_threads(page: List[Dict[str, Any]]) -> Dict[str, Any]:
+        fetched = graph.list_conversations_messages(
+            run.missing_conversations(page), max_messages=run.thread_limit
+        )
+        return run.prepare(page, fetched)
 
-    payload_msgs = []
-    thread_limit = (
-        triage_cfg.thread_max_messages if triage_cfg.thread_max_messages > 0 else 1000
+    def _apply(batch: Dict[str, Any]) -> None:
+        patches, actions, drafts = run.plan(batch)
+        draft_ids = {
+            msg_id: graph.create_draft_reply(msg_id, html)
+            for msg_id, html in drafts.items()
+        }
+        # Apply the page's patches through Graph $batch (20 per round-trip).
+        run.record(actions, graph.update_messages(patches), draft_ids)
+
+    # Fetching page N+1, loading page N's threads, classifying and patching
+    # overlap; bounded queues keep at most one page waiting between stages.
+    run_pipeline(
+        pages,
+        [("threads", _load_threads), ("classify", run.classify), ("apply", _apply)],
+        source_name="fetch",
     )
-    for m in msgs:
-        fd = (m.get("from") or {}).get("emailAddress") or {}
-        sender_addr = (fd.get("address") or "").lower()
-        conv = m.get("conversationId")
-        thread = (
-            graph.list_conversation_messages(conv, max_messages=thread_limit)
-            if conv
-            else []
-        )
-        body_html = (m.get("uniqueBody") or {}).get("content") or ""
-        body = _prepare_body(body_html, triage_cfg)
-        payload_msgs.append(
-            {
-                "id": m["id"],
-                "subject": m.get("subject"),
-                "from": {"address": sender_addr, "name": fd.get("name")},
-                "receivedDateTime": m.get("receivedDateTime"),
-                "categories": m.get("categories", []),
-                "importance": m.get("importance"),
-                "webLink": m.get("webLink"),
-                "body": body,
-                "thread_summary": _simplify_thread(thread, account.email),
-                "has_user_replied_in_thread": _has_user_replied(thread, account.email),
-                "last_message_from_me_in_thread": _last_message_from_me(
-                    thread, account.email
-                ),
-                "sender_stats": sender_stats.get(sender_addr, {}),
-                "tone_profile": _tone_profile_for_sender(tone_profiles, sender_addr),
-            }
-        )
+    if not run.totals["processed"]:
+        return run.finish(False, graph.stats.as_dict())
 
-    schema = Path(__file__).parent / "json_schemas" / "triage_output.schema.json"
-    out_path = state_root / f"triage_{utc_now().strftime('%Y%m%d-%H%M%S')}.json"
+    run.write_outputs()
+    summary_sent = False
+    sender = run.summary_target()
+    if sender is not None:
+        _get_graph(config, sender, run_id=run_id).send_mail(**run.summary_mail())
+        summary_sent = True
+    return run.finish(summary_sent, graph.stats.as_dict())
 
-    prompt = (
-        _triage_prompt()
-        + "\n\nINPUT JSON:\n"
-        + json.dumps({"messages": payload_msgs}, indent=2)
+
+async def arun_for_account(
+    config: AppConfig,
+    account: AccountConfig,
+    runner_triage: StructuredLLMRunner,
+    runner_reply: StructuredLLMRunner,
+    run_id: Optional[str] = None,
+    runner_cascade: Optional[StructuredLLMRunner] = None,
+) -> Dict[str, Any]:
+    """`run_for_account` over `AsyncGraphClient`.
+
+    The same stages run as tasks on one event loop: Graph paging, thread
+    batches, draft creation and patch batches are awaited concurrently, while
+    the (blocking) classification stage runs on a worker thread.
+    """
+    run = _AccountRun(
+        config, account, runner_triage, runner_reply, runner_cascade, run_id
     )
-    triage_res = runner_triage.run_with_schema(prompt, schema, out_path)
-    results = triage_res.get("messages") or []
-    triage_map = {r["id"]: r for r in results if "id" in r}
-
-    infos = []
-    tasks = []
-    drafts = 0
-    ledger_actions: List[Dict[str, Any]] = []
-    for m in msgs:
-        t = triage_map.get(m["id"])
-        if not t:
-            continue
-        patch, info, task, draft_id, before_state = _apply_triage_to_message(
-            m,
-            t,
-            triage_cfg.draft_replies,
-            triage_cfg.create_tasks,
-            triage_cfg.priority_read_state,
-            graph,
+    async with _get_async_graph(config, account, run_id=run_id) as graph:
+        await _aensure_category_colors(
+            graph, run.store, account.email, config.graph.category_sync_ttl_hours
         )
-        ledger_actions.append(
-            {
-                "type": "message_patch",
-                "message_id": m["id"],
-                "before": before_state,
-                "patch": patch,
-            }
-        )
-        graph.update_message(m["id"], patch)
-        if info:
-            infos.append(info)
-        if task:
-            tasks.append(task)
-        if draft_id:
-            drafts += 1
-            ledger_actions.append(
-                {"type": "draft_created", "draft_id": draft_id, "message_id": m["id"]}
+
+        if run.needs_init:
+            await ainit_account(config, account, runner_reply, run_id=run_id)
+        run.begin()
+
+        if run.delta_sync:
+            msgs, run.next_delta_link = await _alist_inbox_delta(
+                graph, run.state, run.triage_cfg, include_headers=run.include_headers
             )
 
-    if triage_cfg.create_tasks and tasks:
-        tasks_path = state_root / "tasks.md"
-        prev_size = tasks_path.stat().st_size if tasks_path.exists() else 0
-        written_path = _write_tasks_file(state_root, tasks)
-        ledger_actions.append(
-            {
-                "type": "tasks_file_append",
-                "path": str(written_path),
-                "previous_size": prev_size,
-            }
-        )
-    if triage_cfg.log_to_file:
-        _write_log_file(state_root, msgs, triage_map)
-    if ledger_actions:
-        _write_ledger(config.repo_root, account.email, ledger_actions, run_id=run_id)
+            async def _delta_pages() -> AsyncIterator[List[Dict[str, Any]]]:
+                if msgs:
+                    yield msgs
 
-    summary_sent = False
-    if triage_cfg.send_summary_email and infos and triage_cfg.summary_email_to:
-        # Send summary from the mailbox specified in config (must be configured)
-        # If this run is not for that mailbox, we still send from that mailbox by creating a second GraphClient.
-        from_acc = triage_cfg.summary_email_from_account or account.email
-        from_account_obj = next(
-            (a for a in config.accounts if a.email.lower() == from_acc.lower()), None
-        )
-        if from_account_obj:
-            graph_sender = _get_graph(config, from_account_obj, run_id=run_id)
-            html = _summary_email_html(infos, account.email)
-            graph_sender.send_mail(
-                subject=f"Informational email summary for {account.label}",
-                html_body=html,
-                to_address=triage_cfg.summary_email_to,
+            pages: AsyncIterator[List[Dict[str, Any]]] = _delta_pages()
+        else:
+            pages = graph.iter_inbox_unprocessed_pages(
+                run.days_back,
+                max_messages=run.triage_cfg.max_messages_per_run,
+                include_headers=run.include_headers,
             )
-            summary_sent = True
 
-    state["last_run_utc"] = utc_now().isoformat()
-    save_json(state_root / "state.json", state)
+        async def _load_threads(page: List[Dict[str, Any]]) -> Dict[str, Any]:
+            fetched = await graph.list_conversations_messages(
+                run.missing_conversations(page), max_messages=run.thread_limit
+            )
+            return run.prepare(page, fetched)
 
-    return {
-        "account": account.email,
-        "processed": len(msgs),
-        "drafts": drafts,
-        "tasks": len(tasks),
-        "informational": len(infos),
-        "summary_sent": summary_sent,
-    }
+        async def _classify(batch: Dict[str, Any]) -> Dict[str, Any]:
+            return await _in_account_thread(run.classify, batch)
+
+        async def _apply(batch: Dict[str, Any]) -> None:
+            patches, actions, drafts = run.plan(batch)
+            draft_ids, statuses = await asyncio.gather(
+                asyncio.gather(
+                    *(graph.create_draft_reply(m, html) for m, html in drafts.items())
+                ),
+                graph.update_messages(patches),
+            )
+            run.record(actions, statuses, dict(zip(drafts, draft_ids)))
+
+        await arun_pipeline(
+            pages,
+            [("threads", _load_threads), ("classify", _classify), ("apply", _apply)],
+        )
+        if not run.totals["processed"]:
+            return run.finish(False, graph.stats.as_dict())
+
+        run.write_outputs()
+        summary_sent = False
+        sender = run.summary_target()
+        if sender is not None:
+            async with _get_async_graph(config, sender, run_id=run_id) as sender_graph:
+                await sender_graph.send_mail(**run.summary_mail())
+            summary_sent = True
+        return run.finish(summary_sent, graph.stats.as_dict())
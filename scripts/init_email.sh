@@ -21,6 +21,7 @@ Runs initial mailbox setup: connectivity checks, sample polling, and tone/profil
 Options:
   -c, --config PATH     Path to config TOML (default: REPO/config/config.toml)
   -a, --account EMAIL   Target account (may be repeated for multiple)
+  -p, --parallel N      Initialise up to N accounts concurrently (default: 1)
   -v, --verbose         Increase logging verbosity (repeatable)
   -h, --help            Show this help and exit
 EOF
@@ -29,11 +30,13 @@ EOF
 CONFIG="${DEFAULT_CONFIG}"
 VERBOSE=0
 ACCOUNTS=()
+PARALLEL=1
 
 while [[ $# -gt 0 ]]; do
   case "$1" in
     -c|--config) CONFIG="$2"; shift 2 ;;
     -a|--account) ACCOUNTS+=("$2"); shift 2 ;;
+    -p|--parallel) PARALLEL="$2"; shift 2 ;;
     -v|--verbose) VERBOSE=$((VERBOSE+1)); shift ;;
     -h|--help) usage; exit 0 ;;
     *) echo "Unknown argument: $1" >&2; usage; exit 1 ;;
@@ -47,6 +50,7 @@ CMD_ARGS=( -m email_categorise init --config "${CONFIG}" )
 for acc in "${ACCOUNTS[@]}"; do
   CMD_ARGS+=( -a "${acc}" )
 done
+CMD_ARGS+=( --parallel "${PARALLEL}" )
 for ((i=0; i<VERBOSE; i++)); do
   CMD_ARGS+=( -v )
 done
@@ -30,6 +30,7 @@ Options:
       --no-summary-email    Disable summary email
       --log-to-file         Enable per-run log file (default)
       --no-log-to-file      Disable per-run log file
+  -p, --parallel N          Process up to N accounts concurrently (default: 1)
   -v, --verbose             Increase logging verbosity (repeatable)
   -h, --help                Show this help and exit
 EOF
@@ -42,11 +43,13 @@ DRAFT_REPLIES=1
 CREATE_TASKS=1
 SUMMARY_EMAIL=1
 LOG_TO_FILE=1
+PARALLEL=1
 
 while [[ $# -gt 0 ]]; do
   case "$1" in
     -c|--config) CONFIG="$2"; shift 2 ;;
     -a|--account) ACCOUNTS+=("$2"); shift 2 ;;
+    -p|--parallel) PARALLEL="$2"; shift 2 ;;
     --draft-replies) DRAFT_REPLIES=1; shift ;;
     --no-draft-replies) DRAFT_REPLIES=0; shift ;;
     --create-tasks) CREATE_TASKS=1; shift ;;
@@ -69,6 +72,7 @@ CMD_ARGS=( -m email_categorise run --config "${CONFIG}" --run-id "${RUN_ID}" )
 for acc in "${ACCOUNTS[@]}"; do
   CMD_ARGS+=( -a "${acc}" )
 done
+CMD_ARGS+=( --parallel "${PARALLEL}" )
 
 # Feature toggles map to CLI overrides (added in email_categorise.cli)
 [[ ${DRAFT_REPLIES} -eq 1 ]] && CMD_ARGS+=( --draft-replies ) || CMD_ARGS+=( --no-draft-replies )
@@ -1,13 +1,77 @@
 """Test bootstrap helpers.
 
 Ensures the project root is importable when running tests without installing
-the package (common for local dev).
+the package (common for local dev), and holds the fakes shared by the Graph
+client tests. They stand in for `requests`, so no network calls are made;
+import the classes with `from conftest import ...`.
 """
 
 import sys
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import pytest
+import requests
 
 
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+
+from email_categorise import graph_client  # noqa: E402
+from email_categorise.graph_client import GraphClient  # noqa: E402
+
+
+class FakeResponse:
+    """A `requests.Response` carrying a JSON payload and a status."""
+
+    def __init__(
+        self,
+        payload: Optional[Dict[str, Any]] = None,
+        status: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self._payload = payload if payload is not None else {}
+        self.status_code = status
+        self.ok = 200 <= status < 300
+        self.headers = headers or {}
+        self.text = "{}"
+        self.url = "fake"
+
+    def json(self) -> Dict[str, Any]:
+        return self._payload
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise requests.HTTPError(f"status {self.status_code}", response=self)
+
+
+class ScriptedSession:
+    """Answers each request with the next scripted response, recording methods."""
+
+    def __init__(self, responses: List[FakeResponse]) -> None:
+        self.responses = list(responses)
+        self.calls: List[str] = []
+        self.headers: Dict[str, str] = {}
+
+    def request(self, method: str, url: str, **kwargs: Any) -> FakeResponse:
+        self.calls.append(method)
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def make_graph_client() -> Callable[..., GraphClient]:
+    """Build a GraphClient for mailbox `user` that talks to a fake session."""
+
+    def make(session: Any, user: str = "me", **kwargs: Any) -> GraphClient:
+        client = GraphClient("token", user=user, **kwargs)
+        client.session = session
+        return client
+
+    return make
+
+
+@pytest.fixture
+def no_sleep(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Skip the retry backoff sleeps of the sync client."""
+    monkeypatch.setattr(graph_client.time, "sleep", lambda s: None)
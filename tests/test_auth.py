@@ -0,0 +1,118 @@
+"""Unit tests for the shared credential manager.
+
+MSAL app construction and token acquisition are replaced with counters, so
+no network or token cache file is touched.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from email_categorise import auth
+from email_categorise.auth import CredentialManager
+from email_categorise.config import AzureConfig
+
+
+@pytest.fixture
+def msal_calls(monkeypatch) -> Dict[str, List[Any]]:
+    calls: Dict[str, List[Any]] = {"build": [], "acquire": [], "forced": []}
+
+    def build(azure: AzureConfig, cache_path: Path, tenant_id: str) -> object:
+        calls["build"].append(tenant_id)
+        return object()
+
+    def acquire_app(app: object, force_refresh: bool = False) -> Dict[str, Any]:
+        calls["acquire"].append(app)
+        calls["forced"].append(force_refresh)
+        return {"access_token": f"t{len(calls['acquire'])}", "expires_in": 3600}
+
+    def acquire_delegated(
+        app: object, scopes: Any, username: str, force_refresh: bool = False
+    ) -> Dict[str, Any]:
+        calls["acquire"].append(username)
+        calls["forced"].append(force_refresh)
+        return {"access_token": f"t-{username}", "expires_in": 3600}
+
+    monkeypatch.setattr(auth, "build_confidential_client", build)
+    monkeypatch.setattr(auth, "build_public_client", build)
+    monkeypatch.setattr(auth, "acquire_application_token", acquire_app)
+    monkeypatch.setattr(auth, "acquire_delegated_token", acquire_delegated)
+    return calls
+
+
+def test_application_token_is_shared_across_mailboxes_in_a_tenant(msal_calls):
+    manager = CredentialManager()
+    azure = AzureConfig(client_id="app", tenant_id="tenant-a")
+    cache = Path("cache.bin")
+
+    a = manager.token("application", azure, cache, "one@example.com")
+    b = manager.token("application", azure, cache, "two@example.com")
+    c = manager.token(
+        "application", AzureConfig("app", "tenant-b"), cache, "x@other.com"
+    )
+
+    assert a is b
+    assert c.token != a.token
+    assert msal_calls["build"] == ["tenant-a", "tenant-b"]
+    assert len(msal_calls["acquire"]) == 2
+
+
+def test_token_is_reacquired_within_the_refresh_margin(msal_calls):
+    manager = CredentialManager()
+    azure = AzureConfig(client_id="app", tenant_id="tenant-a")
+    first = manager.token("application", azure, Path("c"), "me@example.com")
+    first.expires_at -= 3500  # 100s left
+
+    second = manager.token(
+        "application",
+        azure,
+        Path("c"),
+        "me@example.com",
+        refresh_margin_seconds=300,
+    )
+
+    assert second.token != first.token
+    assert msal_calls["build"] == ["tenant-a"]
+    # MSAL's own cache would still serve the old token; renewal bypasses it.
+    assert msal_calls["forced"] == [False, True]
+
+
+def test_force_refresh_skips_a_valid_cached_token(msal_calls):
+    manager = CredentialManager()
+    azure = AzureConfig(client_id="app", tenant_id="tenant-a")
+    first = manager.token("application", azure, Path("c"), "me@example.com")
+
+    second = manager.token(
+        "application", azure, Path("c"), "me@example.com", force_refresh=True
+    )
+
+    assert second.token != first.token
+    assert msal_calls["forced"] == [False, True]
+
+
+def test_delegated_tokens_are_kept_per_user(msal_calls):
+    manager = CredentialManager()
+    azure = AzureConfig(client_id="app", tenant_id="tenant-a")
+
+    a = manager.token("delegated", azure, Path("c"), "One@example.com")
+    b = manager.token("delegated", azure, Path("c"), "two@example.com")
+    again = manager.token("delegated", azure, Path("c"), "one@example.com")
+
+    assert a.token != b.token
+    assert again is a
+    assert msal_calls["build"] == ["tenant-a"]
+
+
+def test_failed_acquisition_raises(monkeypatch, msal_calls):
+    monkeypatch.setattr(
+        auth, "acquire_application_token", lambda app, force_refresh=False: None
+    )
+    manager = CredentialManager()
+
+    with pytest.raises(RuntimeError, match="Application auth failed"):
+        manager.token(
+            "application", AzureConfig("app", "t"), Path("c"), "me@example.com"
+        )
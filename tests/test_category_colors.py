@@ -1,16 +1,22 @@
 """Unit test for ensuring master category colours are managed.
 
 Uses a tiny fake Graph client to avoid network calls. Verifies that
-`ensure_master_categories` issues create/update/unchanged actions and that
-triage_logic wires the colour map we expect.
+`ensure_master_categories` issues create/update/unchanged actions, that the
+changes go out as one batch, that the per-mailbox sync record skips Graph until
+the palette changes or the TTL runs out, and that triage_logic wires the colour
+map we expect.
 """
 
 from __future__ import annotations
 
+from datetime import timedelta
 from typing import Any, Dict, List
 
-from email_categorise.graph_client import _plan_category_updates
-from email_categorise.triage_logic import CATEGORY_COLORS
+from email_categorise import triage_logic
+from email_categorise.graph_client import _category_requests, _plan_category_updates
+from email_categorise.state_store import StateStore
+from email_categorise.triage_logic import CATEGORY_COLORS, _ensure_category_colors
+from email_categorise.utils import utc_now
 
 
 def _fake_existing(categories: List[Dict[str, str]]) -> List[Dict[str, Any]]:
@@ -59,3 +65,71 @@ def test_category_color_map_covers_all_known_categories():
     }
 
     assert set(CATEGORY_COLORS.keys()) == expected_keys
+
+
+def test_category_changes_become_batch_sub_requests():
+    plan = {
+        "Urgent": {"action": "update", "color": "preset0", "id": "c1"},
+        "Task": {"action": "create", "color": "preset8"},
+        "Processed": {"action": "unchanged", "color": "preset13", "id": "c2"},
+        "Issue": {"action": "update", "color": "preset2", "id": None},
+    }
+
+    actions, sub_requests, names = _category_requests("/me", plan)
+
+    assert actions == {
+        "Urgent": "update",
+        "Task": "create",
+        "Processed": "unchanged",
+        "Issue": "create",
+    }
+    assert [(r["method"], r["url"]) for r in sub_requests] == [
+        ("PATCH", "/me/outlook/masterCategories/c1"),
+        ("POST", "/me/outlook/masterCategories"),
+        ("POST", "/me/outlook/masterCategories"),
+    ]
+    assert names == {"0": "Urgent", "1": "Task", "2": "Issue"}
+
+
+class _FakeCategoryGraph:
+    def __init__(self, results: Dict[str, str] | None = None) -> None:
+        self.calls = 0
+        self.results = results or {name: "unchanged" for name in CATEGORY_COLORS}
+
+    def ensure_master_categories(self, desired: Dict[str, str]) -> Dict[str, str]:
+        self.calls += 1
+        return self.results
+
+
+def test_category_sync_is_skipped_until_palette_changes_or_ttl_expires(
+    tmp_path, monkeypatch
+):
+    store = StateStore(tmp_path / "state.db")
+    graph = _FakeCategoryGraph()
+
+    _ensure_category_colors(graph, store, "me@example.com", ttl_hours=24)
+    _ensure_category_colors(graph, store, "me@example.com", ttl_hours=24)
+    assert graph.calls == 1
+
+    state = store.get_state("me@example.com")
+    state["category_sync"]["synced_utc"] = (
+        utc_now() - timedelta(hours=25)
+    ).isoformat()
+    store.set_state("me@example.com", state)
+    _ensure_category_colors(graph, store, "me@example.com", ttl_hours=24)
+    assert graph.calls == 2
+
+    monkeypatch.setattr(triage_logic, "CATEGORY_COLORS_HASH", "changed")
+    _ensure_category_colors(graph, store, "me@example.com", ttl_hours=24)
+    assert graph.calls == 3
+
+
+def test_failed_category_sync_is_retried_next_run(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    graph = _FakeCategoryGraph({"Urgent": "failed"})
+
+    _ensure_category_colors(graph, store, "me@example.com", ttl_hours=24)
+    _ensure_category_colors(graph, store, "me@example.com", ttl_hours=24)
+
+    assert graph.calls == 2
+    assert "category_sync" not in store.get_state("me@example.com")
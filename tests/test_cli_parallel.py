@@ -0,0 +1,45 @@
+"""Unit tests for running accounts in parallel from the CLI."""
+
+from __future__ import annotations
+
+import logging
+import time
+
+from email_categorise.cli import _run_accounts
+from email_categorise.config import AccountConfig
+
+
+def _accounts(n: int):
+    return [AccountConfig(email=f"user{i}@example.com", label=f"u{i}") for i in range(n)]
+
+
+def test_failure_in_one_account_does_not_abort_others(tmp_path):
+    def fn(account):
+        if account.label == "u1":
+            raise RuntimeError("boom")
+        time.sleep(0.01)
+        return {"account": account.email, "processed": 1}
+
+    rows = _run_accounts(tmp_path, "run", _accounts(3), fn, parallel=3)
+
+    assert [r["account"] for r in rows] == [a.email for a in _accounts(3)]
+    assert rows[1] == {"account": "user1@example.com", "error": "boom"}
+    assert rows[0]["processed"] == 1 and rows[2]["processed"] == 1
+
+
+def test_parallel_runs_write_isolated_log_files(tmp_path):
+    log = logging.getLogger("email_categorise.test")
+    log.setLevel(logging.INFO)
+
+    def fn(account):
+        log.info("hello from %s", account.label)
+        return {"account": account.email}
+
+    _run_accounts(tmp_path, "run", _accounts(2), fn, parallel=2)
+
+    logs = sorted((tmp_path / "output").glob("email_categorise_run_*.log"))
+    assert len(logs) == 2
+    for path, label in zip(logs, ("u0", "u1")):
+        text = path.read_text(encoding="utf-8")
+        assert f"hello from {label}" in text
+        assert "hello from u" + ("1" if label == "u0" else "0") not in text
@@ -0,0 +1,55 @@
+"""Unit tests for running Codex calls using a stand-in `codex` script."""
+
+from __future__ import annotations
+
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+from email_categorise.codex_runner import run_codex
+
+_FAKE_CODEX = textwrap.dedent(
+    """
+    import sys
+    args = sys.argv[1:]
+    if "exit-early" in args:
+        sys.exit(4)
+    prompt = sys.stdin.read()
+    out = args[args.index("--output-last-message") + 1]
+    print("progress line", file=sys.stderr)
+    if "fail" in prompt:
+        sys.exit(3)
+    with open(out, "w") as f:
+        f.write('{"echo": %d}' % len(prompt))
+    """
+)
+
+
+@pytest.fixture()
+def fake_codex(tmp_path: Path):
+    script = tmp_path / "codex.py"
+    script.write_text(_FAKE_CODEX, encoding="utf-8")
+    schema = tmp_path / "schema.json"
+    schema.write_text("{}", encoding="utf-8")
+    return [sys.executable, str(script)], schema
+
+
+def test_run_codex_returns_the_last_message(fake_codex):
+    cmd, schema = fake_codex
+    outputs = [run_codex(cmd, "x" * n, schema) for n in (1, 2, 3)]
+    assert outputs == ['{"echo": 1}', '{"echo": 2}', '{"echo": 3}']
+
+
+def test_run_codex_raises_with_stderr_on_failure(fake_codex):
+    cmd, schema = fake_codex
+    with pytest.raises(RuntimeError, match="progress line"):
+        run_codex(cmd, "please fail", schema)
+
+
+def test_run_codex_reports_a_child_that_exits_before_reading(fake_codex):
+    cmd, schema = fake_codex
+    # Larger than a pipe buffer, so writing it all would hit a closed pipe.
+    with pytest.raises(RuntimeError, match="rc=4"):
+        run_codex(cmd + ["exit-early"], "x" * (1 << 20), schema)
@@ -0,0 +1,264 @@
+"""Unit tests for the asyncio Graph client.
+
+Requests are answered by an `httpx.MockTransport` handler, so no network calls
+are made. Skipped when httpx (the `test` or `async` extra) is not installed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, Callable, Dict, List, Tuple
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from email_categorise import graph_async  # noqa: E402
+from email_categorise.graph_async import AsyncGraphClient  # noqa: E402
+from email_categorise.graph_retry import RetryPolicy  # noqa: E402
+from email_categorise.message_cache import MessageCache  # noqa: E402
+from email_categorise.state_store import StateStore  # noqa: E402
+
+
+def _client(handler: Callable[[Any], Any]) -> AsyncGraphClient:
+    client = AsyncGraphClient(
+        "token", user="me", retry_policy=RetryPolicy(max_retries=2), http2=False
+    )
+    client.client = httpx.AsyncClient(
+        transport=httpx.MockTransport(handler),
+        headers={"Authorization": "Bearer token"},
+    )
+    return client
+
+
+def test_pages_follow_next_link_and_stop_at_max_items():
+    calls: List[str] = []
+
+    def handler(request: Any) -> Any:
+        calls.append(str(request.url))
+        if "page2" in str(request.url):
+            return httpx.Response(200, json={"value": [{"id": "c"}, {"id": "d"}]})
+        return httpx.Response(
+            200,
+            json={
+                "value": [{"id": "a"}, {"id": "b"}],
+                "@odata.nextLink": "https://graph.example/page2",
+            },
+        )
+
+    async def main() -> List[List[Dict[str, Any]]]:
+        async with _client(handler) as graph:
+            return [
+                p
+                async for p in graph.iter_pages(
+                    "https://graph.example/page1", max_items=3
+                )
+            ]
+
+    pages = asyncio.run(main())
+
+    assert [[m["id"] for m in p] for p in pages] == [["a", "b"], ["c"]]
+    assert len(calls) == 2
+
+
+def test_request_retries_429_then_succeeds(monkeypatch):
+    async def no_sleep(seconds: float) -> None:
+        return None
+
+    monkeypatch.setattr(graph_async.asyncio, "sleep", no_sleep)
+    statuses = [429, 200]
+
+    def handler(request: Any) -> Any:
+        status = statuses.pop(0)
+        return httpx.Response(status, headers={"Retry-After": "2"}, json={})
+
+    async def main() -> Dict[str, int]:
+        async with _client(handler) as graph:
+            await graph.update_message("m1", {"isRead": True})
+            return graph.stats.as_dict()
+
+    stats = asyncio.run(main())
+
+    assert statuses == []
+    assert stats == {"retries": 1, "throttled": 1, "sleep_seconds": 2.0}
+
+
+def test_update_messages_batches_in_chunks_of_twenty():
+    posts: List[int] = []
+
+    def handler(request: Any) -> Any:
+        reqs = json.loads(request.content)["requests"]
+        posts.append(len(reqs))
+        return httpx.Response(
+            200, json={"responses": [{"id": r["id"], "status": 200} for r in reqs]}
+        )
+
+    async def main() -> Dict[str, int]:
+        async with _client(handler) as graph:
+            return await graph.update_messages(
+                {f"m{i}": {"isRead": True} for i in range(45)}
+            )
+
+    statuses = asyncio.run(main())
+
+    assert sorted(posts) == [5, 20, 20]
+    assert set(statuses.values()) == {200}
+
+
+def test_401_renews_token_and_replays_once():
+    seen: List[str] = []
+
+    def handler(request: Any) -> Any:
+        seen.append(request.headers["Authorization"])
+        return httpx.Response(401 if len(seen) == 1 else 200, json={"value": []})
+
+    def provider(force_refresh: bool) -> Tuple[str, float]:
+        return ("fresh" if force_refresh else "token", 4102444800.0)
+
+    async def main() -> None:
+        async with _client(handler) as graph:
+            graph.token_provider = provider
+            await graph._get("https://graph.example/thing")
+
+    asyncio.run(main())
+
+    assert seen == ["Bearer token", "Bearer fresh"]
+
+
+def test_batch_only_resends_posts_graph_did_not_process(monkeypatch):
+    async def no_sleep(seconds: float) -> None:
+        return None
+
+    monkeypatch.setattr(graph_async.asyncio, "sleep", no_sleep)
+    first = {
+        "post-500": {"status": 500},
+        "post-429": {"status": 429},
+        "patch-500": {"status": 500},
+    }
+    posts: List[List[str]] = []
+
+    def handler(request: Any) -> Any:
+        reqs = json.loads(request.content)["requests"]
+        posts.append(sorted(r["id"] for r in reqs))
+        return httpx.Response(
+            200,
+            json={
+                "responses": [
+                    dict(first.pop(r["id"], None) or {"status": 201}, id=r["id"])
+                    for r in reqs
+                ]
+            },
+        )
+
+    async def main() -> Dict[str, Dict[str, Any]]:
+        async with _client(handler) as graph:
+            return await graph.batch(
+                [
+                    {"id": rid, "method": rid.split("-")[0].upper(), "url": "/me/x"}
+                    for rid in ["post-500", "post-429", "patch-500"]
+                ]
+            )
+
+    results = asyncio.run(main())
+
+    assert posts == [["patch-500", "post-429", "post-500"], ["patch-500", "post-429"]]
+    assert results["post-500"]["status"] == 500
+    assert results["post-429"]["status"] == 201
+
+
+def test_delta_withholds_the_link_when_max_messages_cuts_the_page():
+    def handler(request: Any) -> Any:
+        if "page2" in str(request.url):
+            return httpx.Response(
+                200,
+                json={
+                    "value": [{"id": "b", "receivedDateTime": "2025-01-02T00:00:00Z"}],
+                    "@odata.deltaLink": "https://graph.example/delta?token=2",
+                },
+            )
+        return httpx.Response(
+            200,
+            json={
+                "value": [
+                    {"id": "a", "receivedDateTime": "2025-01-01T00:00:00Z"},
+                    {"id": "gone", "@removed": {"reason": "deleted"}},
+                ],
+                "@odata.nextLink": "https://graph.example/page2",
+            },
+        )
+
+    async def main(max_messages: int) -> Tuple[List[str], Any]:
+        async with _client(handler) as graph:
+            msgs, link = await graph.list_inbox_delta(None, 7, max_messages)
+            return [m["id"] for m in msgs], link
+
+    assert asyncio.run(main(5)) == (["b", "a"], "https://graph.example/delta?token=2")
+    assert asyncio.run(main(1)) == (["b"], None)
+
+
+def test_conversations_are_fetched_in_one_batch_oldest_first():
+    posts: List[int] = []
+
+    def handler(request: Any) -> Any:
+        reqs = json.loads(request.content)["requests"]
+        posts.append(len(reqs))
+        body = {
+            "value": [
+                {"id": "late", "receivedDateTime": "2025-01-02T00:00:00Z"},
+                {"id": "early", "receivedDateTime": "2025-01-01T00:00:00Z"},
+            ]
+        }
+        return httpx.Response(
+            200,
+            json={
+                "responses": [
+                    {"id": r["id"], "status": 200, "body": body} for r in reqs
+                ]
+            },
+        )
+
+    async def main() -> Dict[str, List[Dict[str, Any]]]:
+        async with _client(handler) as graph:
+            return await graph.list_conversations_messages(["c1", "c2", "c1", None])
+
+    threads = asyncio.run(main())
+
+    assert posts == [2]
+    assert sorted(threads) == ["c1", "c2"]
+    assert [m["id"] for m in threads["c1"]] == ["early", "late"]
+
+
+def test_mirror_relists_changed_pages_instead_of_fetching_by_id(tmp_path):
+    messages = [
+        {"id": f"m{i}", "changeKey": "v1", "subject": f"s{i}", "body": {}}
+        for i in range(3)
+    ]
+    select = "body,changeKey,id,subject"
+    cache = MessageCache(StateStore(tmp_path / "state.db"), "me", max_age_days=30)
+    cache.put_many(messages, select)
+    messages[1] = dict(messages[1], changeKey="v2", subject="edited")
+    selects: List[str] = []
+
+    def handler(request: Any) -> Any:
+        assert not request.url.path.endswith("$batch")
+        fields = request.url.params["$select"].split(",")
+        selects.append(request.url.params["$select"])
+        value = [{k: v for k, v in m.items() if k in fields} for m in messages]
+        return httpx.Response(200, json={"value": value})
+
+    async def main() -> List[str]:
+        async with _client(handler) as graph:
+            graph.message_cache = cache
+            return [
+                m["subject"]
+                async for m in graph._mirrored_items(
+                    "https://graph.example/sent",
+                    {"$select": "id,subject,body"},
+                    max_items=10,
+                    page_size=10,
+                )
+            ]
+
+    assert asyncio.run(main()) == ["s0", "edited", "s2"]
+    assert selects == ["id,changeKey", select]
@@ -0,0 +1,209 @@
+"""Unit tests for Graph JSON batching.
+
+Uses a fake session standing in for `requests.Session` so no network calls
+are made. Verifies chunking to 20 sub-requests per POST, per-item status
+reporting, and that only failed sub-requests are retried, POSTs only when Graph
+did not process them.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+from conftest import FakeResponse
+
+from email_categorise import graph_client
+from email_categorise.graph_client import GRAPH_BATCH_MAX
+from email_categorise.graph_retry import RetryPolicy, RetryStats
+
+
+class _FakeBatchSession:
+    """Answers $batch POSTs; ids listed in `fail_once` get a 429 the first time."""
+
+    def __init__(self, fail_once: List[str] | None = None) -> None:
+        self.fail_once = set(fail_once or [])
+        self.posts: List[List[Dict[str, Any]]] = []
+        self.headers: Dict[str, str] = {}
+
+    def request(self, method: str, url: str, json: Dict[str, Any]) -> FakeResponse:
+        assert method == "POST"
+        assert url.endswith("/$batch")
+        reqs = json["requests"]
+        self.posts.append(reqs)
+        responses = []
+        for r in reqs:
+            if r["id"] in self.fail_once:
+                self.fail_once.discard(r["id"])
+                responses.append(
+                    {"id": r["id"], "status": 429, "headers": {"Retry-After": "0"}}
+                )
+            elif r["method"] == "GET":
+                value = [
+                    {"id": f"{r['id']}-a", "receivedDateTime": "2"},
+                    {"id": f"{r['id']}-b", "receivedDateTime": "1"},
+                ]
+                responses.append(
+                    {"id": r["id"], "status": 200, "body": {"value": value}}
+                )
+            else:
+                responses.append({"id": r["id"], "status": 200, "body": {}})
+        return FakeResponse({"responses": responses})
+
+
+def test_update_messages_chunks_into_batches_of_twenty(no_sleep, make_graph_client):
+    session = _FakeBatchSession()
+    client = make_graph_client(session, user="someone@example.com")
+    patches = {f"msg-{i}": {"isRead": True} for i in range(45)}
+
+    statuses = client.update_messages(patches)
+
+    assert [len(p) for p in session.posts] == [GRAPH_BATCH_MAX, GRAPH_BATCH_MAX, 5]
+    assert statuses == {msg_id: 200 for msg_id in patches}
+    first = session.posts[0][0]
+    assert first["method"] == "PATCH"
+    assert first["url"] == "/users/someone@example.com/messages/msg-0"
+    assert first["headers"] == {"Content-Type": "application/json"}
+
+
+def test_batch_retries_only_failed_sub_requests(no_sleep, make_graph_client):
+    session = _FakeBatchSession(fail_once=["1", "3"])
+    client = make_graph_client(session)
+    patches = {f"msg-{i}": {"isRead": False} for i in range(5)}
+
+    statuses = client.update_messages(patches)
+
+    assert len(session.posts) == 2
+    assert sorted(r["id"] for r in session.posts[1]) == ["1", "3"]
+    assert all(status == 200 for status in statuses.values())
+
+
+def test_batch_reports_failure_after_retries_exhausted(no_sleep, make_graph_client):
+    session = _FakeBatchSession(fail_once=["0"])
+    client = make_graph_client(session)
+
+    statuses = client.update_messages({"msg-0": {"isRead": True}}, max_retries=0)
+
+    assert statuses == {"msg-0": 429}
+
+
+def test_conversation_prefetch_deduplicates_and_sorts(no_sleep, make_graph_client):
+    session = _FakeBatchSession()
+    client = make_graph_client(session)
+
+    threads = client.list_conversations_messages(
+        ["conv-a", None, "conv-b", "conv-a"]
+    )
+
+    assert len(session.posts) == 1
+    assert len(session.posts[0]) == 2
+    assert "conversationId%20eq%20%27conv-a%27" in session.posts[0][0]["url"]
+    assert set(threads) == {"conv-a", "conv-b"}
+    assert [m["id"] for m in threads["conv-a"]] == ["0-b", "0-a"]
+
+
+def test_ensure_master_categories_sends_changes_in_one_batch(
+    monkeypatch, no_sleep, make_graph_client
+):
+    session = _FakeBatchSession()
+    client = make_graph_client(session)
+    monkeypatch.setattr(
+        client,
+        "list_master_categories",
+        lambda: [
+            {"id": "c1", "displayName": "Urgent", "color": "preset3"},
+            {"id": "c2", "displayName": "Processed", "color": "preset13"},
+        ],
+    )
+
+    results = client.ensure_master_categories(
+        {"Urgent": "preset0", "Processed": "preset13", "Task": "preset8"}
+    )
+
+    assert results == {"Urgent": "update", "Processed": "unchanged", "Task": "create"}
+    assert len(session.posts) == 1
+    assert [r["method"] for r in session.posts[0]] == ["PATCH", "POST"]
+
+
+class _StatusBatchSession(_FakeBatchSession):
+    """Answers each sub-request id with a fixed status the first time it is sent."""
+
+    def __init__(self, first: Dict[str, Dict[str, Any]]) -> None:
+        super().__init__()
+        self.first = first
+
+    def request(self, method: str, url: str, json: Dict[str, Any]) -> FakeResponse:
+        reqs = json["requests"]
+        self.posts.append(reqs)
+        responses = [
+            self.first.pop(r["id"], None) or {"status": 201, "body": {}}
+            for r in reqs
+        ]
+        return FakeResponse(
+            {"responses": [dict(resp, id=r["id"]) for r, resp in zip(reqs, responses)]}
+        )
+
+
+def test_batch_only_resends_posts_graph_did_not_process(no_sleep, make_graph_client):
+    session = _StatusBatchSession(
+        {
+            "post-500": {"status": 500},
+            "post-503": {"status": 503},
+            "post-503-hint": {"status": 503, "headers": {"Retry-After": "0"}},
+            "post-429": {"status": 429},
+            "patch-500": {"status": 500},
+        }
+    )
+    client = make_graph_client(session)
+    requests = [
+        {"id": rid, "method": rid.split("-")[0].upper(), "url": "/me/x", "body": {}}
+        for rid in ["post-500", "post-503", "post-503-hint", "post-429", "patch-500"]
+    ]
+
+    results = client.batch(requests)
+
+    assert len(session.posts) == 2
+    assert sorted(r["id"] for r in session.posts[1]) == [
+        "patch-500",
+        "post-429",
+        "post-503-hint",
+    ]
+    assert results["post-500"]["status"] == 500
+    assert results["post-503"]["status"] == 503
+    assert results["post-429"]["status"] == 201
+
+
+def test_batch_round_is_shared_by_both_clients_without_transport():
+    policy = RetryPolicy(max_retries=3, max_retry_after_seconds=60.0)
+    stats = RetryStats()
+    chunk = [
+        {"id": "a", "method": "PATCH", "url": "/me/x", "body": {}},
+        {"id": "b", "method": "PATCH", "url": "/me/y", "body": {}},
+    ]
+    results: Dict[str, Dict[str, Any]] = {}
+
+    retry, delay = graph_client._batch_round(
+        policy,
+        stats,
+        [chunk],
+        [
+            {
+                "responses": [
+                    {"id": "a", "status": 200},
+                    {"id": "b", "status": 429, "headers": {"Retry-After": "7"}},
+                ]
+            }
+        ],
+        results,
+        0,
+        3,
+    )
+    assert [r["id"] for r in retry] == ["b"]
+    assert delay == 7.0
+    assert results["a"]["status"] == 200
+
+    too_long = {"id": "b", "status": 429, "headers": {"Retry-After": "600"}}
+    retry, delay = graph_client._batch_round(
+        policy, stats, [retry], [{"responses": [too_long]}], results, 1, 3
+    )
+    assert retry == [] and delay == 0.0
+    assert results["b"]["status"] == 429
@@ -0,0 +1,203 @@
+"""Unit tests for GraphClient pagination.
+
+A fake session serves a numbered collection in pages linked by
+`@odata.nextLink`, so no network calls are made. Verifies lazy iteration,
+the `$top` page-size hint, `max_items` trimming and that stopping early does
+not walk the rest of the collection. A second fake serves the unprocessed
+Inbox listing and drops messages as they are tagged `Processed`. The delta
+result filter shared by both clients is checked directly.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+from conftest import FakeResponse
+
+from email_categorise.graph_client import GRAPH_PAGE_MAX, GraphClient, _delta_result
+
+
+class _PagedSession:
+    """Serves `pages` pages of `per_page` items; page N links to page N+1."""
+
+    def __init__(self, pages: int, per_page: int = 3) -> None:
+        self.pages = pages
+        self.per_page = per_page
+        self.requests: List[Dict[str, Any]] = []
+        self.headers: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def request(
+        self, method: str, url: str, params: Optional[Dict[str, Any]] = None, **_: Any
+    ) -> FakeResponse:
+        with self._lock:
+            self.requests.append({"url": url, "params": params})
+        n = int(url.rsplit("page=", 1)[1]) if "page=" in url else 0
+        payload: Dict[str, Any] = {
+            "value": [{"id": f"{n}-{i}"} for i in range(self.per_page)]
+        }
+        if n + 1 < self.pages:
+            payload["@odata.nextLink"] = f"https://graph.example/items?page={n + 1}"
+        return FakeResponse(payload)
+
+
+def test_iter_items_follows_next_links_lazily(make_graph_client):
+    session = _PagedSession(pages=4)
+    items = make_graph_client(session).iter_items("https://graph.example/items")
+
+    assert session.requests == []
+    assert [m["id"] for m in items] == [f"{p}-{i}" for p in range(4) for i in range(3)]
+    assert len(session.requests) == 4
+
+
+def test_page_size_hint_is_capped_and_max_items_trims(make_graph_client):
+    session = _PagedSession(pages=5)
+    client = make_graph_client(session)
+
+    pages = list(
+        client.iter_pages(
+            "https://graph.example/items", {"$select": "id"}, max_items=7, page_size=50
+        )
+    )
+    assert [len(p) for p in pages] == [3, 3, 1]
+    assert session.requests[0]["params"] == {"$select": "id", "$top": 7}
+    assert len(session.requests) == 3
+
+    list(client.iter_pages("https://graph.example/items", page_size=5000))
+    assert session.requests[3]["params"] == {"$top": GRAPH_PAGE_MAX}
+
+
+def test_stopping_early_stops_paging(make_graph_client):
+    session = _PagedSession(pages=50)
+    for page in make_graph_client(session).iter_pages("https://graph.example/items"):
+        break
+
+    # The first page plus at most the one prefetched behind it.
+    assert len(session.requests) <= 2
+
+
+def test_without_prefetch_pages_are_requested_on_demand(make_graph_client):
+    session = _PagedSession(pages=3)
+    pages = make_graph_client(session).iter_pages(
+        "https://graph.example/items", prefetch=False
+    )
+
+    next(pages)
+    assert len(session.requests) == 1
+    next(pages)
+    assert len(session.requests) == 2
+
+
+class _ShrinkingInboxSession:
+    """Unprocessed-Inbox listing whose filtered set shrinks as messages are
+    tagged Processed; honours `$top`, `receivedDateTime le/lt/eq` bounds and
+    nextLinks over an `eq` listing."""
+
+    def __init__(self, stamps: List[str]) -> None:
+        # Newest first.
+        self.messages = [
+            {"id": f"m{i}", "receivedDateTime": stamp} for i, stamp in enumerate(stamps)
+        ]
+        self.processed: Set[str] = set()
+        self.headers: Dict[str, str] = {}
+
+    def _row(self, m: Dict[str, Any]) -> Dict[str, Any]:
+        tagged = m["id"] in self.processed
+        return dict(m, categories=["Processed"] if tagged else [])
+
+    def request(
+        self, method: str, url: str, params: Optional[Dict[str, Any]] = None, **_: Any
+    ) -> FakeResponse:
+        if params is None:
+            # A nextLink over one timestamp: eq=<stamp>&skip=<n>.
+            query = dict(q.split("=", 1) for q in url.split("?")[1].split("&"))
+            stamp, skip, top = query["eq"], int(query["skip"]), 50
+        else:
+            stamp, skip, top = None, 0, params["$top"]
+            if "receivedDateTime eq " in params["$filter"]:
+                stamp = params["$filter"].split("receivedDateTime eq ")[1]
+        if stamp is not None:
+            rows = [
+                self._row(m) for m in self.messages if m["receivedDateTime"] == stamp
+            ]
+            payload: Dict[str, Any] = {"value": rows[skip : skip + top]}
+            if len(rows) > skip + top:
+                payload["@odata.nextLink"] = (
+                    f"https://graph.example/items?eq={stamp}&skip={skip + top}"
+                )
+            return FakeResponse(payload)
+        rows = [self._row(m) for m in self.messages if m["id"] not in self.processed]
+        for op, keep in (("le", str.__le__), ("lt", str.__lt__)):
+            term = f"receivedDateTime {op} "
+            if term in params["$filter"]:
+                bound = params["$filter"].split(term)[1].split(" ")[0]
+                rows = [m for m in rows if keep(m["receivedDateTime"], bound)]
+        payload = {"value": rows[:top]}
+        if len(rows) > top:
+            payload["@odata.nextLink"] = "https://graph.example/items?$skip=50"
+        return FakeResponse(payload)
+
+
+def _unprocessed_ids(
+    client: GraphClient, max_messages: int, *, patch: bool = True
+) -> List[str]:
+    session = client.session
+    seen: List[str] = []
+    for page in client.iter_inbox_unprocessed_pages(30, max_messages=max_messages):
+        seen.extend(m["id"] for m in page)
+        # The run patches each page Processed before it reads the next, except
+        # for one message it could not triage.
+        if patch:
+            session.processed.update(m["id"] for m in page if m["id"] != "m7")
+    return seen
+
+
+def test_unprocessed_pages_survive_patching_earlier_pages(make_graph_client):
+    # Two messages per second, so page edges share stamps.
+    stamps = [f"2025-01-01T00:00:{99 - i // 2:03}Z" for i in range(121)]
+
+    client = make_graph_client(_ShrinkingInboxSession(stamps))
+    seen = _unprocessed_ids(client, 120)
+
+    assert seen == [f"m{i}" for i in range(120)]
+
+
+def test_unprocessed_pages_walk_more_than_a_page_on_one_timestamp(
+    make_graph_client,
+):
+    stamps = (
+        [f"2025-01-01T00:00:{99 - i:03}Z" for i in range(10)]
+        + ["2025-01-01T00:00:050Z"] * 120
+        + [f"2025-01-01T00:00:{40 - i:03}Z" for i in range(10)]
+    )
+
+    # Nothing is tagged (a dry run), so the shared timestamp never shrinks.
+    client = make_graph_client(_ShrinkingInboxSession(stamps))
+    seen = _unprocessed_ids(client, 500, patch=False)
+    assert seen == [f"m{i}" for i in range(140)]
+
+    client = make_graph_client(_ShrinkingInboxSession(stamps))
+    seen = _unprocessed_ids(client, 500)
+    assert seen == [f"m{i}" for i in range(140)]
+
+
+def test_delta_result_withholds_the_link_when_the_cap_cuts_messages():
+    changed = [
+        {"id": "old", "receivedDateTime": "2025-01-01T00:00:00Z"},
+        {"id": "gone", "@removed": {"reason": "deleted"}},
+        {
+            "id": "done",
+            "receivedDateTime": "2025-01-03T00:00:00Z",
+            "categories": ["Processed"],
+        },
+        {"id": "new", "receivedDateTime": "2025-01-02T00:00:00Z"},
+    ]
+
+    msgs, link = _delta_result(changed, "delta-2", max_messages=2)
+    assert [m["id"] for m in msgs] == ["new", "old"]
+    assert link == "delta-2"
+
+    msgs, link = _delta_result(changed, "delta-2", max_messages=1)
+    assert [m["id"] for m in msgs] == ["new"]
+    assert link is None
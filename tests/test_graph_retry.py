@@ -0,0 +1,230 @@
+"""Unit tests for the Graph retry layer.
+
+Covers Retry-After parsing, backoff bounds, the per-mailbox token bucket and
+the GraphClient request loop using a scripted fake session (no network).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import pytest
+import requests
+
+from conftest import FakeResponse, ScriptedSession
+
+from email_categorise import graph_client
+from email_categorise.graph_retry import (
+    RetryPolicy,
+    TokenBucket,
+    mailbox_bucket,
+    parse_retry_after,
+)
+
+
+def test_parse_retry_after_seconds_and_missing():
+    assert parse_retry_after({"Retry-After": "7"}) == 7.0
+    assert parse_retry_after({"retry-after": "2.5"}) == 2.5
+    assert parse_retry_after({}) is None
+    assert parse_retry_after({"Retry-After": "soon"}) is None
+
+
+def test_retry_policy_honours_retry_after_and_caps_backoff():
+    policy = RetryPolicy(
+        backoff_base_seconds=1.0, backoff_max_seconds=4.0, max_retry_after_seconds=60.0
+    )
+    assert policy.delay(1, retry_after=3.0) == 3.0
+    # Retry-After is not shortened to the backoff cap...
+    assert policy.delay(1, retry_after=30.0) == 30.0
+    # ...but past the ceiling the request is given up on.
+    assert not policy.retry_after_too_long(60.0)
+    assert policy.retry_after_too_long(61.0)
+    assert not policy.retry_after_too_long(None)
+    for attempt in range(1, 8):
+        assert 0.0 <= policy.delay(attempt) <= 4.0
+
+
+def test_token_bucket_allows_burst_then_waits(monkeypatch):
+    slept: List[float] = []
+    monkeypatch.setattr("email_categorise.graph_retry.time.sleep", slept.append)
+    bucket = TokenBucket(rate_per_second=1000.0, capacity=2)
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == 0.0
+    bucket.acquire()
+    assert slept and slept[0] > 0
+
+
+def test_token_bucket_async_acquire_waits_without_blocking(monkeypatch):
+    slept: List[float] = []
+
+    async def fake_sleep(seconds: float) -> None:
+        slept.append(seconds)
+
+    monkeypatch.setattr("email_categorise.graph_retry.asyncio.sleep", fake_sleep)
+    bucket = TokenBucket(rate_per_second=1000.0, capacity=1)
+    assert asyncio.run(bucket.aacquire()) == 0.0
+    assert asyncio.run(bucket.aacquire()) > 0
+    assert slept and slept[0] > 0
+
+
+def test_retry_policy_should_retry_matches_idempotency():
+    policy = RetryPolicy(max_retries=2)
+    assert policy.should_retry(503, 0, idempotent=False)
+    assert policy.should_retry(500, 0, idempotent=True)
+    assert not policy.should_retry(500, 0, idempotent=False)
+    assert not policy.should_retry(404, 0, idempotent=True)
+    assert policy.should_retry(None, 1, idempotent=True)
+    assert not policy.should_retry(None, 1, idempotent=False)
+    assert not policy.should_retry(429, 2, idempotent=True)
+
+
+def test_mailbox_bucket_is_shared_per_mailbox():
+    a = mailbox_bucket("Someone@Example.com", 10, 10)
+    b = mailbox_bucket("someone@example.com", 10, 10)
+    assert a is b
+
+
+def test_request_retries_429_then_succeeds(monkeypatch, make_graph_client):
+    slept: List[float] = []
+    monkeypatch.setattr(graph_client.time, "sleep", slept.append)
+    session = ScriptedSession(
+        [
+            FakeResponse(status=429, headers={"Retry-After": "2"}),
+            FakeResponse(status=200),
+        ]
+    )
+    client = make_graph_client(session)
+
+    client._get("https://graph.example/thing")
+
+    assert session.calls == ["GET", "GET"]
+    assert slept == [2.0]
+    assert client.stats.as_dict() == {
+        "retries": 1,
+        "throttled": 1,
+        "sleep_seconds": 2.0,
+    }
+
+
+def test_request_gives_up_when_retry_after_exceeds_ceiling(
+    monkeypatch, make_graph_client
+):
+    slept: List[float] = []
+    monkeypatch.setattr(graph_client.time, "sleep", slept.append)
+    session = ScriptedSession(
+        [
+            FakeResponse(status=429, headers={"Retry-After": "600"}),
+            FakeResponse(status=200),
+        ]
+    )
+    client = make_graph_client(session)
+
+    with pytest.raises(requests.HTTPError):
+        client._get("https://graph.example/thing")
+    assert session.calls == ["GET"]
+    assert slept == []
+
+
+def test_non_idempotent_post_not_retried_on_500(no_sleep, make_graph_client):
+    session = ScriptedSession([FakeResponse(status=500), FakeResponse(status=200)])
+    client = make_graph_client(session)
+
+    with pytest.raises(requests.HTTPError):
+        client.send_mail("subject", "<p>x</p>", "someone@example.com")
+    assert session.calls == ["POST"]
+
+
+def test_request_gives_up_after_max_retries(no_sleep, make_graph_client):
+    session = ScriptedSession([FakeResponse(status=503) for _ in range(3)])
+    client = make_graph_client(session, retry_policy=RetryPolicy(max_retries=2))
+
+    with pytest.raises(requests.HTTPError):
+        client._patch("https://graph.example/thing", {"isRead": True})
+    assert len(session.calls) == 3
+
+
+def test_request_renews_token_and_replays_once_on_401(make_graph_client):
+    session = ScriptedSession(
+        [
+            FakeResponse(status=401),
+            FakeResponse(status=200),
+            FakeResponse(status=401),
+            FakeResponse(status=401),
+        ]
+    )
+    forced: List[bool] = []
+
+    def provider(force_refresh: bool) -> Tuple[str, float]:
+        forced.append(force_refresh)
+        return (f"token-{len(forced)}", 4102444800.0)
+
+    client = make_graph_client(session)
+    client.token_provider = provider
+
+    client._get("https://graph.example/thing")
+    assert session.calls == ["GET", "GET"]
+    assert forced == [False, True]
+    assert session.headers["Authorization"] == "Bearer token-2"
+
+    # A second 401 straight after the replay is an error, not a loop.
+    with pytest.raises(requests.HTTPError):
+        client._get("https://graph.example/thing")
+    assert len(session.calls) == 4
+
+
+class _ExpiringTokenSession:
+    """401 for the stale bearer token once every thread has sent with it."""
+
+    def __init__(self, threads: int) -> None:
+        self.headers: Dict[str, str] = {"Authorization": "Bearer token"}
+        self.stale = threading.Barrier(threads)
+
+    def request(self, method: str, url: str, **kwargs: Any) -> FakeResponse:
+        if self.headers["Authorization"] == "Bearer token":
+            self.stale.wait(timeout=5)
+            return FakeResponse(status=401)
+        return FakeResponse(status=200)
+
+
+def test_concurrent_401s_renew_the_shared_token_once(make_graph_client):
+    session = _ExpiringTokenSession(threads=4)
+    forced: List[bool] = []
+
+    def provider(force_refresh: bool) -> Tuple[str, float]:
+        forced.append(force_refresh)
+        return ("token" if not force_refresh else "fresh", 4102444800.0)
+
+    client = make_graph_client(session)
+    client.token_provider = provider
+    client._token_expires_at = 4102444800.0
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(client._get, ["https://graph.example/thing"] * 4))
+
+    assert forced == [True]
+    assert session.headers["Authorization"] == "Bearer fresh"
+
+
+def test_request_renews_token_near_expiry(make_graph_client):
+    session = ScriptedSession([FakeResponse(status=200), FakeResponse(status=200)])
+    issued: List[bool] = []
+    expiries = [graph_client.time.time() + 60, graph_client.time.time() + 3600]
+
+    def provider(force_refresh: bool) -> Tuple[str, float]:
+        issued.append(force_refresh)
+        return (f"token-{len(issued)}", expiries[len(issued) - 1])
+
+    client = make_graph_client(session)
+    client.token_provider = provider
+    client.token_refresh_margin_seconds = 300
+
+    client._get("https://graph.example/a")
+    client._get("https://graph.example/b")
+
+    # The first token had 60s left, inside the margin, so the next request
+    # renewed it before sending.
+    assert issued == [False, False]
+    assert session.headers["Authorization"] == "Bearer token-2"
@@ -0,0 +1,140 @@
+"""Unit tests for the incremental JSON-schema prefix checker used for
+constrained hf-local decoding (no model or torch needed)."""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+from email_categorise.json_grammar import JsonSchemaPrefix, schema_prefix_for
+
+SCHEMAS = Path(__file__).resolve().parent.parent / "email_categorise" / "json_schemas"
+
+
+def _triage_message(**overrides):
+    msg = {
+        "id": 'AAMk"1\\u00e9',
+        "primary_category": "Priority 2",
+        "secondary_categories": ["Invoice"],
+        "flag": None,
+        "needs_reply": True,
+        "is_marketing": False,
+        "is_informational": False,
+        "mark_complete": False,
+        "mark_possibly_complete": False,
+        "pin": False,
+        "create_task": False,
+        "task_summary": None,
+        "summary": "Line one\nline two",
+    }
+    msg.update(overrides)
+    return msg
+
+
+def test_valid_documents_complete_in_any_layout():
+    grammar = schema_prefix_for(SCHEMAS / "triage_output.schema.json")
+    doc = {"messages": [_triage_message(), _triage_message(id="2")]}
+    for text in (json.dumps(doc), json.dumps(doc, indent=2)):
+        state = grammar.feed(grammar.initial(), text)
+        assert grammar.is_complete(state)
+        assert grammar.feed(state, "}") is None
+
+
+def test_prefixes_are_accepted_until_they_break_the_schema():
+    grammar = schema_prefix_for(SCHEMAS / "triage_output.schema.json")
+    start = grammar.initial()
+    assert grammar.feed(start, '{"messa') is not None
+    assert not grammar.is_complete(grammar.feed(start, '{"messages": ['))
+    assert grammar.feed(start, "Sure, here") is None
+    assert grammar.feed(start, '{"msg') is None
+    assert grammar.feed(start, '{"messages": [{"id": 1') is None
+    assert grammar.feed(start, '{"messages": [{"id": "x"}') is None  # missing keys
+
+
+def test_tone_profile_rejects_duplicate_and_unknown_keys():
+    grammar = schema_prefix_for(SCHEMAS / "tone_profile.schema.json")
+    start = grammar.initial()
+    assert grammar.feed(start, '{"tone_summary": "x", "tone_summary"') is None
+    assert grammar.feed(start, '{"greeting"') is None
+
+
+def test_numbers_and_whitespace_cap():
+    grammar = JsonSchemaPrefix(
+        {
+            "type": "object",
+            "properties": {"n": {"type": "integer"}, "x": {"type": "number"}},
+        },
+        max_whitespace=4,
+    )
+    start = grammar.initial()
+    assert grammar.is_complete(grammar.feed(start, '{"n": 12, "x": -1.5e3}'))
+    assert grammar.feed(start, '{"n": 1.') is None
+    assert grammar.feed(start, '{"n": 01') is None
+    assert grammar.feed(start, "{" + " " * 5) is None
+
+
+def test_schema_prefix_is_cached_until_the_file_changes(tmp_path):
+    schema_path = tmp_path / "s.schema.json"
+    schema_path.write_text(
+        '{"type": "object", "properties": {"a": {"type": "string"}}, '
+        '"additionalProperties": false}',
+        encoding="utf-8",
+    )
+
+    first = schema_prefix_for(schema_path)
+    assert schema_prefix_for(schema_path) is first
+    assert first.feed(first.initial(), '{"b"') is None
+
+    schema_path.write_text('{"type": "object"}', encoding="utf-8")
+    stat = schema_path.stat()
+    os.utime(schema_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    second = schema_prefix_for(schema_path)
+    assert second is not first
+    assert second.feed(second.initial(), '{"b"') is not None
+
+
+def test_enums_only_admit_their_literals():
+    grammar = JsonSchemaPrefix(
+        {
+            "type": "object",
+            "properties": {
+                "category": {"type": "string", "enum": ["Priority 1", "Priority 10"]},
+                "flag": {"type": ["string", "null"], "enum": ["Today", None]},
+                "level": {"enum": [1, 10]},
+                "kind": {"const": "triage"},
+            },
+        }
+    )
+    start = grammar.initial()
+    assert grammar.is_complete(grammar.feed(start, '{"category": "Priority 1"}'))
+    assert grammar.is_complete(grammar.feed(start, '{"category": "Priority 10"}'))
+    assert grammar.feed(start, '{"category": "Priority 9') is None
+    assert grammar.feed(start, '{"category": "Priority 1 ') is None
+    assert grammar.is_complete(grammar.feed(start, '{"flag": null, "level": 10}'))
+    assert grammar.is_complete(grammar.feed(start, '{"level": 1 }'))
+    assert grammar.feed(start, '{"level": 2') is None
+    assert grammar.feed(start, '{"level": 100') is None
+    assert grammar.feed(start, '{"kind": "other"') is None
+
+
+def test_confidence_bounds_are_enforced_while_decoding():
+    grammar = JsonSchemaPrefix(
+        {
+            "type": "object",
+            "properties": {
+                "confidence": {"type": "number", "minimum": 0, "maximum": 1}
+            },
+        }
+    )
+    start = grammar.initial()
+    for ok in ("0", "0.7", "1", "1.0"):
+        assert grammar.is_complete(grammar.feed(start, '{"confidence": %s}' % ok))
+    assert grammar.feed(start, '{"confidence": 1.5') is None
+    assert grammar.feed(start, '{"confidence": 2') is None
+    assert grammar.feed(start, '{"confidence": -') is None
+    assert grammar.feed(start, '{"confidence": 7e-1') is None
+    # A prefix that is still in range only fails once the number ends.
+    assert grammar.feed(start, '{"confidence": 1.00') is not None
+    assert grammar.feed(start, '{"confidence": 1.01}') is None
@@ -0,0 +1,181 @@
+"""Unit tests for the local Graph message mirror.
+
+A fake session serves a Sent Items listing and $batch GETs from an in-memory
+mailbox, so no network calls are made. Verifies that a cold listing fills the
+mirror, that unchanged messages are then served locally, and that pages with
+a new changeKey are listed again, with per-id fetches only for messages that
+listing no longer returns.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from conftest import FakeResponse
+
+from email_categorise.message_cache import MessageCache, with_change_key
+from email_categorise.state_store import StateStore
+
+
+class _MailboxSession:
+    """Serves a listing (paged by `$top` through `$skip` nextLinks) and $batch
+    GETs; ids in `moved` are missing from listings that select bodies."""
+
+    def __init__(self, messages: List[Dict[str, Any]]) -> None:
+        self.messages = {m["id"]: m for m in messages}
+        self.listings: List[str] = []
+        self.fetched: List[str] = []
+        self.moved: Set[str] = set()
+        self.headers: Dict[str, str] = {}
+
+    def _select(self, msg: Dict[str, Any], select: str) -> Dict[str, Any]:
+        return {k: v for k, v in msg.items() if k in select.split(",")}
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Dict[str, Any]] = None,
+        **_: Any,
+    ) -> FakeResponse:
+        if url.endswith("/$batch"):
+            responses = []
+            for r in json["requests"]:  # type: ignore[index]
+                msg_id = r["url"].split("/messages/")[1].split("?")[0]
+                self.fetched.append(msg_id)
+                responses.append(
+                    {"id": r["id"], "status": 200, "body": self.messages[msg_id]}
+                )
+            return FakeResponse({"responses": responses})
+        if params is None:
+            params = dict(parse_qsl(urlsplit(url).query))
+        select = params["$select"]
+        top, skip = int(params.get("$top", 1000)), int(params.get("$skip", 0))
+        self.listings.append(select)
+        rows = [
+            self._select(m, select)
+            for m in self.messages.values()
+            if "body" not in select or m["id"] not in self.moved
+        ]
+        payload: Dict[str, Any] = {"value": rows[skip : skip + top]}
+        if len(rows) > skip + top:
+            query = urlencode({"$select": select, "$top": top, "$skip": skip + top})
+            payload["@odata.nextLink"] = f"https://graph.example/sent?{query}"
+        return FakeResponse(payload)
+
+
+_SENT_SELECT = "id,subject,body,sentDateTime"
+
+
+def _messages(count: int = 3) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": f"m{i}",
+            "changeKey": "v1",
+            "subject": f"subject {i}",
+            "body": {"content": "x" * 500},
+            "bodyPreview": "x",
+            "from": {},
+            "toRecipients": [],
+            "ccRecipients": [],
+            "sentDateTime": f"2025-01-0{i + 1}T00:00:00Z",
+        }
+        for i in range(count)
+    ]
+
+
+def test_repeat_listings_only_fetch_changed_messages(tmp_path, make_graph_client):
+    store = StateStore(tmp_path / "state.db")
+    session = _MailboxSession(_messages())
+    client = make_graph_client(
+        session, message_cache=MessageCache(store, "me", max_age_days=30)
+    )
+
+    first = list(client.list_sent_messages_since(30))
+    # Cold mirror: a stub listing, then one full listing that fills it.
+    assert [m["id"] for m in first] == ["m0", "m1", "m2"]
+    assert session.listings[0] == "id,changeKey"
+    assert "body" in session.listings[1]
+    assert session.fetched == []
+
+    session.listings.clear()
+    second = list(client.list_sent_messages_since(30))
+    assert second == first
+    assert session.listings == ["id,changeKey"]
+    assert session.fetched == []
+
+    session.messages["m1"] = dict(
+        session.messages["m1"], changeKey="v2", subject="edited"
+    )
+    session.listings.clear()
+    third = list(client.list_sent_messages_since(30))
+    # The changed page is listed again with bodies rather than fetched by id.
+    assert session.listings[0] == "id,changeKey"
+    assert "body" in session.listings[1]
+    assert len(session.listings) == 2
+    assert session.fetched == []
+    assert [m["subject"] for m in third] == ["subject 0", "edited", "subject 2"]
+
+
+def test_changed_pages_are_relisted_through_their_next_link(
+    tmp_path, make_graph_client
+):
+    store = StateStore(tmp_path / "state.db")
+    session = _MailboxSession(_messages(5))
+    client = make_graph_client(
+        session, message_cache=MessageCache(store, "me", max_age_days=30)
+    )
+    client.message_cache.put_many(  # type: ignore[union-attr]
+        _messages(5), with_change_key(_SENT_SELECT)
+    )
+    for msg_id, subject in (("m3", "edited"), ("m4", "moved")):
+        session.messages[msg_id] = dict(
+            session.messages[msg_id], changeKey="v2", subject=subject
+        )
+    session.moved.add("m4")
+
+    msgs = list(
+        client._mirrored_items(
+            "https://graph.example/sent",
+            {"$select": _SENT_SELECT},
+            max_items=5,
+            page_size=3,
+        )
+    )
+
+    assert [m["subject"] for m in msgs][3:] == ["edited", "moved"]
+    # Stubs for both pages, then page two again with bodies via its nextLink;
+    # only the message that listing no longer returned is fetched by id.
+    assert session.listings == [
+        "id,changeKey",
+        "id,changeKey",
+        with_change_key(_SENT_SELECT),
+    ]
+    assert session.fetched == ["m4"]
+
+
+def test_mirror_only_serves_selects_its_rows_cover(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    cache = MessageCache(store, "me@example.com", max_age_days=30)
+    cache.put_many([{"id": "m0", "changeKey": "v1", "subject": "s"}], "id,subject")
+
+    hits, stale = cache.lookup([{"id": "m0", "changeKey": "v1"}], "id,subject")
+    assert list(hits) == ["m0"] and stale == []
+
+    hits, stale = cache.lookup([{"id": "m0", "changeKey": "v1"}], "id,subject,body")
+    assert hits == {} and stale == ["m0"]
+
+
+def test_disabled_mirror_lists_directly(tmp_path, make_graph_client):
+    store = StateStore(tmp_path / "state.db")
+    session = _MailboxSession(_messages())
+    client = make_graph_client(
+        session, message_cache=MessageCache(store, "me", max_age_days=30)
+    )
+    client.message_cache = MessageCache(store, "me@example.com", max_age_days=0)
+
+    assert len(list(client.list_sent_messages_since(30))) == 3
+    assert len(session.listings) == 1
+    assert session.listings[0] != "id,changeKey"
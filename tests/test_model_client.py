@@ -0,0 +1,135 @@
+"""Unit tests for the shared OpenAI client cache in model_client.
+
+Client construction and the completion call are replaced with fakes so no
+HTTP client is built.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from typing import Any, List
+
+from email_categorise import model_client
+from email_categorise.config import ModelDefinition
+
+
+def _patch_factory(monkeypatch) -> List[Any]:
+    created: List[Any] = []
+
+    def _new(definition: ModelDefinition, use_async: bool) -> Any:
+        client = object()
+        created.append((definition.name, use_async))
+        return client
+
+    monkeypatch.setattr(model_client, "_new_openai_client", _new)
+    monkeypatch.setattr(model_client, "_OPENAI_CLIENTS", {})
+    return created
+
+
+def test_sync_client_is_reused_per_definition(monkeypatch):
+    created = _patch_factory(monkeypatch)
+    a = ModelDefinition(name="a", provider="openai-compatible")
+
+    first = model_client.openai_client(a)
+    assert model_client.openai_client(a) is first
+    assert model_client.openai_client(ModelDefinition(name="b")) is not first
+    assert created == [("a", False), ("b", False)]
+
+
+def test_async_client_is_process_wide_and_closed(monkeypatch):
+    closed: List[str] = []
+
+    class _AsyncClient:
+        def __init__(self, name: str) -> None:
+            self.name = name
+
+        async def close(self) -> None:
+            closed.append(self.name)
+
+    monkeypatch.setattr(
+        model_client, "_new_openai_client", lambda d, use_async: _AsyncClient(d.name)
+    )
+    monkeypatch.setattr(model_client, "_ASYNC_OPENAI_CLIENTS", {})
+    a = ModelDefinition(name="a", provider="openai-compatible")
+
+    async def _client() -> Any:
+        return model_client.openai_client(a, use_async=True)
+
+    first = model_client.run_on_model_loop(_client())
+    assert model_client.run_on_model_loop(_client()) is first
+
+    model_client.close_async_clients()
+    assert closed == ["a"]
+
+
+def test_async_calls_share_the_cross_thread_limit(monkeypatch):
+    client = model_client.ModelClient(
+        ModelDefinition(name="a", provider="openai-compatible", max_concurrency=1)
+    )
+    in_flight: List[int] = [0]
+    peak: List[int] = [0]
+
+    async def _fake(system_prompt: str, user_content: str) -> Any:
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        return {"echo": user_content}
+
+    monkeypatch.setattr(client, "_achat_json_openai", _fake)
+
+    def _account(n: int) -> None:
+        async def _gather() -> Any:
+            return await asyncio.gather(
+                *(client.achat_json("", f"{n}-{i}") for i in range(3))
+            )
+
+        # Each account thread drives its own event loop, as `--parallel` does.
+        asyncio.run(_gather())
+
+    threads = [threading.Thread(target=_account, args=(n,)) for n in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert peak == [1]
+
+
+def test_chat_json_batch_keeps_order_and_returns_failures(monkeypatch):
+    client = model_client.ModelClient(
+        ModelDefinition(name="a", provider="openai-compatible", max_concurrency=3)
+    )
+
+    def _fake(system_prompt: str, user_content: str, **kwargs: Any) -> Any:
+        if user_content == "bad":
+            raise RuntimeError("Model returned invalid JSON")
+        return {"echo": user_content}
+
+    monkeypatch.setattr(client, "_chat_json", _fake)
+
+    results = client.chat_json_batch("", ["one", "bad", "three"])
+
+    assert results[0] == {"echo": "one"}
+    assert isinstance(results[1], RuntimeError)
+    assert results[2] == {"echo": "three"}
+    assert not client.supports_batch
+
+
+def test_schema_validator_is_cached_until_the_file_changes(tmp_path):
+    schema_path = tmp_path / "s.schema.json"
+    schema_path.write_text('{"type": "object", "required": ["a"]}', encoding="utf-8")
+
+    first = model_client.schema_validator(schema_path)
+    assert model_client.schema_validator(schema_path) is first
+    assert not first.is_valid({})
+
+    schema_path.write_text('{"type": "object"}', encoding="utf-8")
+    stat = schema_path.stat()
+    os.utime(schema_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    second = model_client.schema_validator(schema_path)
+    assert second is not first
+    assert second.is_valid({})
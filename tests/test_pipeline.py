@@ -0,0 +1,101 @@
+"""Unit tests for the staged run pipeline.
+
+Checks ordering, that stages overlap instead of running one after another,
+and that a failing stage stops the source and re-raises in the caller, for
+both the threaded and the asyncio pipeline.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import AsyncIterator, Iterator, List
+
+import pytest
+
+from email_categorise.pipeline import arun_pipeline, run_pipeline
+
+
+def test_items_flow_through_every_stage_in_order():
+    out = run_pipeline(
+        range(6),
+        [("double", lambda x: x * 2), ("label", lambda x: f"n{x}")],
+    )
+    assert out == ["n0", "n2", "n4", "n6", "n8", "n10"]
+
+
+def test_stages_overlap():
+    def slow(x: int) -> int:
+        time.sleep(0.05)
+        return x
+
+    started = time.monotonic()
+    out = run_pipeline(range(6), [("a", slow), ("b", slow), ("c", slow)])
+    elapsed = time.monotonic() - started
+
+    assert out == list(range(6))
+    # Sequential would be 18 * 0.05s; pipelined is about (6 + 2) * 0.05s.
+    assert elapsed < 0.7
+
+
+def test_failure_stops_the_source_and_is_raised():
+    produced: List[int] = []
+
+    def source() -> Iterator[int]:
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    def boom(x: int) -> int:
+        if x == 2:
+            raise ValueError("bad page")
+        return x
+
+    with pytest.raises(ValueError, match="bad page"):
+        run_pipeline(source(), [("boom", boom), ("tail", lambda x: x)])
+    assert len(produced) < 10
+
+
+def test_stage_threads_extend_the_caller_thread_name():
+    names: List[str] = []
+
+    def record(x: int) -> None:
+        names.append(threading.current_thread().name)
+
+    run_pipeline([1], [("classify", record)])
+    assert names == [f"{threading.current_thread().name}-classify"]
+
+
+async def _arange(n: int) -> AsyncIterator[int]:
+    for i in range(n):
+        yield i
+
+
+def test_async_pipeline_keeps_order_and_overlaps():
+    async def slow(x: int) -> int:
+        await asyncio.sleep(0.05)
+        return x
+
+    async def main() -> List[int]:
+        return await arun_pipeline(_arange(6), [("a", slow), ("b", slow), ("c", slow)])
+
+    started = time.monotonic()
+    out = asyncio.run(main())
+    elapsed = time.monotonic() - started
+
+    assert out == list(range(6))
+    assert elapsed < 0.7
+
+
+def test_async_pipeline_failure_is_raised():
+    async def boom(x: int) -> int:
+        if x == 2:
+            raise ValueError("bad page")
+        return x
+
+    async def tail(x: int) -> int:
+        return x
+
+    with pytest.raises(ValueError, match="bad page"):
+        asyncio.run(arun_pipeline(_arange(100), [("boom", boom), ("tail", tail)]))
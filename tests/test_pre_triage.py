@@ -0,0 +1,99 @@
+"""Unit tests for the local pre-triage rules (no Graph or LLM calls)."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from email_categorise.config import PreTriageConfig, PreTriageRule
+from email_categorise.model_client import schema_validator
+from email_categorise.pre_triage import classify, pre_triage
+
+ACCOUNT = "me@example.com"
+SCHEMA = (
+    Path(__file__).resolve().parent.parent
+    / "email_categorise"
+    / "json_schemas"
+    / "triage_output.schema.json"
+)
+
+
+def item_validator():
+    validator = schema_validator(SCHEMA)
+    return validator.evolve(schema=validator.schema["properties"]["messages"]["items"])
+
+
+def _pair(
+    sender: str,
+    subject: str = "Hello",
+    headers: Optional[List[Dict[str, str]]] = None,
+    **entry: Any,
+):
+    message = {"id": sender, "internetMessageHeaders": headers or []}
+    payload = {"id": sender, "subject": subject, "from": {"address": sender}}
+    payload.update(entry)
+    return message, payload
+
+
+def _category(message, entry, cfg=None, contacts=()):
+    hit = classify(
+        message,
+        entry,
+        cfg or PreTriageConfig(enabled=True),
+        account_email=ACCOUNT,
+        tone_contacts=contacts,
+    )
+    return hit[0]["primary_category"] if hit else None
+
+
+def test_heuristics_cover_bulk_noreply_and_orders():
+    unsubscribe = [{"name": "List-Unsubscribe", "value": "<mailto:x@y>"}]
+    assert _category(*_pair("news@shop.com", headers=unsubscribe)) == "Marketing"
+    statement = _pair("no-reply@bank.com", "Statement ready")
+    assert _category(*statement) == "Informational"
+    assert (
+        _category(*_pair("noreply@shop.com", "Your order #1234 has shipped"))
+        == "Order Confirmation"
+    )
+    assert _category(*_pair("alice@client.com", "Quick question")) is None
+
+
+def test_people_the_user_talks_to_are_left_for_the_llm():
+    assert _category(*_pair("noreply@example.com")) is None  # internal domain
+    replied = _pair("no-reply@x.com", has_user_replied_in_thread=True)
+    assert _category(*replied) is None
+    contact = "notifications@x.com"
+    assert _category(*_pair(contact), contacts={contact}) is None
+
+
+def test_rules_take_precedence_and_need_a_matcher():
+    cfg = PreTriageConfig(
+        enabled=True,
+        rules=[
+            PreTriageRule(category="Priority 3"),
+            PreTriageRule(category="Invoice", sender="*@billing.example.org"),
+            PreTriageRule(category="Marketing", subject=r"weekly digest"),
+        ],
+    )
+    assert _category(*_pair("ar@billing.example.org"), cfg=cfg) == "Invoice"
+    digest = _pair("bob@site.com", "The Weekly Digest")
+    assert _category(*digest, cfg=cfg) == "Marketing"
+    assert _category(*_pair("bob@site.com", "Lunch?"), cfg=cfg) is None
+
+
+def test_pre_triage_splits_the_run_and_respects_enabled():
+    pairs = [_pair("noreply@bank.com"), _pair("alice@client.com")]
+    messages = [m for m, _ in pairs]
+    payload = [p for _, p in pairs]
+
+    decided, remaining = pre_triage(
+        messages, payload, PreTriageConfig(enabled=True), account_email=ACCOUNT
+    )
+    assert list(decided) == ["noreply@bank.com"]
+    assert [p["id"] for p in remaining] == ["alice@client.com"]
+    assert item_validator().is_valid(decided["noreply@bank.com"])
+
+    decided, remaining = pre_triage(
+        messages, payload, PreTriageConfig(), account_email=ACCOUNT
+    )
+    assert decided == {} and len(remaining) == 2
@@ -0,0 +1,101 @@
+"""Unit tests for the SQLite state store and the legacy JSON import."""
+
+from __future__ import annotations
+
+from email_categorise.state_store import StateStore
+from email_categorise.utils import save_json
+
+
+def test_state_and_profiles_round_trip(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    assert store.get_state("Me@Example.com") == {
+        "first_run_completed": False,
+        "last_run_utc": None,
+    }
+    assert not store.has_state("me@example.com")
+
+    store.set_state("Me@Example.com", {"first_run_completed": True})
+    store.replace_sender_stats("me@example.com", {"a@x.com": {"sent": 3}})
+    store.replace_tone_profiles(
+        "me@example.com",
+        {"contacts": {"a@x.com": {"tone": "warm"}}, "default": {"tone": "brief"}},
+    )
+
+    assert store.get_state("me@example.com") == {"first_run_completed": True}
+    assert store.get_sender_stats("me@example.com") == {"a@x.com": {"sent": 3}}
+    assert store.get_tone_profiles("me@example.com") == {
+        "contacts": {"a@x.com": {"tone": "warm"}},
+        "default": {"tone": "brief"},
+    }
+
+
+def test_ledger_round_trip_and_run_order(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    store.write_ledger("r2", "b@example.com", "2025-01-02T00:00:00+00:00", [])
+    store.write_ledger(
+        "r1", "a@example.com", "2025-01-01T00:00:00+00:00", [{"type": "x"}]
+    )
+
+    assert store.ledger_run_order() == ["r1", "r2"]
+    ledger = store.load_ledger("r1", "a@example.com")
+    assert ledger is not None and ledger["actions"] == [{"type": "x"}]
+    assert store.load_ledger("r1", "b@example.com") is None
+
+
+def test_rewriting_a_ledger_keeps_its_first_timestamp(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    store.write_ledger("r1", "a@example.com", "2025-01-01T00:00:00+00:00", [])
+    store.write_ledger("r2", "a@example.com", "2025-01-02T00:00:00+00:00", [])
+    store.write_ledger(
+        "r1", "a@example.com", "2025-01-03T00:00:00+00:00", [{"type": "x"}]
+    )
+
+    assert store.ledger_run_order() == ["r1", "r2"]
+    ledger = store.load_ledger("r1", "a@example.com")
+    assert ledger is not None
+    assert ledger["timestamp"] == "2025-01-01T00:00:00+00:00"
+    assert ledger["actions"] == [{"type": "x"}]
+
+
+def test_appending_to_a_ledger_only_writes_the_new_actions(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    store.append_ledger("r1", "a@example.com", "2025-01-01T00:00:00+00:00", [])
+    store.append_ledger(
+        "r1", "a@example.com", "2025-01-02T00:00:00+00:00", [{"n": 0}, {"n": 1}]
+    )
+    store.append_ledger("r1", "a@example.com", "2025-01-03T00:00:00+00:00", [{"n": 2}])
+    store.append_ledger("r1", "b@example.com", "2025-01-03T00:00:00+00:00", [{"n": 9}])
+
+    ledger = store.load_ledger("r1", "a@example.com")
+    assert ledger is not None
+    assert ledger["timestamp"] == "2025-01-01T00:00:00+00:00"
+    assert ledger["actions"] == [{"n": 0}, {"n": 1}, {"n": 2}]
+
+
+def test_import_json_migrates_legacy_layout(tmp_path):
+    data_dir = tmp_path / "data"
+    acct_dir = data_dir / "me_at_example.com"
+    save_json(acct_dir / "state.json", {"first_run_completed": True})
+    save_json(acct_dir / "sender_stats.json", {"a@x.com": {"sent": 1}})
+    save_json(acct_dir / "triage_20250101-120000.json", {"messages": []})
+    save_json(
+        tmp_path / "ledger" / "run1_me_at_example.com.json",
+        {
+            "run_id": "run1",
+            "account": "me@example.com",
+            "timestamp": "2025-01-01T12:00:00+00:00",
+            "actions": [{"type": "message_patch", "message_id": "m1"}],
+        },
+    )
+    save_json(tmp_path / "ledger" / "index.json", {"order": ["run1"]})
+
+    store = StateStore(tmp_path / "state.db")
+    counts = store.import_json(data_dir, tmp_path / "ledger", ["me@example.com"])
+    again = store.import_json(data_dir, tmp_path / "ledger", ["me@example.com"])
+
+    assert counts == again
+    assert counts["ledger_runs"] == 1
+    assert store.get_state("me@example.com") == {"first_run_completed": True}
+    outputs = store.list_triage_outputs("me@example.com")
+    assert [o["created"] for o in outputs] == ["2025-01-01T12:00:00+00:00"]
+    assert store.ledger_run_order() == ["run1"]
@@ -0,0 +1,57 @@
+"""Unit tests for the triage decision cache backed by the state store."""
+
+from __future__ import annotations
+
+from datetime import timedelta
+
+from email_categorise import triage_cache
+from email_categorise.state_store import StateStore
+from email_categorise.triage_cache import TriageCache, triage_fingerprint
+from email_categorise.utils import utc_now
+
+
+def test_fingerprint_depends_on_entry_prompt_and_model():
+    entry = {"id": "m1", "body": "hello"}
+    base = triage_fingerprint(entry, "1", "model-a")
+    assert base == triage_fingerprint(dict(entry), "1", "model-a")
+    assert base != triage_fingerprint({"id": "m1", "body": "changed"}, "1", "model-a")
+    assert base != triage_fingerprint(entry, "2", "model-a")
+    assert base != triage_fingerprint(entry, "1", "model-b")
+
+
+def test_cache_round_trip_through_store(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    cache = TriageCache(store, "me@example.com", ttl_hours=1, max_entries=10)
+    cache.put("k", {"id": "m1", "primary_category": "Urgent"})
+    cache.save()
+
+    reloaded = TriageCache(store, "me@example.com", ttl_hours=1, max_entries=10)
+    assert reloaded.get("k") == {"id": "m1", "primary_category": "Urgent"}
+    assert reloaded.get("missing") is None
+    other = TriageCache(store, "other@example.com", ttl_hours=1, max_entries=10)
+    assert other.get("k") is None
+
+
+def test_cache_expires_and_evicts_oldest(tmp_path, monkeypatch):
+    store = StateStore(tmp_path / "state.db")
+    cache = TriageCache(store, "me@example.com", ttl_hours=1, max_entries=2)
+    start = utc_now()
+    for i in range(3):
+        now = start + timedelta(minutes=i)
+        monkeypatch.setattr(triage_cache, "utc_now", lambda now=now: now)
+        cache.put(f"k{i}", {"id": str(i)})
+    cache.save()
+    assert cache.get("k0") is None
+    assert cache.get("k2") == {"id": "2"}
+
+    monkeypatch.setattr(triage_cache, "utc_now", lambda: start + timedelta(hours=2))
+    assert cache.get("k2") is None
+
+
+def test_zero_ttl_disables_cache(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    cache = TriageCache(store, "me@example.com", ttl_hours=0, max_entries=10)
+    cache.put("k", {"id": "m1"})
+    cache.save()
+    assert cache.get("k") is None
+    assert store.cache_get("me@example.com", "k") is None
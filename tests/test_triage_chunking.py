@@ -0,0 +1,349 @@
+"""Unit tests for splitting and running triage in chunks.
+
+Uses a fake runner in place of a real model so no LLM is called.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import pytest
+
+from email_categorise.config import ModelDefinition, TriageConfig
+from email_categorise.state_store import StateStore
+from email_categorise.triage_logic import (
+    _chunk_payload,
+    _compact_chunk,
+    _confidence_schema,
+    _draft_replies,
+    _estimate_tokens,
+    _fit_prompt_budget,
+    _run_triage_chunks,
+    _store_delta_link,
+    _triage_with_cascade,
+)
+
+SCHEMAS = Path(__file__).resolve().parent.parent / "email_categorise" / "json_schemas"
+
+
+def _entries(n: int, body: str = "hello") -> List[Dict[str, Any]]:
+    return [{"id": f"m{i}", "body": body} for i in range(n)]
+
+
+def test_chunk_payload_by_message_count():
+    chunks = _chunk_payload(_entries(7), max_messages=3, max_tokens=0)
+    assert [len(c) for c in chunks] == [3, 3, 1]
+
+
+def test_chunk_payload_by_token_budget():
+    big = "x" * 4000  # ~1000 tokens per entry
+    chunks = _chunk_payload(_entries(4, big), max_messages=0, max_tokens=2500)
+    assert all(len(c) <= 2 for c in chunks)
+    assert sum(len(c) for c in chunks) == 4
+
+
+def test_oversized_entry_gets_its_own_chunk():
+    chunks = _chunk_payload(_entries(2, "x" * 40000), max_messages=10, max_tokens=100)
+    assert [len(c) for c in chunks] == [1, 1]
+
+
+def _shared_entries(n: int) -> List[Dict[str, Any]]:
+    profile = {"formality": "casual", "sign_off": "Cheers", "notes": "x" * 2000}
+    return [
+        {
+            "id": f"m{i}",
+            "from": {"address": "alice@example.com"},
+            "body": "hello",
+            "sender_stats": {"count": 12, "internal": False},
+            "tone_profile": profile,
+        }
+        for i in range(n)
+    ]
+
+
+def test_compact_chunk_lists_shared_context_once():
+    doc = _compact_chunk(_shared_entries(3))
+
+    assert list(doc["tone_profiles"]) == ["t1"]
+    assert list(doc["sender_stats"]) == ["alice@example.com"]
+    assert {m["tone_profile"] for m in doc["messages"]} == {"t1"}
+    assert {m["sender_stats"] for m in doc["messages"]} == {"alice@example.com"}
+
+
+def test_chunk_payload_counts_shared_context_once():
+    # Three copies of the profile would not fit; one does.
+    chunks = _chunk_payload(_shared_entries(3), max_messages=0, max_tokens=1100)
+    assert [len(c) for c in chunks] == [3]
+
+
+def test_fit_prompt_budget_trims_threads_then_bodies():
+    thread = [{"bodyPreview": "y" * 400} for _ in range(5)]
+    doc = {
+        "messages": [
+            {"id": "m0", "body": "a" * 4000, "thread_summary": list(thread)},
+            {"id": "m1", "body": "b" * 300, "thread_summary": list(thread)},
+        ]
+    }
+
+    _fit_prompt_budget(doc, base_tokens=100, budget_tokens=800)
+
+    m0, m1 = doc["messages"]
+    assert len(m0["thread_summary"]) == 1 and len(m1["thread_summary"]) == 1
+    assert len(m0["body"]) < 4000
+    assert m1["body"] == "b" * 300
+    assert 100 + _estimate_tokens(json.dumps(doc, separators=(",", ":"))) <= 800
+
+
+def _decision(msg_id: str) -> Dict[str, Any]:
+    return {
+        "id": msg_id,
+        "primary_category": "Urgent",
+        "secondary_categories": [],
+        "flag": None,
+        "needs_reply": False,
+        "is_marketing": False,
+        "is_informational": False,
+        "mark_complete": False,
+        "mark_possibly_complete": False,
+        "pin": False,
+        "create_task": False,
+        "task_summary": None,
+        "summary": None,
+    }
+
+
+class _FakeRunner:
+    """Answers every id in the prompt; `fail_on` raises for the whole call,
+    `malformed` returns an invalid decision only while batched with others,
+    `omit` drops an id from multi-message answers, and `confidence` adds a
+    per-id confidence score (ids in `needs_reply` ask for a reply)."""
+
+    def __init__(
+        self,
+        fail_on: Optional[str] = None,
+        concurrency: int = 2,
+        malformed: Optional[str] = None,
+        omit: Optional[str] = None,
+        confidence: Optional[Dict[str, float]] = None,
+        needs_reply: Tuple[str, ...] = (),
+    ) -> None:
+        definition = ModelDefinition(name="t", max_concurrency=concurrency)
+        self.client = type("C", (), {"definition": definition})()
+        self.fail_on = fail_on
+        self.malformed = malformed
+        self.omit = omit
+        self.confidence = confidence
+        self.needs_reply = needs_reply
+        self.calls: List[List[str]] = []
+
+    def run_with_schema(
+        self, prompt: str, schema: Path, out: Optional[Path] = None, **kwargs: Any
+    ) -> Dict[str, Any]:
+        ids = [e["id"] for e in _entries(10) if f'"{e["id"]}"' in prompt]
+        self.calls.append(ids)
+        if self.fail_on and self.fail_on in ids:
+            raise RuntimeError("bad output")
+        messages = []
+        for i in ids:
+            if i == self.omit and len(ids) > 1:
+                continue
+            decision = _decision(i)
+            if i == self.malformed and len(ids) > 1:
+                decision["needs_reply"] = "maybe"
+            if self.confidence is not None:
+                decision["confidence"] = self.confidence.get(i, 0.0)
+                decision["needs_reply"] = i in self.needs_reply
+            messages.append(decision)
+        return {"messages": messages}
+
+    def run_batch_with_schema(
+        self, prompts: List[str], schema: Path, **kwargs: Any
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        results: List[Union[Dict[str, Any], Exception]] = []
+        for prompt in prompts:
+            try:
+                results.append(self.run_with_schema(prompt, schema))
+            except Exception as exc:
+                results.append(exc)
+        return results
+
+
+def _run(runner: Any, chunks: Any, store: StateStore, **kwargs: Any) -> Any:
+    return _run_triage_chunks(runner, chunks, store, "me@example.com", **kwargs)
+
+
+def test_run_triage_chunks_bisects_a_failed_chunk(tmp_path):
+    runner = _FakeRunner(fail_on="m0")
+    store = StateStore(tmp_path / "state.db")
+    chunks = _chunk_payload(_entries(4), max_messages=2, max_tokens=0)
+
+    triage_map = _run(runner, chunks, store, run_id="r1")
+
+    assert set(triage_map) == {"m1", "m2", "m3"}
+    assert sorted(runner.calls) == [["m0"], ["m0", "m1"], ["m1"], ["m2", "m3"]]
+    assert len(store.list_triage_outputs("me@example.com")) == 2
+
+
+def test_run_triage_chunks_keeps_valid_decisions_and_retries_the_rest(tmp_path):
+    runner = _FakeRunner(malformed="m1", omit="m3")
+    chunks = _chunk_payload(_entries(4), max_messages=4, max_tokens=0)
+
+    triage_map = _run(runner, chunks, StateStore(tmp_path / "state.db"))
+
+    assert set(triage_map) == {"m0", "m1", "m2", "m3"}
+    assert runner.calls == [["m0", "m1", "m2", "m3"], ["m1"], ["m3"]]
+
+
+def test_run_triage_chunks_respects_retry_budget(tmp_path):
+    runner = _FakeRunner(fail_on="m0")
+    chunks = _chunk_payload(_entries(4), max_messages=4, max_tokens=0)
+
+    with pytest.raises(RuntimeError):
+        _run(runner, chunks, StateStore(tmp_path / "state.db"), max_retries=1)
+    assert runner.calls == [["m0", "m1", "m2", "m3"], ["m0", "m1"]]
+
+
+def test_delta_link_only_advances_when_every_message_is_settled():
+    state: Dict[str, Any] = {"inbox_delta_link": "old"}
+
+    # Triage gave up on m3 (or its patch failed): replay the old delta.
+    _store_delta_link(state, "new", ["m3"])
+    assert state["inbox_delta_link"] == "old"
+
+    _store_delta_link(state, None, [])
+    assert state["inbox_delta_link"] == "old"
+
+    _store_delta_link(state, "new", [])
+    assert state["inbox_delta_link"] == "new"
+
+
+def test_run_triage_chunks_raises_when_every_chunk_fails(tmp_path):
+    runner = _FakeRunner(fail_on="m0")
+    chunks = _chunk_payload(_entries(1), max_messages=2, max_tokens=0)
+
+    with pytest.raises(RuntimeError):
+        _run(runner, chunks, StateStore(tmp_path / "state.db"))
+
+
+class _AsyncFakeRunner(_FakeRunner):
+    def __init__(self, concurrency: int = 2) -> None:
+        super().__init__(concurrency=concurrency)
+        self.client.supports_async = True  # type: ignore[attr-defined]
+
+    def run_batch_with_schema(self, *args: Any, **kwargs: Any) -> Any:
+        raise AssertionError("async-capable runners should not use threads")
+
+    async def arun_with_schema(
+        self, prompt: str, schema: Path, out: Optional[Path] = None, **kwargs: Any
+    ) -> Dict[str, Any]:
+        return _FakeRunner.run_with_schema(self, prompt, schema)
+
+
+def test_run_triage_chunks_uses_async_client_when_available(tmp_path):
+    runner = _AsyncFakeRunner()
+    chunks = _chunk_payload(_entries(5), max_messages=2, max_tokens=0)
+
+    triage_map = _run(runner, chunks, StateStore(tmp_path / "state.db"))
+
+    assert set(triage_map) == {f"m{i}" for i in range(5)}
+
+
+def test_cascade_escalates_only_low_confidence_and_reply_items(tmp_path):
+    small = _FakeRunner(
+        confidence={"m0": 0.95, "m1": 0.3, "m2": 0.9, "m3": 0.99},
+        needs_reply=("m2",),
+    )
+    large = _FakeRunner()
+    entries = _entries(4)
+    store = StateStore(tmp_path / "state.db")
+
+    triage_map, stats = _triage_with_cascade(
+        small,
+        large,
+        entries,
+        TriageConfig(triage_chunk_messages=10),
+        0.7,
+        store,
+        "me@example.com",
+    )
+
+    assert set(triage_map) == {"m0", "m1", "m2", "m3"}
+    assert triage_map["m0"]["confidence"] == 0.95
+    assert "confidence" not in triage_map["m1"]
+    assert large.calls == [["m1", "m2"]]
+    assert stats["escalated"] == 2
+    assert stats["cascade_resolved"] == 2
+    # Only the applied decision of each message is recorded.
+    recorded = [
+        m["id"]
+        for out in store.list_triage_outputs("me@example.com")
+        for m in out["data"]["messages"]
+    ]
+    assert sorted(recorded) == ["m0", "m1", "m2", "m3"]
+
+
+def test_confidence_schema_extends_the_triage_schema():
+    base = SCHEMAS / "triage_output.schema.json"
+    derived = _confidence_schema(base)
+
+    assert derived == _confidence_schema(base)
+    item = json.loads(derived.read_text())["properties"]["messages"]["items"]
+    base_item = json.loads(base.read_text())["properties"]["messages"]["items"]
+    assert item["required"] == base_item["required"] + ["confidence"]
+    assert item["properties"]["confidence"]["maximum"] == 1
+    assert {k: v for k, v in item["properties"].items() if k != "confidence"} == (
+        base_item["properties"]
+    )
+
+
+def test_cascade_escalates_everything_when_small_model_fails(tmp_path):
+    small = _FakeRunner(fail_on="m0", confidence={})
+    large = _FakeRunner()
+
+    triage_map, stats = _triage_with_cascade(
+        small,
+        large,
+        _entries(1),
+        TriageConfig(),
+        0.7,
+        StateStore(tmp_path / "state.db"),
+        "me@example.com",
+    )
+
+    assert set(triage_map) == {"m0"}
+    assert stats["escalated"] == 1
+
+
+class _ReplyRunner:
+    def __init__(self, fail_on: Optional[str] = None) -> None:
+        self.client = type("C", (), {"definition": ModelDefinition(name="r")})()
+        self.fail_on = fail_on
+        self.prompts: List[str] = []
+
+    def run_batch_with_schema(
+        self, prompts: List[str], schema: Path, **kwargs: Any
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        assert schema.name == "reply_draft.schema.json"
+        self.prompts.extend(prompts)
+        return [
+            RuntimeError("bad output")
+            if self.fail_on and f'"{self.fail_on}"' in p
+            else {"draft_reply_body": "Thanks, will do."}
+            for p in prompts
+        ]
+
+
+def test_draft_replies_only_for_messages_that_need_one():
+    entries = _shared_entries(3)
+    decisions = {e["id"]: _decision(e["id"]) for e in entries}
+    decisions["m1"]["needs_reply"] = True
+    decisions["m2"]["needs_reply"] = True
+    runner = _ReplyRunner(fail_on="m2")
+
+    bodies = _draft_replies(runner, entries, decisions)
+
+    assert bodies == {"m1": "Thanks, will do."}
+    assert len(runner.prompts) == 2
+    assert '"tone_profile":{"formality":"casual"' in runner.prompts[0]